@@ -1,350 +1,283 @@
-import pandas as pd
-import time
-import google.generativeai as genai
-from tqdm import tqdm
-import re
-import sys
+import argparse
 import os
-import json
 
 # 🔐 List of Gemini API Keys
 api_keys = [
      Enter Your API Keys
 ]
 
-KEY_USAGE_LIMIT = 15
-current_key_index = 0
-calls_with_current_key = 0
+CONCURRENCY_PER_KEY = 2  # Batches kept in flight on each key at the same time
+REQUESTS_PER_MINUTE = 15  # Per-key request budget
+TOKENS_PER_MINUTE = 250_000  # Per-key token budget
 
+# 💾 Result cache: companies already classified against the same target are not re-sent
+CACHE_FILE = "classification_cache.sqlite"
+CACHE_MAX_ENTRIES = 500_000
+CACHE_MAX_AGE_DAYS = 30
 
-# 🔄 Function to load Gemini model with a given key
-def load_gemini_model(api_key, key_index):
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.5-flash-lite-preview-06-17")
-    try:
-        test = model.generate_content("Say OK").text.strip()
-        if "OK" not in test:
-            raise RuntimeError("Unexpected Gemini response")
-        print(f"✅ Gemini initialized with API key #{key_index + 1}")
-        return model
-    except Exception as e:
-        print(f"❌ Failed to initialize Gemini model with key #{key_index + 1}: {e}")
-        sys.exit(1)
+# 🧬 Duplicate descriptions are sent once and the result is copied to every row in the cluster
+NEAR_DUPLICATE_THRESHOLD = 0.9  # MinHash Jaccard similarity; None collapses exact duplicates only
+
+# 🧹 Optional local pre-filter: rows whose TF-IDF similarity to every target is below the floor skip Gemini
+PREFILTER_FLOOR = None  # e.g. 0.05; None sends every row. Tune with --tune-prefilter on a labeled sample
 
+INPUT_FILE = "BD_Oil2.xlsx"  # .xlsx/.csv/.parquet with "Company Name" and "Business Description"
+READ_CHUNK_SIZE = 1000  # Rows parsed at a time; batches start on the first chunk
+JOURNAL_FILE = "classification_journal.jsonl"  # Finished rows, appended once per batch
 
-# ⏳ Load first model
-model = load_gemini_model(api_keys[current_key_index], current_key_index)
+# 📦 Batches are packed by estimated tokens rather than a fixed company count
+MAX_COMPANIES_PER_BATCH = 20
+TOKEN_BUDGET_PER_BATCH = 30_000  # Prompt + expected output tokens per request
+MAX_OUTPUT_TOKENS = 8_192  # Keep the expected JSON below the model's output limit
+MAX_REPAIR_ATTEMPTS = 3  # Tries per company before it is marked permanently failed
 
 # ✏️ Target company business description for relevance scoring
 target_bd = """Target Company:Gabriel India Limited manufactures and sells ride control products to the automotive industry in India, the Netherlands, and internationally. The company provides canister shock absorbers, telescopic front fork, inverted front fork, canister and big piston design, mono shox, shock absorbers, rear shock absorbers, strut assemblies, FSD suspension; and axle, cabin, and seat dampers. It also offers double-acting hydraulic shock absorbers for conventional coach, shock absorber for EMU/ MEMU/ DMU coach, dampers for diesel locomotive, dampers for rajdhani and shatabadi coach, damper for ICF train 18- vande bharat coach, damper for electric locomotive, and damper for vande bharat coach. In addition, the company provides Macpherson struts, gas springs, brake pads, drive shafts, suspension parts, suspension and strut bush kits, OC springs, coolants, brake fluids, front fork components, oil seals, front fork oil wheel rims, spokes cone sets, and tyres and tubes, as well as offers mountain bikes and modern e-bikes products. Its products are used in two and three wheelers, passenger cars, commercial vehicles, railways, off highway, aftermarkets, and sunroof applications. The company sells its products through carrying and forwarding agents, retailers, and distributors. It also exports its products. The company was incorporated in 1961 and is headquartered in Pune, India. Gabriel India Limited is a subsidiary of Asia Investments Private Limited."""
 
-# 📂 Load Excel
-df = pd.read_excel("BD_Oil2.xlsx")  # Must have "Company Name" and "Business Description"
-
-print("📊 Excel file columns:", df.columns.tolist())
-print("📊 First 3 rows of data:")
-print(df.head(3))
-print(f"📊 Total companies to process: {len(df)}")
-
-# 🗂️ Output setup
-output_file = "business_classifications.xlsx"
-results = []
-batch_size = 3  # Process companies in batches
-
-
-# Function to clean and convert relevance score to float
-def clean_relevance_score(score):
-    """Convert relevance score to float, handling various input types"""
-    if pd.isna(score):
-        return 0.00
-
-    # If it's already a number, return it
-    if isinstance(score, (int, float)):
-        return float(score)
-
-    # If it's a string, try to extract numeric value
-    if isinstance(score, str):
-        # Remove any non-numeric characters except decimal point
-        cleaned = re.sub(r'[^\d.]', '', str(score))
+parser = argparse.ArgumentParser(description="Classify companies with Gemini and score them against a target company")
+parser.add_argument("--input", default=INPUT_FILE, help=f"Company list to classify (default: {INPUT_FILE})")
+parser.add_argument("--targets", help="JSON or '# Name' text file of target companies to score against in one pass "
+                                         "(default: the target_bd above)")
+parser.add_argument("--prefilter-floor", type=float, default=PREFILTER_FLOOR,
+                    help="Skip Gemini for rows whose local similarity to every target is below this floor")
+parser.add_argument("--tune-prefilter", metavar="LABELED_FILE",
+                    help="Print pre-filter recall vs. calls saved per floor on a labeled sample "
+                         "(e.g. an earlier output file) and exit")
+parser.add_argument("--stream", action="store_true",
+                    help="Stream Gemini's answers and journal each company as soon as it is generated")
+parser.add_argument("--resume", action="store_true",
+                    help="Skip rows already recorded in the journal of an interrupted run")
+parser.add_argument("--metrics-file", help="Keep per-request telemetry (latency, queue wait, tokens, retries, per-key "
+                                           "rates) in this JSON file, or in Prometheus text format for a .prom path")
+parser.add_argument("--trace-file", help="Write a Chrome trace / Perfetto timeline of batches, requests, retries, "
+                                         "sleeps and writes to this JSON file (open it in https://ui.perfetto.dev)")
+parser.add_argument("--shard", metavar="i/N",
+                    help="Process only shard i of N (rows picked by a stable hash of name and description) and save "
+                         "them to a shard file; run each shard on its own machine with its own API keys")
+parser.add_argument("--merge", nargs="+", metavar="SHARD_FILE",
+                    help="Combine the shard files of all N shards into the final workbook, after checking that every "
+                         "input row appears exactly once")
+parser.add_argument("--output-format", choices=("xlsx", "csv", "parquet"), default="xlsx",
+                    help="Final output: an .xlsx workbook with relevance band sheets (xlsxwriter in constant-memory "
+                         "mode if installed), or one .csv / .parquet table sorted by relevance (default: xlsx)")
+
+
+def save_results(paths, targets, output_file, tracer):
+    """Write the output file straight from journal or shard files, one row at a time, best first."""
+    from automator import JournaledResults, write_results
+
+    # One pass keeps only each row's score and position; the rows themselves are read back while writing
+    with tracer.span("read journal", "write"):
+        results = JournaledResults(paths, targets)
+
+    print(f"📊 Final dataset contains {len(results)} companies")
+    print(f"📊 Columns: {results.columns}")
+
+    # Relevance scores are cleaned (0-100) as rows are written, sorted by relevance score (highest first);
+    # permanently failed companies keep an empty score so they do not count as 0.
+    # Each row is written once to All_Companies and once to its band sheet, in a single sorted pass
+    print("🔧 Cleaning relevance scores and writing rows best first...")
+    write_results(results, output_file, tracer)
+
+    print(f"✅ Final results saved: {output_file}")
+    return results
+
+
+def print_summary(results, targets, output_file):
+    import numpy as np
+
+    from automator import BEST_TARGET_COLUMN, score_columns
+
+    print("\n🎉 Processing complete!")
+    print(f"📋 Summary:")
+    print(f"   • Total companies processed: {len(results)}")
+    print(f"   • Output file: {output_file}")
+    print(
+        f"   • Columns created: Business Summary, Industry Classification, Business Model, Key Products/Services, Market Focus, Relevance Score, Relevance Reason")
+    if len(targets) > 1:
+        print(f"   • Per-target columns: {', '.join(score_columns(name)[0] for name in targets)}, {BEST_TARGET_COLUMN}")
+        for name, count in sorted(results.best_targets.items(), key=lambda item: -item[1]):
+            print(f"   • Best match for {name}: {count} companies")
+
+    # Relevance score distribution
+    scores = results.scores
+    high_count = int((scores >= 70.00).sum())
+    medium_count = int(((scores >= 50.00) & (scores < 70.00)).sum())
+    low_count = int((scores < 50.00).sum())
+
+    print(f"\n📊 Relevance Score Distribution:")
+    print(f"   • High Relevance (70+): {high_count} companies")
+    print(f"   • Medium Relevance (50-69): {medium_count} companies")
+    print(f"   • Low Relevance (<50): {low_count} companies")
+    if results.failed_rows > 0:
+        print(f"   • Permanently failed (not scored): {results.failed_rows} companies")
+
+    if high_count > 0:
+        avg_high = scores[scores >= 70.00].mean()
+        print(f"   • Average high relevance score: {avg_high:.2f}")
+
+    if high_count + medium_count + low_count > 0:
+        overall_avg = np.nanmean(scores)
+        print(f"   • Overall average relevance score: {overall_avg:.2f}")
+
+
+def close_trace(tracer, trace_file):
+    if trace_file:
+        tracer.close()
+        print(f"🧭 Trace saved: {trace_file} (open it in https://ui.perfetto.dev or chrome://tracing)")
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+
+    # 📚 pandas and the engine load only now, so --help is instant; the Gemini SDK loads with the first request
+    import pandas as pd
+
+    from automator import (ClassificationRun, MissingColumnsError, ResultJournal, RowReader, ShardMergeError,
+                           TargetsFileError, Tracer, check_output, check_shards, is_permanent_failure, load_targets,
+                           parse_shard, run_fingerprint, shard_name, targets_text, tune_prefilter, write_shard)
+
+    # 🎯 Every company is scored against all targets in the same pass
+    try:
+        targets = load_targets(args.targets) if args.targets else {"Gabriel India Limited": target_bd}
+    except (OSError, TargetsFileError) as e:
+        raise SystemExit(f"❌ {e}")
+    print(f"🎯 Scoring against {len(targets)} target(s): {', '.join(targets)}")
+
+    if args.tune_prefilter:
+        labeled = (pd.read_csv(args.tune_prefilter) if args.tune_prefilter.lower().endswith(".csv")
+                   else pd.read_excel(args.tune_prefilter))
+        print(f"🧹 Pre-filter tuning on {len(labeled)} labeled rows:")
+        print(tune_prefilter(labeled, targets).to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+        return
+
+    # 🗂️ Output setup
+    output_file = f"business_classifications.{args.output_format}"
+    try:
+        check_output(output_file)
+    except ImportError as e:
+        raise SystemExit(f"❌ {e}")
+    # 🧭 Timeline of the run; a disabled tracer (no --trace-file) records nothing
+    tracer = Tracer(args.trace_file)
+    fingerprint = run_fingerprint(args.input, targets_text(targets))
+
+    if args.merge:
+        # 🧩 Combine the shards of a --shard run into the same output a single-node run writes
         try:
-            return float(cleaned) if cleaned else 0.00
-        except ValueError:
-            return 0.00
-
-    return 0.00
-
-
-# Function to process a batch of companies
-def process_batch(batch_df, batch_num):
-    global current_key_index, calls_with_current_key, model
-
-    print(f"\n🔄 Processing batch {batch_num} ({len(batch_df)} companies)")
-
-    # Prepare batch data for prompt
-    companies_data = []
-    for idx, row in batch_df.iterrows():
-        comp_name = row["Company Name"]
-        comp_bd = row["Business Description"]
-
-        if pd.isna(comp_bd) or comp_bd == "" or str(comp_bd).strip() == "":
-            comp_bd = "No business description available"
-
-        companies_data.append({
-            "name": str(comp_name) if pd.notna(comp_name) else "Unknown",
-            "description": str(comp_bd)
-        })
-
-    # Create batch prompt
-    prompt = f"""
-You are a business analyst tasked with analyzing companies and comparing them to a target company for potential business opportunities, partnerships, or market relevance.
-
-**TARGET COMPANY REFERENCE:**
-{target_bd}
-
-**COMPANIES TO ANALYZE:**
-{chr(10).join([f"{i + 1}. {comp['name']}: {comp['description']}" for i, comp in enumerate(companies_data)])}
-
-For each company, analyze and return the following information:
-
-1. **Business Summary**: A clear, concise 1-2 sentence summary of what the company actually does.
-2. **Industry Classification**: Primary industry/sector.
-3. **Business Model**: How the company makes money.
-4. **Key Products/Services**: Main products or services offered.
-5. **Market Focus**: Geographic or market segment focus.
-6. **Relevance Score**: A numerical score from 1.00%–100.00% representing the company's relevance/similarity to the target company. Consider factors like:
-   - Similar products or services
-   - Overlapping market segments
-   - Complementary business activities
-   - Potential for partnerships or competition
-   - Industry alignment
-   Make sure the score is precise to two decimal points and MUST be a number (not text).
-7. **Relevance Reason**: A detailed 1-2 sentence explanation for the relevance score, specifically comparing the company to target company.
-
-**Required Response Format:**
-```json
-{{
-  "companies": [
-    {{
-      "company_name": "Company Name",
-      "business_summary": "Clear summary of what they do",
-      "industry_classification": "Primary industry",
-      "business_model": "How they make money",
-      "key_products_services": "Main products/services",
-      "market_focus": "Geographic/market focus",
-      "relevance_score": 75.50,
-      "relevance_reason": "Detailed reason comparing to target company"
-    }}
-  ]
-}}
-```
-
-IMPORTANT: The relevance_score MUST be a numeric value (like 75.50), not text or string.
-Ensure the JSON is properly formatted and includes all companies listed above.
-"""
-
-    # 🔄 Rotate API key if limit exceeded
-    calls_with_current_key += 1
-    if calls_with_current_key > KEY_USAGE_LIMIT:
-        current_key_index = (current_key_index + 1) % len(api_keys)
-        model = load_gemini_model(api_keys[current_key_index], current_key_index)
-        calls_with_current_key = 1
-
-    retries = 0
-    max_retries = 3
-
-    while retries < max_retries:
+            input_rows = check_shards(args.merge, fingerprint)
+        except (OSError, ShardMergeError) as e:
+            raise SystemExit(f"❌ {e}")
+        print(f"🧩 Merging {len(args.merge)} shards: each of the {input_rows} input rows appears exactly once")
+        results = save_results(args.merge, targets, output_file, tracer)
+        close_trace(tracer, args.trace_file)
+        print_summary(results, targets, output_file)
+        return
+
+    shard, journal_file, journal_fingerprint = None, JOURNAL_FILE, fingerprint
+    if args.shard:
         try:
-            print(f"🤖 Sending batch {batch_num} to Gemini...")
-            response = model.generate_content(prompt)
-            full_response = response.text.strip()
-
-            print(f"🤖 Gemini Response for batch {batch_num}:")
-            print("=" * 80)
-            print(full_response[:500] + "..." if len(full_response) > 500 else full_response)
-            print("=" * 80)
-
-            # Extract JSON from response
-            json_match = re.search(r'```json\s*(\{.*?\})\s*```', full_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                # Try to find JSON without code blocks
-                json_start = full_response.find('{')
-                json_end = full_response.rfind('}') + 1
-                if json_start != -1 and json_end != -1:
-                    json_str = full_response[json_start:json_end]
-                else:
-                    raise ValueError("No JSON found in response")
-
-            # Parse JSON
-            try:
-                parsed_data = json.loads(json_str)
-                companies_analysis = parsed_data.get('companies', [])
-
-                if len(companies_analysis) != len(companies_data):
-                    print(f"⚠️ Warning: Expected {len(companies_data)} companies, got {len(companies_analysis)}")
-
-                # Process results
-                batch_results = []
-                for i, comp_data in enumerate(companies_data):
-                    if i < len(companies_analysis):
-                        analysis = companies_analysis[i]
-
-                        # Clean and convert relevance score
-                        raw_score = analysis.get("relevance_score", 0.00)
-                        cleaned_score = clean_relevance_score(raw_score)
-
-                        result_entry = {
-                            "Company Name": comp_data["name"],
-                            "Original Business Description": comp_data["description"],
-                            "Business Summary": analysis.get("business_summary", "No summary available"),
-                            "Industry Classification": analysis.get("industry_classification", "Not classified"),
-                            "Business Model": analysis.get("business_model", "Not specified"),
-                            "Key Products/Services": analysis.get("key_products_services", "Not specified"),
-                            "Market Focus": analysis.get("market_focus", "Not specified"),
-                            "Relevance Score": cleaned_score,
-                            "Relevance Reason": analysis.get("relevance_reason", "No reason provided")
-                        }
-                    else:
-                        # Fallback for missing analysis
-                        result_entry = {
-                            "Company Name": comp_data["name"],
-                            "Original Business Description": comp_data["description"],
-                            "Business Summary": "Analysis not available",
-                            "Industry Classification": "Not classified",
-                            "Business Model": "Not specified",
-                            "Key Products/Services": "Not specified",
-                            "Market Focus": "Not specified",
-                            "Relevance Score": 0.00,
-                            "Relevance Reason": "Analysis incomplete"
-                        }
-
-                    batch_results.append(result_entry)
-
-                print(f"✅ Successfully processed batch {batch_num}")
-                return batch_results
-
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parsing error: {e}")
-                raise ValueError(f"Invalid JSON format: {e}")
-
-        except Exception as e:
-            retries += 1
-            print(f"⚠️ Error processing batch {batch_num} (attempt {retries}/3): {e}")
-            if retries < max_retries:
-                time.sleep(10)
-            else:
-                print(f"❌ Failed to process batch {batch_num} after {max_retries} attempts")
-                # Return default entries for failed batch
-                return [{
-                    "Company Name": comp["name"],
-                    "Original Business Description": comp["description"],
-                    "Business Summary": "Processing failed",
-                    "Industry Classification": "Error",
-                    "Business Model": "Error",
-                    "Key Products/Services": "Error",
-                    "Market Focus": "Error",
-                    "Relevance Score": 0.00,
-                    "Relevance Reason": "Processing error"
-                } for comp in companies_data]
-
-
-# 🔁 Process companies in batches
-total_batches = (len(df) + batch_size - 1) // batch_size
-all_results = []
-
-for batch_num in range(total_batches):
-    start_idx = batch_num * batch_size
-    end_idx = min((batch_num + 1) * batch_size, len(df))
-    batch_df = df.iloc[start_idx:end_idx]
-
-    batch_results = process_batch(batch_df, batch_num + 1)
-    all_results.extend(batch_results)
-
-    # Save intermediate results
-    if (batch_num + 1) % 5 == 0 or batch_num == total_batches - 1:
-        intermediate_df = pd.DataFrame(all_results)
-        intermediate_file = f"intermediate_classifications_{batch_num + 1}.xlsx"
-        intermediate_df.to_excel(intermediate_file, index=False)
-        print(f"💾 Saved intermediate results: {intermediate_file}")
-
-    # Brief pause between batches
-    if batch_num < total_batches - 1:
-        time.sleep(2)
-
-# 📊 Create final output
-print("📦 Creating final output...")
-final_df = pd.DataFrame(all_results)
-
-print(f"📊 Final dataset contains {len(final_df)} companies")
-print(f"📊 Columns: {final_df.columns.tolist()}")
-
-# Fill any NaN values
-final_df = final_df.fillna("Not specified")
-
-# FIXED: Clean relevance scores before sorting
-print("🔧 Cleaning relevance scores...")
-final_df['Relevance Score'] = final_df['Relevance Score'].apply(clean_relevance_score)
-
-# Ensure all relevance scores are within valid range (0-100)
-final_df['Relevance Score'] = final_df['Relevance Score'].clip(0, 100)
-
-# Sort by relevance score (highest first)
-final_df = final_df.sort_values('Relevance Score', ascending=False)
-
-# Create output with multiple sheets for better organization
-with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-    # Main results
-    final_df.to_excel(writer, sheet_name='All_Companies', index=False)
-
-    # High relevance companies (score >= 70)
-    high_relevance = final_df[final_df['Relevance Score'] >= 70.00]
-    if len(high_relevance) > 0:
-        high_relevance.to_excel(writer, sheet_name='High_Relevance_70+', index=False)
-
-    # Medium relevance companies (score 50-69.99)
-    medium_relevance = final_df[(final_df['Relevance Score'] >= 50.00) & (final_df['Relevance Score'] < 70.00)]
-    if len(medium_relevance) > 0:
-        medium_relevance.to_excel(writer, sheet_name='Medium_Relevance_50-69', index=False)
-
-    # Low relevance companies (score < 50)
-    low_relevance = final_df[final_df['Relevance Score'] < 50.00]
-    if len(low_relevance) > 0:
-        low_relevance.to_excel(writer, sheet_name='Low_Relevance_Below_50', index=False)
-
-print(f"✅ Final results saved: {output_file}")
-
-# 🧹 Clean up intermediate files
-intermediate_files = [f for f in os.listdir() if f.startswith("intermediate_classifications_") and f.endswith(".xlsx")]
-for f in intermediate_files:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            raise SystemExit(f"❌ {e}")
+        # Each shard has its own journal, so several shards can run side by side in one directory
+        journal_file = f"{os.path.splitext(JOURNAL_FILE)[0]}.{shard_name(shard)}.jsonl"
+        journal_fingerprint = dict(fingerprint, shard=list(shard))
+        print(f"🧩 Shard {shard[0]}/{shard[1]}: only this shard's companies are sent")
+
+    # 📂 Open the input as a stream: only the header is read here, rows are parsed chunk by chunk
     try:
-        os.remove(f)
-        print(f"🗑️ Deleted intermediate file: {f}")
-    except Exception as e:
-        print(f"⚠️ Could not delete {f}: {e}")
-
-# 📊 Print summary statistics
-print("\n🎉 Processing complete!")
-print(f"📋 Summary:")
-print(f"   • Total companies processed: {len(final_df)}")
-print(f"   • Output file: {output_file}")
-print(
-    f"   • Columns created: Business Summary, Industry Classification, Business Model, Key Products/Services, Market Focus, Relevance Score, Relevance Reason")
-
-# Relevance score distribution
-high_count = len(final_df[final_df['Relevance Score'] >= 70.00])
-medium_count = len(final_df[(final_df['Relevance Score'] >= 50.00) & (final_df['Relevance Score'] < 70.00)])
-low_count = len(final_df[final_df['Relevance Score'] < 50.00])
-
-print(f"\n📊 Relevance Score Distribution:")
-print(f"   • High Relevance (70+): {high_count} companies")
-print(f"   • Medium Relevance (50-69): {medium_count} companies")
-print(f"   • Low Relevance (<50): {low_count} companies")
-
-if high_count > 0:
-    avg_high = final_df[final_df['Relevance Score'] >= 70.00]['Relevance Score'].mean()
-    print(f"   • Average high relevance score: {avg_high:.2f}")
-
-if len(final_df) > 0:
-    overall_avg = final_df['Relevance Score'].mean()
-    print(f"   • Overall average relevance score: {overall_avg:.2f}")
+        reader = RowReader(args.input, chunk_size=READ_CHUNK_SIZE)
+    except MissingColumnsError as e:
+        raise SystemExit(f"❌ {e}")
+
+    print("📊 Input file columns:", reader.columns)
+    if reader.estimated_rows is not None:
+        print(f"📊 Total companies to process: {'up to ' if reader.rows_upper_bound else ''}{reader.estimated_rows}")
+
+    # 📓 Journal of finished rows; with --resume, rows already journaled are skipped
+    journal = ResultJournal(journal_file, journal_fingerprint, resume=args.resume)
+    # Permanently failed rows are not "done": a resumed run gives them another chance
+    done_rows = ({row_id for row_id, result in journal.entries() if not is_permanent_failure(result)}
+                 if args.resume else set())
+    if done_rows:
+        print(f"⏩ Resuming: {len(done_rows)} companies already done")
+
+    # 🔁 Same engine as the web app: rows are pre-filtered, deduplicated, packed by token budget, sent concurrently
+    # across all keys (no start-up probe) and repaired until settled
+    run = ClassificationRun(reader, targets, {
+        "api_keys": api_keys,
+        "max_batch_size": MAX_COMPANIES_PER_BATCH,
+        "token_budget": TOKEN_BUDGET_PER_BATCH,
+        "max_output_tokens": MAX_OUTPUT_TOKENS,
+        "concurrency_per_key": CONCURRENCY_PER_KEY,
+        "requests_per_minute": REQUESTS_PER_MINUTE,
+        "tokens_per_minute": TOKENS_PER_MINUTE,
+        "cache_file": CACHE_FILE,
+        "cache_max_entries": CACHE_MAX_ENTRIES,
+        "cache_max_age_days": CACHE_MAX_AGE_DAYS,
+        "duplicate_threshold": NEAR_DUPLICATE_THRESHOLD,
+        "prefilter_floor": args.prefilter_floor,
+        "stream_results": args.stream,  # 📡 journal each company the moment its answer is generated
+        "max_repair_attempts": MAX_REPAIR_ATTEMPTS,
+        "shard": shard,
+        "metrics_file": args.metrics_file,  # 📈 rewritten every few seconds while the run goes
+        "tracer": tracer,
+    }, skip_rows=done_rows)
+    for entries in run.batches():
+        # Checkpoint: each finished row (plus the duplicate rows it answers) is written to the journal exactly once
+        with tracer.span("journal append", "write", rows=len(entries)):
+            journal.append([row_id for row_id, _ in entries], [result for _, result in entries])
+
+    stats = run.stats()
+    repair_stats = stats["repairs"]
+    print(f"🩹 Repairs: {repair_stats['retried']} re-sent, {repair_stats['repaired']} recovered, "
+          f"{repair_stats['bisections']} batches bisected, {repair_stats['permanent_failures']} permanently failed")
+    if stats["prefilter"] is not None:
+        prefilter_stats = stats["prefilter"]
+        print(f"🧹 Pre-filtered locally: {prefilter_stats['filtered']} of {prefilter_stats['rows']} companies "
+              f"({prefilter_stats['calls_saved']:.0%} of analyses saved)")
+    metrics = run.metrics.snapshot()
+    requests = metrics["requests"]
+    if requests["count"]:
+        print(f"📈 Requests: {requests['count']} (p50 {requests['p50_seconds']:.1f}s, p99 {requests['p99_seconds']:.1f}s), "
+              f"queue wait p50 {metrics['queue_wait']['p50_seconds']:.1f}s, tokens {metrics['tokens']['prompt']} in / "
+              f"{metrics['tokens']['output']} out, retries {metrics['retries'] or 'none'}")
+    dedup_stats = stats["dedup"]
+    print(f"🧬 Duplicates collapsed: {dedup_stats['exact_duplicates']} exact, {dedup_stats['near_duplicates']} near "
+          f"({dedup_stats['representatives']} companies sent for {dedup_stats['rows']} rows)")
+
+    # 📊 Create final output
+    print("📦 Creating final output...")
+    if shard is not None:
+        # 🧩 A shard writes its rows for --merge instead of a workbook
+        from automator import JournaledResults
+
+        shard_file = f"{os.path.splitext(output_file)[0]}.{shard_name(shard)}.jsonl"
+        shard_stats = stats["shard"]
+        with tracer.span("read journal", "write"):
+            journaled = JournaledResults([journal_file], targets)
+        with tracer.span("write shard", "write", rows=len(journaled)):
+            write_shard(shard_file, fingerprint, shard, shard_stats["input_rows"], journaled.entries(), len(journaled))
+        close_trace(tracer, args.trace_file)
+        journal.remove()
+        print(f"🧩 Shard {shard[0]}/{shard[1]}: {len(journaled)} of {shard_stats['input_rows']} companies saved to "
+              f"{shard_file}; combine all shards with --merge")
+        return
+
+    results = save_results([journal_file], targets, output_file, tracer)
+    close_trace(tracer, args.trace_file)
+
+    # 🧹 The run is complete, so the journal is no longer needed
+    journal.remove()
+    print(f"🗑️ Deleted journal: {journal_file}")
+
+    # 📊 Print summary statistics
+    print_summary(results, targets, output_file)
+
+    cache_stats = stats["cache"]
+    print(f"\n💾 Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+          f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['entries']} entries stored")
+
+
+if __name__ == "__main__":
+    main()
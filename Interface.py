@@ -1,14 +1,17 @@
 import streamlit as st
 import pandas as pd
-import time
-import google.generativeai as genai
-from tqdm import tqdm
-import re
-import json
+import hashlib
 import io
-import os
+import time
 from datetime import datetime
 
+from automator import (BEST_TARGET_COLUMN, ClassificationJob, MissingColumnsError, ResultIndex, RowReader, get_job,
+                       list_jobs, prune_jobs, tune_prefilter)
+from automator.jobs import CANCELLING, COMPLETED, CREATED, FAILED, INTERRUPTED, RESUMABLE
+
+JOB_POLL_SECONDS = 2  # how often the job panel refreshes while a job runs
+JOB_RETENTION_DAYS = 7  # stopped jobs not touched for this long are deleted
+
 # Page configuration
 st.set_page_config(
     page_title="Business Classification Tool",
@@ -173,243 +176,300 @@ if 'api_keys' not in st.session_state:
     st.session_state.api_keys = []
 if 'show_api_config' not in st.session_state:
     st.session_state.show_api_config = True
-
-
-# Utility Functions
-def clean_relevance_score(score):
-    """Convert relevance score to float, handling various input types"""
-    if pd.isna(score):
-        return 0.00
-
-    if isinstance(score, (int, float)):
-        return float(score)
-
-    if isinstance(score, str):
-        cleaned = re.sub(r'[^\d.]', '', str(score))
-        try:
-            return float(cleaned) if cleaned else 0.00
-        except ValueError:
-            return 0.00
-
-    return 0.00
-
-
-def load_gemini_model(api_key, key_index):
-    """Load Gemini model with given API key"""
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-2.5-flash-lite-preview-06-17")
-
-        # Test the model
-        test = model.generate_content("Say OK").text.strip()
-        if "OK" not in test:
-            raise RuntimeError("Unexpected Gemini response")
-
-        return model
-    except Exception as e:
-        raise Exception(f"Failed to initialize Gemini model: {e}")
-
-
-def process_batch(batch_df, batch_num, model, target_bd, api_keys, current_key_index, calls_with_current_key,
-                  key_usage_limit):
-    """Process a single batch of companies"""
-
-    # Prepare batch data
-    companies_data = []
-    for idx, row in batch_df.iterrows():
-        comp_name = row["Company Name"]
-        comp_bd = row["Business Description"]
-
-        if pd.isna(comp_bd) or comp_bd == "" or str(comp_bd).strip() == "":
-            comp_bd = "No business description available"
-
-        companies_data.append({
-            "name": str(comp_name) if pd.notna(comp_name) else "Unknown",
-            "description": str(comp_bd)
-        })
-
-    # Create prompt
-    prompt = f"""
-You are a business analyst tasked with analyzing companies and comparing them to a target company for potential business opportunities, partnerships, or market relevance.
-
-**TARGET COMPANY REFERENCE:**
-{target_bd}
-
-**COMPANIES TO ANALYZE:**
-{chr(10).join([f"{i + 1}. {comp['name']}: {comp['description']}" for i, comp in enumerate(companies_data)])}
-
-For each company, analyze and return the following information:
-
-1. **Business Summary**: A clear, concise 1-2 sentence summary of what the company actually does.
-2. **Industry Classification**: Primary industry/sector.
-3. **Business Model**: How the company makes money.
-4. **Key Products/Services**: Main products or services offered.s
-5. **Market Focus**: Geographic or market segment focus.
-6. **Relevance Score**: A numerical score from 1.00–100.00 representing the company's relevance/similarity to the target company.
-7. **Relevance Reason**: A detailed 1-2 sentence explanation for the relevance score.
-
-**Required Response Format:**
-```json
-{{
-  "companies": [
-    {{
-      "company_name": "Company Name",
-      "business_summary": "Clear summary of what they do",
-      "industry_classification": "Primary industry",
-      "business_model": "How they make money",
-      "key_products_services": "Main products/services",
-      "market_focus": "Geographic/market focus",
-      "relevance_score": 75.50,
-      "relevance_reason": "Detailed reason comparing to target company"
-    }}
-  ]
-}}
-```
-
-IMPORTANT: The relevance_score MUST be a numeric value (like 75.50), not text or string.
-"""
-
-    # Rotate API key if needed
-    calls_with_current_key += 1
-    if calls_with_current_key > key_usage_limit:
-        current_key_index = (current_key_index + 1) % len(api_keys)
-        model = load_gemini_model(api_keys[current_key_index], current_key_index)
-        calls_with_current_key = 1
-
-    # Make API call
-    max_retries = 3
-    for retry in range(max_retries):
-        try:
-            response = model.generate_content(prompt)
-            full_response = response.text.strip()
-
-            # Extract JSON
-            json_match = re.search(r'```json\s*(\{.*?\})\s*```', full_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                json_start = full_response.find('{')
-                json_end = full_response.rfind('}') + 1
-                if json_start != -1 and json_end != -1:
-                    json_str = full_response[json_start:json_end]
-                else:
-                    raise ValueError("No JSON found in response")
-
-            # Parse JSON
-            parsed_data = json.loads(json_str)
-            companies_analysis = parsed_data.get('companies', [])
-
-            # Process results
-            batch_results = []
-            for i, comp_data in enumerate(companies_data):
-                if i < len(companies_analysis):
-                    analysis = companies_analysis[i]
-                    result_entry = {
-                        "Company Name": comp_data["name"],
-                        "Original Business Description": comp_data["description"],
-                        "Business Summary": analysis.get("business_summary", "No summary available"),
-                        "Industry Classification": analysis.get("industry_classification", "Not classified"),
-                        "Business Model": analysis.get("business_model", "Not specified"),
-                        "Key Products/Services": analysis.get("key_products_services", "Not specified"),
-                        "Market Focus": analysis.get("market_focus", "Not specified"),
-                        "Relevance Score": analysis.get("relevance_score", 0.00),
-                        "Relevance Reason": analysis.get("relevance_reason", "No reason provided")
-                    }
-                else:
-                    result_entry = {
-                        "Company Name": comp_data["name"],
-                        "Original Business Description": comp_data["description"],
-                        "Business Summary": "Analysis not available",
-                        "Industry Classification": "Not classified",
-                        "Business Model": "Not specified",
-                        "Key Products/Services": "Not specified",
-                        "Market Focus": "Not specified",
-                        "Relevance Score": 0.00,
-                        "Relevance Reason": "Analysis incomplete"
-                    }
-
-                batch_results.append(result_entry)
-
-            return batch_results
-
-        except Exception as e:
-            if retry < max_retries - 1:
-                time.sleep(5)
-                continue
-            else:
-                # Return error entries
-                return [{
-                    "Company Name": comp["name"],
-                    "Original Business Description": comp["description"],
-                    "Business Summary": "Processing failed",
-                    "Industry Classification": "Error",
-                    "Business Model": "Error",
-                    "Key Products/Services": "Error",
-                    "Market Focus": "Error",
-                    "Relevance Score": 0.00,
-                    "Relevance Reason": f"Processing error: {str(e)}"
-                } for comp in companies_data]
-
-
-def process_companies(df, target_bd, batch_size, key_usage_limit):
-    """Process companies using Gemini API"""
-
-    # Initialize progress tracking
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-
+if 'job_ids' not in st.session_state:
+    # Jobs are shared on disk; a session sees only the ones it created, kept in the URL so a refresh finds them again
+    prune_jobs(JOB_RETENTION_DAYS * 24 * 3600)
+    owned_ids = [job_id for job_id in st.query_params.get("jobs", "").split(",") if job_id]
+    st.session_state.job_ids = [job.id for job in list_jobs(job_ids=owned_ids)]
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = st.session_state.job_ids[0] if st.session_state.job_ids else None
+if 'loaded_job' not in st.session_state:
+    st.session_state.loaded_job = None
+if 'job_polling' not in st.session_state:
+    st.session_state.job_polling = False
+if 'results_key' not in st.session_state:
+    st.session_state.results_key = None
+if 'result_index' not in st.session_state:
+    st.session_state.result_index = None
+if 'prepared_exports' not in st.session_state:
+    st.session_state.prepared_exports = set()
+
+
+def format_rows(rows_done, total_rows):
+    """'120/5000', or '120/?' while the total is still being counted"""
+    return f"{rows_done}/{'?' if total_rows is None else total_rows}"
+
+
+def format_duration(seconds):
+    """Human-readable duration such as '1h 05m' or '42s'."""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def content_digest(data):
+    """SHA-256 of an upload; cached parsing is keyed on the file content, not on the widget"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def frame_digest(df):
+    """Content hash of a results frame, computed once when results are loaded"""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
+
+
+# The cached helpers below run once per distinct input and are reused across reruns (slider drags, tab switches).
+# Arguments starting with "_" are not hashed by Streamlit; the digest/key argument before them stands in for them.
+@st.cache_data(max_entries=8, show_spinner=False)
+def inspect_upload(digest, file_name, _data):
+    """Columns, row count and a 10-row preview of an upload, parsed once per file content"""
+    reader = RowReader(io.BytesIO(_data), file_name=file_name)
+    preview_chunks = reader.chunks()
+    preview_df = next(preview_chunks, pd.DataFrame(columns=reader.columns)).head(10)
+    preview_chunks.close()
+    total_rows = reader.estimated_rows
+    if total_rows is not None and reader.rows_upper_bound:
+        total_rows = f"≤ {total_rows}"  # the sheet's extent, which may include blank rows
+    return reader.columns, total_rows, preview_df
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def tune_prefilter_on_sample(digest, file_name, targets, _data):
+    """Pre-filter tuning table for a labeled sample, computed once per sample content and targets"""
+    labeled_df = pd.read_csv(io.BytesIO(_data)) if file_name.endswith(".csv") else pd.read_excel(io.BytesIO(_data))
+    return tune_prefilter(labeled_df, targets)
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def job_results(job_id, rows_done, updated):
+    """Journaled results of a job, re-read only when the job has written new rows"""
+    return get_job(job_id).results()
+
+
+@st.cache_data(max_entries=4, show_spinner="Preparing CSV...")
+def export_csv(results_key, _df):
+    return _df.to_csv(index=False).encode("utf-8")
+
+
+@st.cache_data(max_entries=4, show_spinner="Preparing Excel workbook...")
+def export_excel(results_key, _df):
+    """Full results workbook with the relevance band sheets"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        _df.to_excel(writer, sheet_name='All_Companies', index=False)
+
+        # High relevance sheet
+        high_rel = _df[_df['Relevance Score'] >= 70]
+        if len(high_rel) > 0:
+            high_rel.to_excel(writer, sheet_name='High_Relevance_70+', index=False)
+
+        # Medium relevance sheet
+        medium_rel = _df[(_df['Relevance Score'] >= 50) & (_df['Relevance Score'] < 70)]
+        if len(medium_rel) > 0:
+            medium_rel.to_excel(writer, sheet_name='Medium_Relevance_50-69', index=False)
+    return output.getvalue()
+
+
+@st.cache_data(max_entries=16, show_spinner="Preparing filtered workbook...")
+def export_filtered_excel(results_key, min_score, industries, total, _filtered_df):
+    """Filtered results plus a sheet describing the filter"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        _filtered_df.to_excel(writer, sheet_name='Filtered_Results', index=False)
+
+        # Add summary sheet with filter info
+        summary_data = {
+            'Filter Summary': [
+                f'Total Companies: {total}',
+                f'Filtered Companies: {len(_filtered_df)}',
+                f'Minimum Score: {min_score}',
+                f'Selected Industries: {", ".join(industries) if industries else "All"}',
+                f'Export Date: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
+            ]
+        }
+        pd.DataFrame(summary_data).to_excel(writer, sheet_name='Filter_Summary', index=False)
+    return output.getvalue()
+
+
+def lazy_download(label, export_key, build, file_name, mime):
+    """Build an export only once it is asked for; afterwards the button serves the cached bytes"""
+    if export_key not in st.session_state.prepared_exports:
+        if not st.button(f"📦 Prepare {label}", key=f"prepare_{export_key[0]}"):
+            return
+        st.session_state.prepared_exports.add(export_key)
+    st.download_button(label=f"📥 {label}", data=build(), file_name=file_name, mime=mime,
+                       key=f"download_{export_key[0]}")
+
+
+def start_job(uploaded_file, targets, settings):
+    """Store the upload as a job and run it in the background, outside this script run"""
+    job = ClassificationJob.create(uploaded_file.name, uploaded_file.getvalue(), targets, settings)
+    job.start(st.session_state.api_keys)
+    st.session_state.job_id = job.id
+    st.session_state.job_ids.insert(0, job.id)
+    st.query_params["jobs"] = ",".join(st.session_state.job_ids)
+
+
+def delete_job(job):
+    """Remove the job and its directory, and forget it in this session"""
+    job.delete()
+    st.session_state.job_ids.remove(job.id)
+    st.query_params["jobs"] = ",".join(st.session_state.job_ids)
+    st.session_state.job_id = st.session_state.job_ids[0] if st.session_state.job_ids else None
+    st.session_state.job_polling = False
+    if st.session_state.loaded_job == job.id:
+        st.session_state.loaded_job = None
+
+
+def load_job_results(job):
+    """Make the job's journaled rows the results shown in the Results and Analytics tabs"""
+    results_df = job_results(job.id, job.state.get("rows_done", 0), job.state.get("updated"))
+    st.session_state.results_df = results_df
+    st.session_state.results_key = frame_digest(results_df)
+    # Sorted scores, industry codes and histograms, so filters and charts never rescan the frame
+    st.session_state.result_index = ResultIndex(results_df)
+    st.session_state.processing_complete = not results_df.empty
+    st.session_state.loaded_job = job.id
+
+
+def metrics_panel(metrics):
+    """Where time and quota go: request latency, queue wait, tokens, retries and per-key load"""
+    requests = metrics["requests"]
+    errors = requests["count"] - requests["by_outcome"].get("ok", 0)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Requests", requests["count"], delta=f"{errors} failed" if errors else None, delta_color="inverse")
+    with col2:
+        st.metric("Request p50 / p99", f"{requests['p50_seconds']:.1f}s / {requests['p99_seconds']:.1f}s"
+                  if requests["count"] else "—")
+    with col3:
+        st.metric("Queue Wait p50", f"{metrics['queue_wait']['p50_seconds']:.1f}s" if requests["count"] else "—")
+    with col4:
+        st.metric("Tokens In / Out", f"{metrics['tokens']['prompt']:,} / {metrics['tokens']['output']:,}")
+
+    batches = metrics["batches"]
+    notes = []
+    if batches["count"]:
+        notes.append(f"Batches: {batches['count']} (p50 {batches['p50_seconds']:.1f}s, "
+                     f"p99 {batches['p99_seconds']:.1f}s)")
+    if metrics["retries"]:
+        notes.append("Retries: " + ", ".join(f"{count} {kind}" for kind, count in metrics["retries"].items()))
+    if metrics["cache"]:
+        notes.append(f"Cache: {metrics['cache']['hits']} hits, {metrics['cache']['misses']} misses")
+    if notes:
+        st.caption(" · ".join(notes))
+
+    keys_df = pd.DataFrame(metrics["keys"]).rename(columns={
+        "key": "Key", "requests": "Requests", "errors": "Errors", "rate_limited": "Rate Limited",
+        "requests_per_minute": "Requests/min", "prompt_tokens": "Prompt Tokens", "output_tokens": "Output Tokens",
+        "busy_seconds": "Busy (s)"}).set_index("Key")
+    st.dataframe(keys_df.round(1), use_container_width=True)
+
+
+def job_panel():
+    """Progress, controls and partial results of the selected job; polled while the job runs"""
+    job_id = st.session_state.job_id
+    if job_id is None:
+        return
     try:
-        api_keys = st.session_state.api_keys
-        current_key_index = 0
-        calls_with_current_key = 0
-
-        # Load first model
-        model = load_gemini_model(api_keys[current_key_index], current_key_index)
-
-        total_batches = (len(df) + batch_size - 1) // batch_size
-        all_results = []
-
-        for batch_num in range(total_batches):
-            start_idx = batch_num * batch_size
-            end_idx = min((batch_num + 1) * batch_size, len(df))
-            batch_df = df.iloc[start_idx:end_idx]
-
-            status_text.text(f"Processing batch {batch_num + 1}/{total_batches}")
-
-            # Process batch
-            batch_results = process_batch(batch_df, batch_num + 1, model, target_bd,
-                                          api_keys, current_key_index, calls_with_current_key, key_usage_limit)
-
-            all_results.extend(batch_results)
-
-            # Update progress
-            progress = (batch_num + 1) / total_batches
-            progress_bar.progress(progress)
-
-            # Brief pause between batches
-            if batch_num < total_batches - 1:
-                time.sleep(1)
-
-        # Create final results dataframe
-        final_df = pd.DataFrame(all_results)
-        final_df['Relevance Score'] = final_df['Relevance Score'].apply(clean_relevance_score)
-        final_df['Relevance Score'] = final_df['Relevance Score'].clip(0, 100)
-        final_df = final_df.sort_values('Relevance Score', ascending=False)
-
-        # Store results in session state
-        st.session_state.results_df = final_df
-        st.session_state.processing_complete = True
-
-        status_text.text("✅ Processing complete!")
-        st.success(f"🎉 Successfully processed {len(final_df)} companies!")
-
-        # Switch to results tab
-        st.balloons()
+        job = get_job(job_id)
+    except FileNotFoundError:
+        st.session_state.job_id = None
+        return
+
+    progress = job.progress()
+    status = progress["status"]
+    st.session_state.job_polling = job.is_alive()
+
+    st.subheader(f"⚙️ Job {job.id} — {job.state['input_name']}")
+    if progress["total_rows"]:
+        st.progress(min(1.0, progress["rows_done"] / progress["total_rows"]))
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Status", status.capitalize())
+    with col2:
+        st.metric("Companies Done", format_rows(progress["rows_done"], progress["total_rows"]))
+    with col3:
+        st.metric("Throughput", f"{progress['throughput'] * 60:.0f}/min" if progress["throughput"] else "—")
+    with col4:
+        st.metric("ETA", format_duration(progress["eta_seconds"]) if progress["eta_seconds"] is not None else "—")
+
+    # Cancel stops between batches; Resume picks up from the journal without re-sending finished rows
+    button_col1, button_col2, button_col3, button_col4 = st.columns(4)
+    with button_col1:
+        if job.is_alive() and status != CANCELLING:
+            if st.button("⏹️ Cancel", key=f"cancel_{job.id}", use_container_width=True):
+                job.cancel()
+                st.rerun()
+    with button_col2:
+        if status in RESUMABLE and not job.is_alive():
+            if st.button("▶️ Start" if status == CREATED else "▶️ Resume", key=f"resume_{job.id}",
+                         disabled=not st.session_state.api_keys, use_container_width=True):
+                job.start(st.session_state.api_keys)
+                st.rerun()
+    with button_col3:
+        if not job.is_alive() and progress["rows_done"] and status != COMPLETED:
+            if st.button("📊 Show Partial Results", key=f"partial_{job.id}", use_container_width=True):
+                load_job_results(job)
+                st.rerun()
+    with button_col4:
+        if not job.is_alive():
+            if st.button("🗑️ Delete Job", key=f"delete_{job.id}", use_container_width=True):
+                delete_job(job)
+                st.rerun()
 
-    except Exception as e:
-        st.error(f"❌ Error during processing: {str(e)}")
-        progress_bar.empty()
-        status_text.empty()
+    if status == FAILED:
+        st.error(f"❌ Job stopped: {progress['error']}")
+    elif status == INTERRUPTED:
+        st.warning("⚠️ The server stopped while this job was running; resume it to finish the remaining rows")
+    if status in RESUMABLE and not st.session_state.api_keys:
+        st.info("🔐 Add your API keys to resume this job (keys are never stored with the job)")
+    if progress["errors"]:
+        with st.expander(f"⚠️ Recent errors ({len(progress['errors'])})"):
+            st.code("\n".join(progress["errors"]), language="text")
+    metrics = job.metrics()
+    if metrics:
+        with st.expander("📈 Run metrics", expanded=job.is_alive()):
+            metrics_panel(metrics)
+
+    if status == COMPLETED:
+        if st.session_state.loaded_job != job.id:
+            load_job_results(job)
+            st.balloons()
+            st.rerun()
+        st.success(f"🎉 Successfully processed {progress['rows_done']} companies! See the Results tab.")
+        cache_stats = job.state.get("cache")
+        if cache_stats:
+            st.info(f"💾 Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                    f"({cache_stats['hit_rate']:.0%} hit rate)")
+        prefilter_stats = job.state.get("prefilter")
+        if prefilter_stats:
+            st.info(f"🧹 Pre-filtered locally: {prefilter_stats['filtered']} of {prefilter_stats['rows']} companies "
+                    f"({prefilter_stats['calls_saved']:.0%} of analyses saved)")
+        repair_stats = job.state.get("repairs") or {}
+        if repair_stats.get('retried'):
+            st.info(f"🩹 Repairs: {repair_stats['retried']} re-sent, {repair_stats['repaired']} recovered, "
+                    f"{repair_stats['bisections']} batches bisected")
+        if repair_stats.get('permanent_failures'):
+            st.warning(f"⚠️ {repair_stats['permanent_failures']} companies could not be analyzed and are left "
+                       f"unscored (Relevance Reason starts with 'Permanently failed')")
+        dedup_stats = job.state.get("dedup")
+        if dedup_stats and dedup_stats['representatives'] < dedup_stats['rows']:
+            st.info(f"🧬 Duplicates collapsed: {dedup_stats['exact_duplicates']} exact, "
+                    f"{dedup_stats['near_duplicates']} near ({dedup_stats['representatives']} companies sent)")
+    elif progress["rows_done"]:
+        # Partial results land here as batches (or, when streaming, single companies) finish
+        st.caption("Best results so far")
+        st.dataframe(job_results(job.id, progress["rows_done"], job.state.get("updated")).head(10),
+                     use_container_width=True)
+
+
+# st.fragment (Streamlit 1.37+) refreshes only the job panel; older versions rerun the whole page instead
+_fragment = getattr(st, "fragment", None)
+if _fragment is not None:
+    job_panel = _fragment(run_every=JOB_POLL_SECONDS)(job_panel)
 
 
 # Header
@@ -476,11 +536,38 @@ if st.session_state.show_api_config:
     st.subheader("⚙️ Processing Settings")
     config_col1, config_col2 = st.columns(2)
     with config_col1:
-        batch_size = st.slider("Batch Size", min_value=1, max_value=10, value=3,
-                               help="Number of companies to process in each batch")
+        max_batch_size = st.slider("Max Companies per Batch", min_value=1, max_value=50, value=20,
+                                   help="Upper limit on companies per API call; batches are packed by token budget")
+        token_budget = st.number_input("Token Budget per Batch", min_value=2_000, max_value=200_000, value=30_000,
+                                       step=1_000, help="Estimated prompt + output tokens each API call is filled up to")
     with config_col2:
-        key_usage_limit = st.slider("Key Usage Limit", min_value=5, max_value=50, value=15,
-                                    help="Number of API calls per key before rotation")
+        concurrency_per_key = st.slider("Concurrent Batches per Key", min_value=1, max_value=5, value=2,
+                                        help="Number of batches kept in flight on each API key at the same time")
+    rate_col1, rate_col2 = st.columns(2)
+    with rate_col1:
+        requests_per_minute = st.slider("Requests per Minute per Key", min_value=1, max_value=60, value=15,
+                                        help="Request budget of each API key (RPM quota)")
+    with rate_col2:
+        tokens_per_minute = st.number_input("Tokens per Minute per Key", min_value=1000, max_value=4_000_000,
+                                            value=250_000, step=10_000,
+                                            help="Token budget of each API key (TPM quota)")
+    use_cache = st.checkbox("Reuse cached results", value=True,
+                            help="Skip the API call for companies already classified against the same target")
+    duplicate_threshold = st.slider("Near-Duplicate Similarity", min_value=0.5, max_value=1.0, value=0.9, step=0.05,
+                                    help="Descriptions at least this similar are sent once and share the result "
+                                         "(1.0 = exact duplicates only)")
+    prefilter_col1, prefilter_col2 = st.columns(2)
+    with prefilter_col1:
+        use_prefilter = st.checkbox("Local pre-filter", value=False,
+                                    help="Skip the API call for companies whose description shares almost no "
+                                         "vocabulary with any target")
+    with prefilter_col2:
+        prefilter_floor = st.slider("Pre-filter Similarity Floor", min_value=0.0, max_value=0.3, value=0.05,
+                                    step=0.01, disabled=not use_prefilter,
+                                    help="TF-IDF cosine similarity below which a company is marked pre-filtered")
+    stream_results = st.checkbox("Stream results as they arrive", value=False,
+                                 help="Show each company as soon as Gemini has written its answer instead of "
+                                      "waiting for the whole batch")
 
 st.markdown("---")
 
@@ -490,89 +577,129 @@ tab1, tab2, tab3 = st.tabs(["📁 Upload & Process", "📊 Results", "📈 Analy
 with tab1:
     st.header("📁 File Upload & Processing")
 
-    # Target company description
+    # Target company descriptions; every company is scored against all of them in one pass
     st.subheader("🎯 Target Company Reference")
-    target_bd = st.text_area(
-        "Enter target company business description (for relevance scoring)",
-        placeholder="Enter the business description of your target company for comparison...",
-        height=100
-    )
+    num_targets = st.number_input("Number of target companies", min_value=1, max_value=10, value=1, step=1,
+                                  help="Each company is scored against every target in the same API calls")
+    targets = {}
+    for i in range(int(num_targets)):
+        target_name = st.text_input(f"Target {i + 1} name", value=f"Target {i + 1}", key=f"target_name_{i}")
+        target_description = st.text_area(
+            "Enter target company business description (for relevance scoring)",
+            placeholder="Enter the business description of your target company for comparison...",
+            height=100,
+            key=f"target_description_{i}"
+        )
+        if target_name.strip() and target_description.strip():
+            targets[target_name.strip()] = target_description.strip()
+
+    # Check how much recall each pre-filter floor would cost on an already labeled sample
+    with st.expander("🧹 Tune the local pre-filter"):
+        labeled_file = st.file_uploader(
+            "Labeled sample (an earlier results file, or any file with a 'Relevant' column)",
+            type=['xlsx', 'csv'], key="prefilter_sample"
+        )
+        if labeled_file is not None and targets:
+            labeled_data = labeled_file.getvalue()
+            st.dataframe(tune_prefilter_on_sample(content_digest(labeled_data), labeled_file.name, targets, labeled_data),
+                         use_container_width=True)
 
     # File upload
-    st.subheader("📤 Upload Excel File")
+    st.subheader("📤 Upload Company List")
     uploaded_file = st.file_uploader(
-        "Choose an Excel file",
-        type=['xlsx', 'xls'],
+        "Choose an Excel, CSV or Parquet file",
+        type=['xlsx', 'xls', 'csv', 'parquet'],
         help="File must contain 'Company Name' and 'Business Description' columns"
     )
 
     if uploaded_file is not None:
         try:
-            # Read the uploaded file
-            df = pd.read_excel(uploaded_file)
+            # Header and preview are parsed once per file content, not on every rerun
+            upload_data = uploaded_file.getvalue()
+            columns, estimated_rows, preview_df = inspect_upload(content_digest(upload_data), uploaded_file.name,
+                                                                 upload_data)
 
             # Display file info
             st.success(f"✅ File uploaded successfully!")
 
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Companies", len(df))
+                st.metric("Total Companies", estimated_rows if estimated_rows is not None else "—")
             with col2:
-                st.metric("Columns", len(df.columns))
+                st.metric("Columns", len(columns))
             with col3:
                 st.metric("File Size", f"{uploaded_file.size / 1024:.1f} KB")
 
             # Show column info
             st.subheader("📋 File Preview")
-            st.write("**Columns found:**", df.columns.tolist())
-
-            # Check for required columns
-            required_cols = ['Company Name', 'Business Description']
-            missing_cols = [col for col in required_cols if col not in df.columns]
-
-            if missing_cols:
-                st.error(f"❌ Missing required columns: {missing_cols}")
-                st.info("Please ensure your Excel file has 'Company Name' and 'Business Description' columns")
+            st.write("**Columns found:**", columns)
+            st.success("✅ All required columns found!")
+
+            # Show preview from the first chunk only
+            st.dataframe(preview_df, use_container_width=True)
+
+            # Processing button: the job runs in the background and survives reruns and refreshes
+            if st.session_state.api_keys and len(targets) == num_targets:
+                if st.button("🚀 Start Processing", type="primary"):
+                    start_job(uploaded_file, targets, {
+                        "max_batch_size": max_batch_size,
+                        "token_budget": token_budget,
+                        "concurrency_per_key": concurrency_per_key,
+                        "requests_per_minute": requests_per_minute,
+                        "tokens_per_minute": tokens_per_minute,
+                        "use_cache": use_cache,
+                        "duplicate_threshold": duplicate_threshold if duplicate_threshold < 1.0 else None,
+                        "prefilter_floor": prefilter_floor if use_prefilter else None,
+                        "stream_results": stream_results,
+                    })
             else:
-                st.success("✅ All required columns found!")
-
-                # Show preview
-                st.dataframe(df.head(10), use_container_width=True)
+                if not st.session_state.api_keys:
+                    st.warning("⚠️ Please add at least one API key in the sidebar")
+                if len(targets) < num_targets:
+                    st.warning("⚠️ Please enter a name and description for every target company (names must be unique)")
 
-                # Processing button
-                if st.session_state.api_keys and target_bd.strip():
-                    if st.button("🚀 Start Processing", type="primary"):
-                        process_companies(df, target_bd, batch_size, key_usage_limit)
-                else:
-                    if not st.session_state.api_keys:
-                        st.warning("⚠️ Please add at least one API key in the sidebar")
-                    if not target_bd.strip():
-                        st.warning("⚠️ Please enter a target company description")
+        except MissingColumnsError as e:
+            st.error(f"❌ Missing required columns: {e.missing}")
+            st.info("Please ensure your file has 'Company Name' and 'Business Description' columns")
 
         except Exception as e:
             st.error(f"❌ Error reading file: {str(e)}")
 
+    # Background jobs of this session: progress of the selected job, earlier ones selectable for resume or results
+    stored_jobs = list_jobs(job_ids=st.session_state.job_ids)
+    if stored_jobs:
+        st.subheader("🗂️ Classification Jobs")
+        job_labels = {job.id: f"{job.id} · {job.state['input_name']} · {job.status} · "
+                              f"{format_rows(job.state.get('rows_done', 0), job.state.get('total_rows'))} companies"
+                      for job in stored_jobs}
+        job_ids = list(job_labels)
+        selected_job = st.selectbox("Job", job_ids, format_func=job_labels.get,
+                                    index=job_ids.index(st.session_state.job_id)
+                                    if st.session_state.job_id in job_labels else 0)
+        if selected_job != st.session_state.job_id:
+            st.session_state.job_id = selected_job
+            st.session_state.job_polling = False
+        job_panel()
+
 # Results tab
 with tab2:
     st.header("📊 Processing Results")
 
     if st.session_state.processing_complete and st.session_state.results_df is not None:
         df_results = st.session_state.results_df
+        results_key = st.session_state.results_key
+        result_index = st.session_state.result_index
 
         # Summary metrics
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Companies", len(df_results))
+            st.metric("Total Companies", result_index.total)
         with col2:
-            high_relevance = len(df_results[df_results['Relevance Score'] >= 70])
-            st.metric("High Relevance (70+)", high_relevance)
+            st.metric("High Relevance (70+)", result_index.high)
         with col3:
-            medium_relevance = len(
-                df_results[(df_results['Relevance Score'] >= 50) & (df_results['Relevance Score'] < 70)])
-            st.metric("Medium Relevance (50-69)", medium_relevance)
+            st.metric("Medium Relevance (50-69)", result_index.medium)
         with col4:
-            avg_score = df_results['Relevance Score'].mean()
-            st.metric("Average Score", f"{avg_score:.2f}")
+            st.metric("Average Score", f"{result_index.average:.2f}")
 
         # Filters
         st.subheader("🔍 Filter Results")
@@ -582,82 +709,42 @@ with tab2:
         with col2:
             selected_industries = st.multiselect(
                 "Filter by Industry",
-                options=df_results['Industry Classification'].unique(),
+                options=result_index.categories,
                 default=[]
             )
 
-        # Apply filters
-        filtered_df = df_results[df_results['Relevance Score'] >= min_score]
-        if selected_industries:
-            filtered_df = filtered_df[filtered_df['Industry Classification'].isin(selected_industries)]
+        # Apply filters: a binary search on the sorted scores plus the selected industries' rows
+        industries = tuple(selected_industries)
+        filtered_df = result_index.filter(min_score, industries)
 
         # Display results
         st.subheader(f"📋 Results ({len(filtered_df)} companies)")
         st.dataframe(filtered_df, use_container_width=True, height=400)
 
-        # Download buttons
+        # Download buttons: files are only built when asked for, then cached per results and filter state
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         col1, col2, col3 = st.columns(3)
         with col1:
             # Full results CSV
-            csv = df_results.to_csv(index=False)
-            st.download_button(
-                label="📥 Full Results (CSV)",
-                data=csv,
-                file_name=f"business_classifications_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+            lazy_download("Full Results (CSV)", ("csv", results_key),
+                          lambda: export_csv(results_key, df_results),
+                          f"business_classifications_{timestamp}.csv", "text/csv")
 
         with col2:
             # Full results Excel
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_results.to_excel(writer, sheet_name='All_Companies', index=False)
-
-                # High relevance sheet
-                high_rel = df_results[df_results['Relevance Score'] >= 70]
-                if len(high_rel) > 0:
-                    high_rel.to_excel(writer, sheet_name='High_Relevance_70+', index=False)
-
-                # Medium relevance sheet
-                medium_rel = df_results[(df_results['Relevance Score'] >= 50) & (df_results['Relevance Score'] < 70)]
-                if len(medium_rel) > 0:
-                    medium_rel.to_excel(writer, sheet_name='Medium_Relevance_50-69', index=False)
-
-            output.seek(0)
-            st.download_button(
-                label="📥 Full Results (Excel)",
-                data=output,
-                file_name=f"business_classifications_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            lazy_download("Full Results (Excel)", ("excel", results_key),
+                          lambda: export_excel(results_key, df_results),
+                          f"business_classifications_{timestamp}.xlsx",
+                          "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
         with col3:
             # Filtered results Excel
             if len(filtered_df) != len(df_results):
-                filtered_output = io.BytesIO()
-                with pd.ExcelWriter(filtered_output, engine='openpyxl') as writer:
-                    filtered_df.to_excel(writer, sheet_name='Filtered_Results', index=False)
-                    
-                    # Add summary sheet with filter info
-                    summary_data = {
-                        'Filter Summary': [
-                            f'Total Companies: {len(df_results)}',
-                            f'Filtered Companies: {len(filtered_df)}',
-                            f'Minimum Score: {min_score}',
-                            f'Selected Industries: {", ".join(selected_industries) if selected_industries else "All"}',
-                            f'Export Date: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-                        ]
-                    }
-                    summary_df = pd.DataFrame(summary_data)
-                    summary_df.to_excel(writer, sheet_name='Filter_Summary', index=False)
-                
-                filtered_output.seek(0)
-                st.download_button(
-                    label="📥 Filtered Results (Excel)",
-                    data=filtered_output,
-                    file_name=f"filtered_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                lazy_download("Filtered Results (Excel)", ("filtered", results_key, min_score, industries),
+                              lambda: export_filtered_excel(results_key, min_score, industries, len(df_results),
+                                                            filtered_df),
+                              f"filtered_results_{timestamp}.xlsx",
+                              "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
     else:
         st.info("📋 No results available yet. Please process some companies first.")
@@ -667,7 +754,7 @@ with tab3:
     st.header("📈 Analytics Dashboard")
 
     if st.session_state.processing_complete and st.session_state.results_df is not None:
-        df_results = st.session_state.results_df
+        result_index = st.session_state.result_index
 
         # Score distribution
         st.subheader("📊 Relevance Score Distribution")
@@ -675,23 +762,24 @@ with tab3:
 
         with col1:
             # Histogram
-            fig_hist = st.bar_chart(df_results['Relevance Score'].value_counts().sort_index())
+            st.bar_chart(result_index.score_counts)
 
         with col2:
             # Industry distribution
-            industry_counts = df_results['Industry Classification'].value_counts().head(10)
-            st.bar_chart(industry_counts)
+            st.bar_chart(result_index.category_counts.head(10))
 
         # Top companies
         st.subheader("🏆 Top Companies by Relevance Score")
-        top_companies = df_results.head(10)[
-            ['Company Name', 'Relevance Score', 'Industry Classification', 'Business Summary']]
-        st.dataframe(top_companies, use_container_width=True)
+        st.dataframe(result_index.top, use_container_width=True)
+
+        # Best target per company (multi-target runs)
+        if BEST_TARGET_COLUMN in result_index.counts:
+            st.subheader("🎯 Best Matching Target")
+            st.bar_chart(result_index.counts[BEST_TARGET_COLUMN])
 
         # Business model analysis
         st.subheader("💼 Business Model Distribution")
-        model_counts = df_results['Business Model'].value_counts().head(8)
-        st.bar_chart(model_counts)
+        st.bar_chart(result_index.counts["Business Model"].head(8))
 
     else:
         st.info("📈 Analytics will be available after processing companies.")
@@ -699,3 +787,8 @@ with tab3:
 # Footer
 st.markdown("---")
 st.markdown("**Built with Streamlit** | Business Classification Tool v1.0")
+
+# Without st.fragment, keep the job panel live by rerunning the page while the job runs
+if _fragment is None and st.session_state.job_polling:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
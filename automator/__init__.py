@@ -0,0 +1,85 @@
+"""Shared engine pieces used by both the CLI (CCM-CTM_Automator.py) and the Streamlit app (Interface.py).
+
+Submodules are imported on first attribute access, so ``import automator``
+is instant and pulls in neither pandas nor the Gemini SDK, and never touches
+the network.
+"""
+
+import importlib
+
+# Public name -> submodule defining it
+_EXPORTS = {
+    "MODEL_NAME": "client_pool",
+    "ClientPool": "client_pool",
+    "CLUSTER_COLUMN": "dedup",
+    "Deduplicator": "dedup",
+    "dispatch_batches": "dispatcher",
+    "DEFAULT_CONFIG": "engine",
+    "ClassificationRun": "engine",
+    "classify": "engine",
+    "ClassificationJob": "jobs",
+    "get_job": "jobs",
+    "list_jobs": "jobs",
+    "prune_jobs": "jobs",
+    "JournalMismatchError": "journal",
+    "ResultJournal": "journal",
+    "read_journal": "journal",
+    "run_fingerprint": "journal",
+    "KeyPool": "key_pool",
+    "NoHealthyKeysError": "key_pool",
+    "is_rate_limit_error": "key_pool",
+    "RunMetrics": "metrics",
+    "TokenPacker": "packing",
+    "PERMANENT_FAILURE_REASON": "pipeline",
+    "PROMPT_VERSION": "pipeline",
+    "Pipeline": "pipeline",
+    "clean_relevance_score": "pipeline",
+    "clean_results": "pipeline",
+    "clean_scores": "pipeline",
+    "is_permanent_failure": "pipeline",
+    "PreFilter": "prefilter",
+    "tune_prefilter": "prefilter",
+    "REQUIRED_COLUMNS": "readers",
+    "MissingColumnsError": "readers",
+    "RowReader": "readers",
+    "RepairQueue": "repair",
+    "ResultCache": "result_cache",
+    "ResultIndex": "result_index",
+    "ResultStore": "result_store",
+    "ShardMergeError": "sharding",
+    "check_shards": "sharding",
+    "merge_shards": "sharding",
+    "parse_shard": "sharding",
+    "shard_name": "sharding",
+    "write_shard": "sharding",
+    "RetryPolicy": "retry",
+    "SafetyBlockedError": "retry",
+    "classify_error": "retry",
+    "StreamingSink": "streaming",
+    "Tracer": "tracing",
+    "BEST_TARGET_COLUMN": "targets",
+    "TargetsFileError": "targets",
+    "load_targets": "targets",
+    "score_columns": "targets",
+    "targets_text": "targets",
+    "OUTPUT_FORMATS": "writers",
+    "JournaledResults": "writers",
+    "check_output": "writers",
+    "output_format": "writers",
+    "write_results": "writers",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'automator' has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"automator.{module}"), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
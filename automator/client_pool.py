@@ -0,0 +1,124 @@
+"""One cached Gemini model handle per API key.
+
+``genai.configure`` is process-global, so switching keys with it makes
+concurrent use of several keys impossible. Instead every key gets its own
+generative client, built once on first use and reused afterwards. There is no
+"Say OK" probe: key health is judged from real traffic. Invalid keys are
+evicted from the pool, keys that keep failing have their circuit opened for a
+cooldown, and rate-limited keys are parked for the server's retry-after hint.
+"""
+
+import threading
+import time
+
+from automator.key_pool import DEFAULT_PARK_SECONDS
+from automator.retry import (INVALID_KEY, PARSE, RATE_LIMIT, SAFETY, SafetyBlockedError, blocked_reason,
+                             classify_error, retry_after_seconds)
+from automator.tracing import Tracer
+
+MODEL_NAME = "gemini-2.5-flash-lite-preview-06-17"
+
+
+def gemini_model(api_key, model_name):
+    """A Gemini model bound to its own client for ``api_key`` rather than the process-global default."""
+    # Imported on first use: the SDK takes most of a second to load and a run may never need it
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+
+    manager = genai_client._ClientManager()
+    manager.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name)
+    model._client = manager.make_client("generative")
+    return model
+
+
+class ClientPool:
+    """Builds one model per key lazily and takes keys that prove unhealthy out of rotation."""
+
+    def __init__(self, api_keys, key_pool, model_name=MODEL_NAME, model_factory=None, metrics=None, tracer=None,
+                 log=print):
+        if len(api_keys) != key_pool.num_keys:
+            raise ValueError("key_pool must have one slot per API key")
+        self.api_keys = list(api_keys)
+        self.key_pool = key_pool
+        self.model_name = model_name
+        # (api_key, model_name) -> object with generate_content(prompt, stream=False); e.g. a simulated backend
+        self.model_factory = model_factory or gemini_model
+        self.metrics = metrics  # optional RunMetrics recording every request
+        self.tracer = tracer or Tracer()
+        self.log = log or (lambda message: None)  # key evictions, parking and circuit breaks
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, key_index):
+        """Return the cached model for ``key_index``, building it on first use."""
+        with self._lock:
+            model = self._models.get(key_index)
+            if model is None:
+                model = self.model_factory(self.api_keys[key_index], self.model_name)
+                self._models[key_index] = model
+            return model
+
+    def evict(self, key_index, reason):
+        """Drop a key from rotation for the rest of the run."""
+        with self._lock:
+            self._models.pop(key_index, None)
+        self.log(f"❌ Evicting API key #{key_index + 1}: {reason}")
+        self.key_pool.evict(key_index)
+
+    def generate(self, prompt, lease, on_text=None, stage="request"):
+        """Send ``prompt`` on the leased key, updating key health and token usage from the outcome.
+
+        With ``on_text`` the answer is streamed and each piece of text is
+        passed to ``on_text`` as it arrives; the full response is still returned.
+        """
+        key_index = lease.key_index
+        started = time.perf_counter()
+        if lease.wait_seconds >= 0.001:
+            self.tracer.complete("wait for key", started - lease.wait_seconds, started, "key", key=key_index + 1)
+        trace_args = {"key": key_index + 1, "stage": stage}
+        try:
+            if on_text is None:
+                response = self.model(key_index).generate_content(prompt)
+            else:
+                response = self.model(key_index).generate_content(prompt, stream=True)
+                for chunk in response:
+                    if "first_byte_seconds" not in trace_args:
+                        trace_args["first_byte_seconds"] = time.perf_counter() - started
+                        self.tracer.instant("first byte", "request", key=key_index + 1)
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue  # a chunk without text parts (e.g. only the finish reason)
+                    on_text(text)
+        except Exception as e:
+            kind = classify_error(e)
+            self.tracer.complete(f"request on key #{key_index + 1}", started, cat="request", outcome=kind, **trace_args)
+            if self.metrics is not None:
+                self.metrics.record_request(key_index, stage, time.perf_counter() - started, lease.wait_seconds, kind)
+            if kind == RATE_LIMIT:
+                seconds = retry_after_seconds(e) or DEFAULT_PARK_SECONDS
+                self.log(f"⏸️ Key #{key_index + 1} hit its rate limit, parking it for {seconds:.0f}s")
+                lease.park(seconds)
+            elif kind == INVALID_KEY:
+                self.evict(key_index, e)
+            elif kind not in (PARSE, SAFETY):
+                cooldown = self.key_pool.record_failure(key_index)
+                if cooldown is not None:
+                    self.log(f"🔌 Key #{key_index + 1} keeps failing, opening its circuit for {cooldown:.0f}s: {e}")
+            raise
+
+        self.key_pool.record_success(key_index)
+        usage = response.usage_metadata
+        self.tracer.complete(f"request on key #{key_index + 1}", started, cat="request", outcome="ok",
+                             prompt_tokens=getattr(usage, "prompt_token_count", None),
+                             output_tokens=getattr(usage, "candidates_token_count", None), **trace_args)
+        if self.metrics is not None:
+            self.metrics.record_request(key_index, stage, time.perf_counter() - started, lease.wait_seconds,
+                                        usage=usage)
+        if usage:
+            lease.record_tokens(usage.total_token_count)
+        reason = blocked_reason(response)
+        if reason:
+            raise SafetyBlockedError(reason)
+        return response
@@ -0,0 +1,176 @@
+"""Collapse exact and near-duplicate business descriptions before dispatch.
+
+Vendor exports often repeat the same description for subsidiaries and share
+classes. Only one representative per cluster is sent to Gemini; its result is
+then fanned back out to every member row, with a "Duplicate Cluster" column
+recording which representative (input row id) each row was answered from.
+
+Exact duplicates are found by hashing the normalized description. Near
+duplicates use MinHash signatures over word 3-grams with LSH banding, and a
+candidate only joins a cluster if its estimated Jaccard similarity reaches the
+configured threshold.
+"""
+
+import hashlib
+import re
+
+import numpy as np
+
+CLUSTER_COLUMN = "Duplicate Cluster"
+MEMBER_COLUMNS = ("Company Name", "Original Business Description", CLUSTER_COLUMN)  # a member's own values
+DEFAULT_THRESHOLD = 0.9
+NUM_PERM = 64
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def normalize_description(text):
+    """Lowercase, strip punctuation and collapse whitespace."""
+    if text is None or text != text:
+        return ""
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).lower()).split())
+
+
+def _lsh_bands(threshold, num_perm):
+    """(bands, rows) whose LSH threshold is the highest one not above ``threshold``, for recall."""
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [(bands, rows) for bands, rows in options if (1 / bands) ** (1 / rows) <= threshold]
+    return max(below, key=lambda option: (1 / option[0]) ** (1 / option[1])) if below else options[0]
+
+
+class Deduplicator:
+    """Streaming duplicate detector: ``split`` each chunk, ``fan_out`` each batch of results."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        # One random 64-bit mask per permutation, mixed with a splitmix64 finalizer
+        self._masks = np.random.RandomState(seed).randint(0, 2 ** 63 - 1, num_perm, dtype=np.int64).astype(np.uint64)
+        self.bands, self.rows_per_band = _lsh_bands(threshold, num_perm) if threshold else (0, 0)
+
+        self._exact = {}  # normalized description hash -> representative row id
+        self._buckets = [{} for _ in range(self.bands)]  # band hash -> representative row ids
+        self._signatures = {}  # representative row id -> MinHash signature
+        self._waiting = {}  # representative row id -> [(member row id, name, description)]
+        self._resolved = {}  # representative row id -> (columns, values) its members copy
+        self._column_names = {}  # one shared tuple per distinct set of copied columns
+        self._ready = []  # (row id, result) for members whose representative was already answered
+
+        self.rows_seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def _signature(self, normalized):
+        words = normalized.split()
+        shingles = {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+        hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+                           for shingle in shingles], dtype=np.uint64)
+        mixed = hashes[:, None] ^ self._masks[None, :]
+        mixed = (mixed ^ (mixed >> np.uint64(30))) * _MIX_1
+        mixed = (mixed ^ (mixed >> np.uint64(27))) * _MIX_2
+        mixed ^= mixed >> np.uint64(31)
+        return mixed.min(axis=0)
+
+    def _band_keys(self, signature):
+        r = self.rows_per_band
+        return [signature[band * r:(band + 1) * r].tobytes() for band in range(self.bands)]
+
+    def _find_near_duplicate(self, signature):
+        checked = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            for rep_id in self._buckets[band].get(key, ()):
+                if rep_id not in checked:
+                    checked.add(rep_id)
+                    if np.mean(self._signatures[rep_id] == signature) >= self.threshold:
+                        return rep_id
+        return None
+
+    def _add_representative(self, row_id, digest, signature):
+        self._exact[digest] = row_id
+        if signature is not None:
+            self._signatures[row_id] = signature
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(key, []).append(row_id)
+
+    def _add_member(self, rep_id, row_id, name, description):
+        if rep_id in self._resolved:
+            self._ready.append((row_id, self._member_result(self._resolved[rep_id], rep_id, name, description)))
+        else:
+            self._waiting.setdefault(rep_id, []).append((row_id, name, description))
+
+    def _shared(self, result):
+        """What members copy from a representative's result, without its name, description and row dict.
+
+        Every representative is kept until the end of the input, since a duplicate may still follow, so only
+        the analysis values are held, as a tuple next to a column-name tuple shared by all results.
+        """
+        columns = tuple(column for column in result if column not in MEMBER_COLUMNS)
+        columns = self._column_names.setdefault(columns, columns)
+        return columns, tuple(result[column] for column in columns)
+
+    @staticmethod
+    def _member_result(shared, rep_id, name, description):
+        result = {
+            "Company Name": str(name) if name == name and name is not None else "Unknown",
+            "Original Business Description": str(description),
+        }
+        result.update(zip(*shared))
+        result[CLUSTER_COLUMN] = rep_id
+        return result
+
+    def split(self, chunk):
+        """Return the rows of ``chunk`` that still need to be sent (one per cluster)."""
+        keep = []
+        for row_id, name, description in zip(chunk.index, chunk["Company Name"], chunk["Business Description"]):
+            self.rows_seen += 1
+            normalized = normalize_description(description)
+            if not normalized:
+                keep.append(row_id)  # empty descriptions say nothing about being the same company
+                continue
+
+            digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+            rep_id = self._exact.get(digest)
+            if rep_id is not None:
+                self.exact_duplicates += 1
+                self._add_member(rep_id, row_id, name, description)
+                continue
+
+            signature = self._signature(normalized) if self.bands else None
+            rep_id = self._find_near_duplicate(signature) if signature is not None else None
+            if rep_id is not None:
+                self.near_duplicates += 1
+                self._exact[digest] = rep_id
+                self._add_member(rep_id, row_id, name, description)
+                continue
+
+            self._add_representative(row_id, digest, signature)
+            keep.append(row_id)
+        return chunk.loc[keep]
+
+    @staticmethod
+    def tag(row_id, result):
+        """A representative's own result, labelled with its cluster."""
+        return dict(result, **{CLUSTER_COLUMN: int(row_id)})
+
+    def fan_out(self, row_ids, results):
+        """Yield ``(row_id, result)`` for a finished batch plus every member row it answers."""
+        for row_id, result in zip(row_ids, results):
+            result = self.tag(row_id, result)
+            shared = self._resolved[row_id] = self._shared(result)
+            yield row_id, result
+            for member_id, name, description in self._waiting.pop(row_id, ()):
+                yield member_id, self._member_result(shared, row_id, name, description)
+        yield from self.flush()
+
+    def flush(self):
+        """Yield members whose representative had already been answered when they were read."""
+        ready, self._ready = self._ready, []
+        yield from ready
+
+    def stats(self):
+        return {
+            "rows": self.rows_seen,
+            "representatives": self.rows_seen - self.exact_duplicates - self.near_duplicates,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+        }
@@ -0,0 +1,50 @@
+"""Concurrent batch dispatch across all configured Gemini API keys.
+
+Each Gemini call is pure I/O wait, so instead of sending one batch at a time
+we keep several batches in flight on a thread pool and hand each one back as
+soon as it finishes. A free slot is refilled on any completion, so one slow
+batch (sleeping through a retry-after, or waiting for a parked key) does not
+hold back the batches behind it. Which key a batch runs on is decided by the
+``KeyPool``.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+POLL_INTERVAL = 0.5  # seconds between on_wait calls while batches are still running
+
+
+def dispatch_batches(batches, process_fn, max_in_flight, on_wait=None):
+    """Run ``process_fn(batch_df, batch_num)`` concurrently over ``batches``.
+
+    ``batches`` is any iterable of ``(batch_num, batch_df)`` pairs and is consumed
+    lazily, so at most ``max_in_flight`` batches are held in memory at once
+    (use ``KeyPool.capacity``). Yields ``(batch_num, batch_df, batch_results)`` in
+    the order the batches finish; consumers key results by row id. While waiting,
+    ``on_wait()`` is called on the calling thread every ``POLL_INTERVAL`` seconds
+    (e.g. to show streamed rows).
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+
+    pending = {}  # future -> (batch_num, batch_df)
+
+    def finished():
+        while True:
+            done, _ = wait(pending, timeout=POLL_INTERVAL if on_wait is not None else None,
+                           return_when=FIRST_COMPLETED)
+            if done:
+                break
+            on_wait()
+        for future in sorted(done, key=lambda future: pending[future][0]):
+            done_num, done_df = pending.pop(future)
+            yield done_num, done_df, future.result()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="gemini-batch") as executor:
+        for batch_num, batch_df in batches:
+            pending[executor.submit(process_fn, batch_df, batch_num)] = (batch_num, batch_df)
+            # Keep the window full but never run ahead of what the keys can take
+            while len(pending) >= max_in_flight:
+                yield from finished()
+
+        while pending:
+            yield from finished()
@@ -0,0 +1,293 @@
+"""Programmatic entry point: classify rows against one or more targets.
+
+``classify(rows, target, config)`` wires the engine pieces together (row
+chunks, pre-filter, deduplication, token packing, repair queue, concurrent
+dispatch, the two-stage pipeline and the result cache) and yields
+``(row_id, result)`` as rows finish. The CLI and the web app's background jobs
+both run on ``ClassificationRun``, so there is a single hot path.
+
+The run executes on a producer thread and hands finished rows over a queue,
+so streamed companies reach the consumer as soon as Gemini has written them.
+Closing the iterator early, or calling ``cancel()``, stops the run between
+batches. Nothing here touches the network until the first batch is sent.
+"""
+
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+from automator.client_pool import MODEL_NAME, ClientPool
+from automator.dedup import DEFAULT_THRESHOLD, Deduplicator
+from automator.key_pool import DEFAULT_RPM, DEFAULT_TPM, KeyPool
+from automator.metrics import METRICS_WRITE_SECONDS, RunMetrics
+from automator.packing import DEFAULT_MAX_COMPANIES, DEFAULT_MAX_OUTPUT_TOKENS, DEFAULT_TOKEN_BUDGET, TokenPacker
+from automator.pipeline import PROMPT_VERSION, Pipeline
+from automator.prefilter import PreFilter
+from automator.readers import DEFAULT_CHUNK_SIZE, REQUIRED_COLUMNS, MissingColumnsError, RowReader
+from automator.repair import MAX_REPAIR_ATTEMPTS, RepairQueue
+from automator.result_cache import DEFAULT_CACHE_FILE, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_ENTRIES, ResultCache
+from automator.sharding import parse_shard, shard_mask
+from automator.streaming import StreamingSink
+from automator.targets import targets_text
+from automator.tracing import Tracer
+
+DEFAULT_CONFIG = {
+    "api_keys": (),
+    "model_name": MODEL_NAME,
+    "model_factory": None,  # (api_key, model_name) -> model; None builds real Gemini clients
+    "max_batch_size": DEFAULT_MAX_COMPANIES,
+    "token_budget": DEFAULT_TOKEN_BUDGET,
+    "max_output_tokens": DEFAULT_MAX_OUTPUT_TOKENS,
+    "concurrency_per_key": 2,
+    "requests_per_minute": DEFAULT_RPM,
+    "tokens_per_minute": DEFAULT_TPM,
+    "use_cache": True,
+    "cache_file": DEFAULT_CACHE_FILE,
+    "cache_max_entries": DEFAULT_MAX_ENTRIES,
+    "cache_max_age_days": DEFAULT_MAX_AGE_DAYS,
+    "duplicate_threshold": DEFAULT_THRESHOLD,  # None collapses exact duplicates only
+    "prefilter_floor": None,  # None sends every row
+    "stream_results": False,
+    "max_repair_attempts": MAX_REPAIR_ATTEMPTS,
+    "chunk_size": DEFAULT_CHUNK_SIZE,
+    "shard": None,  # (i, N) or "i/N": only rows whose content hash falls into shard i of N
+    "metrics_file": None,  # JSON, or Prometheus text for a .prom path; rewritten while the run goes
+    "tracer": None,  # a Tracer writing a Chrome trace / Perfetto timeline; the caller closes it
+    "log": print,
+}
+
+_DONE = object()
+
+
+class _Stopped(Exception):
+    """Raised on the producer thread to stop a cancelled run between batches."""
+
+
+def row_chunks(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """DataFrame chunks indexed by row id from a file path, a ``RowReader``, a DataFrame or an iterable of row dicts."""
+    if isinstance(rows, (str, os.PathLike)):
+        rows = RowReader(rows, chunk_size=chunk_size)
+    if hasattr(rows, "chunks"):
+        yield from rows.chunks()
+        return
+    if isinstance(rows, pd.DataFrame):
+        missing = [col for col in REQUIRED_COLUMNS if col not in rows.columns]
+        if missing:
+            raise MissingColumnsError(missing)
+        for start in range(0, len(rows), chunk_size):
+            yield rows.iloc[start:start + chunk_size]
+        return
+
+    buffer, start = [], 0
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) == chunk_size:
+            yield from row_chunks(pd.DataFrame(buffer, index=pd.RangeIndex(start, start + len(buffer))), chunk_size)
+            buffer, start = [], start + len(buffer)
+    if buffer:
+        yield from row_chunks(pd.DataFrame(buffer, index=pd.RangeIndex(start, start + len(buffer))), chunk_size)
+
+
+class ClassificationRun:
+    """One classification run over ``rows``: iterate it for ``(row_id, result)``, then read ``stats()``.
+
+    ``config`` overrides ``DEFAULT_CONFIG``; ``api_keys`` is required. Rows in
+    ``skip_rows`` (e.g. already journaled) are not sent. ``stop`` is an
+    optional ``threading.Event`` that cancels the run when set.
+    """
+
+    def __init__(self, rows, targets, config=None, skip_rows=(), stop=None):
+        unknown = set(config or {}) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown config keys: {sorted(unknown)}")
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        if not self.config["api_keys"]:
+            raise ValueError("config['api_keys'] needs at least one Gemini API key")
+        if self.config["shard"] is not None:
+            shard = self.config["shard"]
+            self.config["shard"] = parse_shard(shard if isinstance(shard, str) else "/".join(map(str, shard)))
+        self.rows = rows
+        self.targets = {"Target": targets} if isinstance(targets, str) else dict(targets)
+        self.skip_rows = set(skip_rows)
+        self.cancelled = False
+        self._stop = stop or threading.Event()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stats = {}
+        self._input_rows = self._shard_rows = 0
+        # Per-request latency, queue wait, tokens and retries; per-batch wall time
+        self.metrics = RunMetrics(len(self.config["api_keys"]))
+        self._metrics_written = 0.0
+        self.tracer = self.config["tracer"] or Tracer()
+
+    def cancel(self):
+        """Stop after the batches already in flight; their rows are still delivered."""
+        self._stop.set()
+
+    def _check_stop(self):
+        if self._stop.is_set():
+            raise _Stopped()
+
+    def _on_wait(self):
+        self._check_stop()
+        self._write_metrics()
+
+    def _write_metrics(self, force=False):
+        path = self.config["metrics_file"]
+        if path and (force or time.monotonic() - self._metrics_written >= METRICS_WRITE_SECONDS):
+            self._metrics_written = time.monotonic()
+            try:
+                self.metrics.write(path)
+            except OSError as e:
+                if self.config["log"]:
+                    self.config["log"](f"⚠️ Could not write metrics to {path}: {e}")
+
+    def stats(self):
+        """Repair, dedup, pre-filter, cache, retry and batch latency counters of the finished run.
+
+        ``metrics.snapshot()`` has the live per-request and per-key telemetry.
+        """
+        return dict(self._stats)
+
+    def batches(self):
+        """Yield lists of ``(row_id, result)`` as they are written: a settled batch, pre-filtered rows or one streamed row."""
+        if self._thread is not None:
+            raise RuntimeError("A ClassificationRun can only be iterated once")
+        self._thread = threading.Thread(target=self._produce, daemon=True, name="classification-run")
+        self._thread.start()
+        finished = False
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _DONE:
+                    finished = True
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            if not finished:
+                self.cancel()  # the consumer stopped early: do not keep spending API calls
+
+    def __iter__(self):
+        for entries in self.batches():
+            yield from entries
+
+    def _produce(self):
+        try:
+            self._run()
+        except _Stopped:
+            self.cancelled = True
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            self._queue.put(_DONE)
+
+    def _write_rows(self, entries):
+        self.metrics.record_rows(len(entries))
+        self.tracer.instant("rows ready", "sink", rows=len(entries))
+        self._queue.put(entries)
+
+    def _timed(self, run_batch):
+        def timed_batch(batch_df, batch_num):
+            started = time.perf_counter()
+            try:
+                with self.tracer.span(f"batch {batch_num}", "batch", rows=len(batch_df)):
+                    return run_batch(batch_df, batch_num)
+            finally:
+                self.metrics.record_batch(time.perf_counter() - started)
+
+        return timed_batch
+
+    def _pending_chunks(self, prefilter, deduplicator, sink):
+        for chunk in row_chunks(self.rows, self.config["chunk_size"]):
+            self._check_stop()
+            if self.config["shard"] is not None:
+                # Rows of the other shards are left to the other nodes
+                self._input_rows += len(chunk)
+                chunk = chunk[shard_mask(chunk, self.config["shard"])]
+                self._shard_rows += len(chunk)
+            if self.skip_rows:
+                chunk = chunk[~chunk.index.isin(self.skip_rows)]
+            if prefilter is not None:
+                # Rows below the local similarity floor get their cheap result without an API call
+                chunk, prefiltered = prefilter.split(chunk)
+                sink.settle(prefiltered)
+            yield deduplicator.split(chunk)
+
+    def _run(self):
+        config = self.config
+        api_keys = list(config["api_keys"])
+        target_text = targets_text(self.targets)
+
+        # Per-key rate budgets and one lazily built Gemini client per key
+        key_pool = KeyPool(len(api_keys), rpm=config["requests_per_minute"], tpm=config["tokens_per_minute"],
+                           per_key_concurrency=config["concurrency_per_key"])
+        client_pool = ClientPool(api_keys, key_pool, config["model_name"], config["model_factory"], self.metrics,
+                                 self.tracer, log=config["log"])
+        token_packer = TokenPacker(target_text, token_budget=config["token_budget"],
+                                   max_output_tokens=config["max_output_tokens"],
+                                   max_companies=config["max_batch_size"])
+        # Duplicate descriptions are sent once and the result copied to the whole cluster
+        deduplicator = Deduplicator(config["duplicate_threshold"])
+        # Every row reaches the queue exactly once, streamed or settled
+        sink = StreamingSink(self._write_rows, tag=deduplicator.tag)
+        prefilter = (PreFilter(self.targets, floor=config["prefilter_floor"])
+                     if config["prefilter_floor"] is not None else None)
+        repair_queue = RepairQueue(config["max_repair_attempts"])
+        result_cache = None
+
+        try:
+            if config["use_cache"]:
+                result_cache = ResultCache(config["cache_file"], max_entries=config["cache_max_entries"],
+                                           max_age_days=config["cache_max_age_days"])
+                self.metrics.cache = result_cache
+            # Enrichment profiles are cached per company and reused for every target; only scoring is target-specific
+            pipeline = Pipeline(client_pool, key_pool, token_packer, self.targets, cache=result_cache,
+                                log=config["log"], on_result=sink.emit if config["stream_results"] else None,
+                                metrics=self.metrics, tracer=self.tracer)
+            run_batch = pipeline.process_batch
+            if result_cache is not None:
+                run_batch = result_cache.wrap(run_batch, client_pool.model_name, PROMPT_VERSION, target_text,
+                                              log=config["log"])
+            run_batch = self._timed(run_batch)
+
+            # Missing or failed companies are re-sent in later batches; batches that fail outright are bisected
+            for row_ids, settled_results in repair_queue.dispatch(token_packer,
+                                                                  self._pending_chunks(prefilter, deduplicator, sink),
+                                                                  run_batch, key_pool.capacity,
+                                                                  on_wait=self._on_wait):
+                sink.settle(deduplicator.fan_out(row_ids, settled_results))
+                self._on_wait()
+            sink.settle(deduplicator.flush())
+        finally:
+            self._stats = {
+                "repairs": repair_queue.stats(),
+                "dedup": deduplicator.stats(),
+                "prefilter": prefilter.stats() if prefilter is not None else None,
+                "cache": result_cache.stats() if result_cache is not None else None,
+                "streamed": sink.streamed,
+                "shard": ({"shard": list(config["shard"]), "input_rows": self._input_rows, "rows": self._shard_rows}
+                          if config["shard"] is not None else None),
+                "retries": dict(self.metrics.retries),
+                "batches": self.metrics.batch_summary(),
+            }
+            self._write_metrics(force=True)
+            self.metrics.detach_cache()
+            if result_cache is not None:
+                result_cache.close()
+
+
+def classify(rows, target, config=None):
+    """Yield ``(row_id, result)`` for every row of ``rows`` scored against ``target``.
+
+    ``rows`` is a file path, a ``RowReader``, a DataFrame or an iterable of
+    dicts with "Company Name" and "Business Description"; ``target`` is a
+    description or a ``{name: description}`` mapping; ``config`` overrides
+    ``DEFAULT_CONFIG`` and must include ``api_keys``. Rows come back in the
+    order they finish, not in input order.
+    """
+    return iter(ClassificationRun(rows, target, config))
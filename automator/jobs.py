@@ -0,0 +1,318 @@
+"""Background classification jobs for the Streamlit app.
+
+A job runs on a daemon thread of the server process instead of inside the
+script run, so widget interactions and browser refreshes no longer kill it.
+Everything a job needs to survive lives in its own directory under
+``jobs_dir``: a copy of the uploaded file, ``job.json`` (targets, settings,
+status and progress counters), the result journal and the metrics of the
+latest run. The UI polls ``progress()``, ``metrics()`` and ``results()``;
+``cancel()`` stops the job between batches, and ``start()`` on a cancelled,
+failed or interrupted job resumes it from its journal, so rows that were
+already paid for are never sent again. API keys are never written to disk and
+have to be supplied again on resume. Jobs are not tied to a user: the app
+lists only the ids a session created, ``delete()`` removes one job and
+``prune_jobs()`` removes stale ones.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+from automator.engine import DEFAULT_CONFIG, ClassificationRun
+from automator.journal import ResultJournal, run_fingerprint
+from automator.readers import RowReader
+from automator.result_store import ResultStore
+from automator.targets import targets_text
+
+DEFAULT_JOBS_DIR = "classification_jobs"
+JOB_FILE = "job.json"
+JOURNAL_FILE = "journal.jsonl"
+METRICS_FILE = "metrics.json"
+MAX_ERRORS = 20  # most recent error lines kept in job.json
+
+CREATED = "created"
+RUNNING = "running"
+CANCELLING = "cancelling"
+CANCELLED = "cancelled"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"  # was running when the server stopped
+RESUMABLE = (CREATED, CANCELLED, FAILED, INTERRUPTED)  # states start() accepts
+
+PROGRESS_SAVE_SECONDS = 1.0  # job.json is rewritten at most this often while rows stream in
+
+# Engine settings stored with a job: the engine config minus what must not be written to disk
+# (the job sets its own metrics file)
+_RUNTIME_ONLY = ("api_keys", "log", "model_factory", "metrics_file", "tracer")
+DEFAULT_SETTINGS = {key: value for key, value in DEFAULT_CONFIG.items() if key not in _RUNTIME_ONLY}
+
+# Jobs with a live worker thread, by id; shared by every session of the server process
+_live_jobs = {}
+_live_lock = threading.Lock()
+
+
+class ClassificationJob:
+    """One classification run persisted in its own directory and executed on a background thread."""
+
+    def __init__(self, job_dir):
+        self.job_dir = job_dir
+        with open(os.path.join(job_dir, JOB_FILE), encoding="utf-8") as f:
+            self.state = json.load(f)
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._run_metrics = None
+        self._store = None  # results of the running worker, appended per batch
+        self._errors = deque(self.state.get("errors", []), maxlen=MAX_ERRORS)
+        self._rows = set()
+        self._run_started = None
+        self._rows_at_start = 0
+
+    @classmethod
+    def create(cls, input_name, data, targets, settings=None, jobs_dir=DEFAULT_JOBS_DIR):
+        """Store the uploaded file and the run configuration; the job starts with ``start()``."""
+        job_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        job_dir = os.path.join(jobs_dir, job_id)
+        os.makedirs(job_dir)
+        input_file = "input" + os.path.splitext(input_name)[1].lower()
+        with open(os.path.join(job_dir, input_file), "wb") as f:
+            f.write(data)
+
+        state = {
+            "id": job_id,
+            "input_name": os.path.basename(input_name),
+            "input_file": input_file,
+            "targets": dict(targets),
+            "settings": dict(DEFAULT_SETTINGS, **(settings or {})),
+            "status": CREATED,
+            "created": time.time(),
+            "updated": time.time(),
+            "rows_done": 0,
+            "total_rows": None,
+            "errors": [],
+        }
+        _write_json(os.path.join(job_dir, JOB_FILE), state)
+        return cls(job_dir)
+
+    @property
+    def id(self):
+        return self.state["id"]
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.job_dir, JOURNAL_FILE)
+
+    @property
+    def metrics_path(self):
+        return os.path.join(self.job_dir, METRICS_FILE)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def status(self):
+        status = self.state["status"]
+        if status in (RUNNING, CANCELLING) and not self.is_alive():
+            return INTERRUPTED
+        return status
+
+    def _update(self, **changes):
+        with self._lock:
+            self.state.update(changes, errors=list(self._errors), updated=time.time())
+            _write_json(os.path.join(self.job_dir, JOB_FILE), self.state)
+
+    def _log(self, message):
+        """Pipeline log hook: keep warnings and errors for the UI, drop the chatter."""
+        message = str(message).strip()
+        if message.startswith(("⚠️", "❌")):
+            with self._lock:
+                self._errors.append(f"{datetime.now():%H:%M:%S} {message[:300]}")
+
+    def start(self, api_keys):
+        """Run (or resume) the job on a background thread; rows already journaled are skipped."""
+        if not api_keys:
+            raise ValueError("At least one API key is needed to run a job")
+        with _live_lock:
+            if self.is_alive():
+                return
+            self._cancel.clear()
+            self._thread = threading.Thread(target=self._run, args=(list(api_keys),), daemon=True,
+                                            name=f"classification-job-{self.id}")
+            _live_jobs[self.id] = self
+        self._update(status=RUNNING, error=None)
+        self._thread.start()
+
+    def cancel(self):
+        """Ask the worker to stop; batches already in flight finish and are journaled first."""
+        if self.is_alive():
+            self._cancel.set()
+            self._update(status=CANCELLING)
+
+    def _journal_entries(self, journal, entries):
+        entries = list(entries)
+        if entries:
+            row_ids, results = [row_id for row_id, _ in entries], [result for _, result in entries]
+            journal.append(row_ids, results)
+            self._store.append(row_ids, results)
+            with self._lock:
+                self._rows.update(row_id for row_id, _ in entries)
+                self.state["rows_done"] = len(self._rows)
+
+    def _run(self, api_keys):
+        targets = self.state["targets"]
+        journal = None
+        try:
+            reader = RowReader(os.path.join(self.job_dir, self.state["input_file"]), file_name=self.state["input_name"])
+            journal = ResultJournal(self.journal_path, run_fingerprint(self.state["input_name"], targets_text(targets)),
+                                    resume=True)
+            store = ResultStore(targets)
+            store.extend_from_journal(self.journal_path)
+            self._store = store
+            # Permanently failed rows get another chance on resume, like the CLI's --resume
+            done_rows = store.settled_rows()
+            with self._lock:
+                self._rows = set(store.row_ids().tolist())
+                self._run_started = time.time()
+                self._rows_at_start = len(self._rows)
+            if self.state.get("total_rows_exact"):
+                self._update(rows_done=len(self._rows))  # counted by an earlier run
+            else:
+                total_rows = reader.estimated_rows
+                exact = total_rows is not None and not reader.rows_upper_bound
+                self._update(rows_done=len(self._rows), total_rows_exact=exact,
+                             **({} if total_rows is None else {"total_rows": total_rows}))
+                if not exact:
+                    # CSV has no cheap row count and an .xlsx sheet's extent may include blank rows: count on the
+                    # side so the first API call does not wait for a full pass over the file; until the count is
+                    # in, the ETA is unknown (CSV) or based on the upper bound (.xlsx)
+                    threading.Thread(target=self._count_rows, daemon=True, name=f"count-rows-{self.id}").start()
+
+            # Same engine as the CLI; the job's cancel event stops it between batches
+            run = ClassificationRun(reader, targets, dict(self.state["settings"], api_keys=api_keys, log=self._log,
+                                                          metrics_file=self.metrics_path),
+                                    skip_rows=done_rows, stop=self._cancel)
+            self._run_metrics = run.metrics
+            for entries in run.batches():
+                self._journal_entries(journal, entries)
+                if time.time() - self.state["updated"] >= PROGRESS_SAVE_SECONDS:
+                    self._update()
+            if run.cancelled:
+                self._update(status=CANCELLED)
+            else:
+                self._update(status=COMPLETED, finished=time.time(), **run.stats())
+
+        except Exception as e:
+            self._log(f"❌ Job stopped: {e}")
+            self._update(status=FAILED, error=str(e))
+        finally:
+            if journal is not None:
+                journal.close()
+            with _live_lock:
+                _live_jobs.pop(self.id, None)
+
+    def _count_rows(self):
+        try:
+            reader = RowReader(os.path.join(self.job_dir, self.state["input_file"]), file_name=self.state["input_name"])
+            total_rows = sum(len(chunk) for chunk in reader.chunks())
+        except Exception:
+            return  # the run itself reports an unreadable file
+        if os.path.isdir(self.job_dir):  # the job may have been deleted while counting
+            self._update(total_rows=total_rows, total_rows_exact=True)
+
+    def progress(self):
+        """Snapshot for the UI: status, rows done, throughput (rows/s of this run), ETA and recent errors."""
+        with self._lock:
+            rows_done = self.state.get("rows_done", 0)
+            total_rows = self.state.get("total_rows")
+            errors = list(self._errors)
+            started, rows_at_start = self._run_started, self._rows_at_start
+        throughput = eta = None
+        if self.is_alive() and started is not None:
+            elapsed = time.time() - started
+            throughput = (rows_done - rows_at_start) / elapsed if elapsed > 0 else 0.0
+            if throughput and total_rows:
+                eta = max(0.0, (total_rows - rows_done) / throughput)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "rows_done": rows_done,
+            "total_rows": total_rows,
+            "throughput": throughput,
+            "eta_seconds": eta,
+            "errors": errors,
+            "error": self.state.get("error"),
+        }
+
+    def metrics(self):
+        """Telemetry of the latest run: live while the worker runs, else as last written to disk (None if never run)."""
+        if self.is_alive() and self._run_metrics is not None:
+            return self._run_metrics.snapshot()
+        if not os.path.exists(self.metrics_path):
+            return None
+        with open(self.metrics_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def results(self):
+        """Journaled rows so far (the final results once completed), cleaned and sorted best first.
+
+        A running job answers from the store its worker appends to; otherwise the journal is read into a new one.
+        """
+        store = self._store
+        if store is None:
+            if not os.path.exists(self.journal_path):
+                return pd.DataFrame()
+            store = ResultStore(self.state["targets"])
+            store.extend_from_journal(self.journal_path)
+        if not len(store):
+            return pd.DataFrame()
+        return store.frame()
+
+    def delete(self):
+        """Remove the job directory; a running job is cancelled first."""
+        self.cancel()
+        if self._thread is not None:
+            self._thread.join()
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+
+
+def _write_json(path, data):
+    """Replace ``path`` atomically so a crash never leaves a half-written job file."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def get_job(job_id, jobs_dir=DEFAULT_JOBS_DIR):
+    """The live job object if its worker is running in this process, else the job loaded from disk."""
+    with _live_lock:
+        job = _live_jobs.get(job_id)
+    return job or ClassificationJob(os.path.join(jobs_dir, job_id))
+
+
+def list_jobs(jobs_dir=DEFAULT_JOBS_DIR, job_ids=None):
+    """Stored jobs, newest first; only those among ``job_ids`` when given (the jobs one session created)."""
+    if not os.path.isdir(jobs_dir):
+        return []
+    stored = [name for name in os.listdir(jobs_dir) if os.path.exists(os.path.join(jobs_dir, name, JOB_FILE))]
+    if job_ids is not None:
+        stored = [job_id for job_id in stored if job_id in set(job_ids)]
+    return [get_job(job_id, jobs_dir) for job_id in sorted(stored, reverse=True)]
+
+
+def prune_jobs(max_age_seconds, jobs_dir=DEFAULT_JOBS_DIR):
+    """Delete jobs without a running worker that have not been updated for ``max_age_seconds``; returns their ids."""
+    cutoff = time.time() - max_age_seconds
+    pruned = []
+    for job in list_jobs(jobs_dir):
+        if not job.is_alive() and job.state.get("updated", 0) < cutoff:
+            job.delete()
+            pruned.append(job.id)
+    return pruned
@@ -0,0 +1,101 @@
+"""Append-only JSONL journal of finished rows, used for crash recovery.
+
+Each finished batch is appended once (one line per input row, keyed by its
+row id), so checkpointing costs O(batch) instead of rewriting everything done
+so far. A header line records which input/target the journal belongs to, and
+``--resume`` skips every row already in the journal.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_JOURNAL_FILE = "classification_journal.jsonl"
+
+
+class JournalMismatchError(RuntimeError):
+    """Raised when resuming a journal that was written for a different input or target."""
+
+
+def run_fingerprint(input_name, target):
+    """Identify a run by its input file name and target description."""
+    return {
+        "input": os.path.basename(str(input_name)),
+        "target_sha256": hashlib.sha256(target.encode("utf-8")).hexdigest(),
+    }
+
+
+def read_journal(path):
+    """Yield ``(row_id, result)`` from a journal file without opening it for writing."""
+    with open(path, encoding="utf-8") as f:
+        next(f, None)  # header
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield record["row"], record["result"]
+
+
+class ResultJournal:
+    """One JSON line per finished input row, fsynced after every batch."""
+
+    def __init__(self, path, fingerprint, resume=False):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            header = self._read_header()
+            if header != fingerprint:
+                raise JournalMismatchError(
+                    f"{path} was written for {header}, not {fingerprint}; run without --resume to start over"
+                )
+            self._drop_torn_tail()
+            self._file = open(path, "a", encoding="utf-8")
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+            self._write_lines([{"header": fingerprint}])
+
+    def _read_header(self):
+        with open(self.path, encoding="utf-8") as f:
+            try:
+                return json.loads(f.readline()).get("header")
+            except json.JSONDecodeError:
+                return None
+
+    def _drop_torn_tail(self):
+        """Cut off a half-written last line left behind by a crash."""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _write_lines(self, records):
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, row_ids, results):
+        """Record one finished batch."""
+        with self._lock:
+            self._write_lines([{"row": int(row_id), "result": result} for row_id, result in zip(row_ids, results)])
+
+    def entries(self):
+        """Yield ``(row_id, result)`` for every journaled row, skipping a torn last line."""
+        with self._lock:
+            self._file.flush()
+        yield from read_journal(self.path)
+
+    def completed_rows(self):
+        return {row_id for row_id, _ in self.entries()}
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def remove(self):
+        """Close and delete the journal once the final output has been written."""
+        self.close()
+        os.remove(self.path)
@@ -0,0 +1,227 @@
+"""Per-key request and token budgets for the Gemini API keys.
+
+Every key gets two token buckets, one for requests per minute and one for
+tokens per minute. A batch asks the pool for a key with enough budget left,
+and keys that come back with a 429 are parked until their window resets.
+
+Each key also has a circuit breaker: after ``BREAKER_THRESHOLD`` consecutive
+failures the key is opened (taken out of rotation) for a cooldown that
+doubles on every trip. When the cooldown ends the key is half-open and gets a
+single trial request; a success closes it again, a failure reopens it.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_RPM = 15
+DEFAULT_TPM = 250_000
+DEFAULT_PARK_SECONDS = 60.0
+BREAKER_THRESHOLD = 5  # consecutive failures that open a key's circuit
+BREAKER_COOLDOWN = 15.0  # first open period in seconds, doubled on every trip
+BREAKER_MAX_COOLDOWN = 300.0
+
+
+class NoHealthyKeysError(RuntimeError):
+    """Raised when every API key has been evicted from the pool."""
+
+
+def is_rate_limit_error(error):
+    """True for 429 / quota-exhausted errors from the Gemini API."""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "resource exhausted" in message or "quota" in message
+
+
+class TokenBucket:
+    """Classic token bucket that refills continuously over a 60 second window."""
+
+    def __init__(self, per_minute, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.refill_rate = self.capacity / 60.0
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def has(self, amount):
+        self._refill()
+        return self.tokens >= min(amount, self.capacity)
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+    def wait_time(self, amount):
+        """Seconds until ``amount`` tokens are available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.refill_rate)
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class KeyLease:
+    """A key handed out by the pool for one request."""
+
+    def __init__(self, pool, key_index, estimated_tokens, wait_seconds=0.0):
+        self.pool = pool
+        self.key_index = key_index
+        self.estimated_tokens = estimated_tokens
+        self.wait_seconds = wait_seconds  # time spent queued for a key with budget left
+        self.used_tokens = None
+
+    def record_tokens(self, used_tokens):
+        """Report the real token count (from ``usage_metadata``) for this request."""
+        self.used_tokens = used_tokens
+
+    def park(self, seconds=DEFAULT_PARK_SECONDS):
+        """Take this key out of rotation after a 429."""
+        self.pool.park(self.key_index, seconds)
+
+
+class KeyPool:
+    """Hands out whichever API key currently has request and token budget left."""
+
+    def __init__(self, num_keys, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, per_key_concurrency=2, clock=time.monotonic):
+        if num_keys < 1:
+            raise ValueError("At least one API key is required")
+        if per_key_concurrency < 1:
+            raise ValueError("per_key_concurrency must be at least 1")
+        self.num_keys = num_keys
+        self.per_key_concurrency = per_key_concurrency
+        self.clock = clock
+        self.request_buckets = [TokenBucket(rpm, clock) for _ in range(num_keys)]
+        self.token_buckets = [TokenBucket(tpm, clock) for _ in range(num_keys)]
+        self.in_flight = [0] * num_keys
+        self.parked_until = [0.0] * num_keys
+        self.evicted = set()
+        self.failures = [0] * num_keys
+        self.cooldowns = [BREAKER_COOLDOWN] * num_keys
+        self.half_open = [False] * num_keys
+        self.requests_sent = [0] * num_keys
+        self.tokens_used = [0] * num_keys
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self):
+        """Maximum number of requests that can be in flight across all keys."""
+        return self.num_keys * self.per_key_concurrency
+
+    def _concurrency(self, key_index):
+        return 1 if self.half_open[key_index] else self.per_key_concurrency
+
+    def _is_ready(self, key_index, tokens, now):
+        return (key_index not in self.evicted
+                and self.parked_until[key_index] <= now
+                and self.in_flight[key_index] < self._concurrency(key_index)
+                and self.request_buckets[key_index].has(1)
+                and self.token_buckets[key_index].has(tokens))
+
+    def _wait_time(self, tokens, now):
+        """Shortest time until a key that is only budget-limited becomes usable."""
+        waits = []
+        for key_index in range(self.num_keys):
+            if key_index in self.evicted or self.in_flight[key_index] >= self._concurrency(key_index):
+                continue  # evicted for good, or freed by release() which notifies
+            waits.append(max(self.parked_until[key_index] - now,
+                             self.request_buckets[key_index].wait_time(1),
+                             self.token_buckets[key_index].wait_time(tokens)))
+        return min(waits) if waits else None
+
+    def acquire(self, estimated_tokens=0):
+        """Block until a key has capacity for one request of ``estimated_tokens`` and return its index."""
+        with self._cond:
+            while True:
+                if len(self.evicted) == self.num_keys:
+                    raise NoHealthyKeysError("All API keys have been evicted")
+                now = self.clock()
+                ready = [i for i in range(self.num_keys) if self._is_ready(i, estimated_tokens, now)]
+                if ready:
+                    key_index = max(ready, key=lambda i: (self.request_buckets[i].tokens, -self.in_flight[i]))
+                    self.request_buckets[key_index].take(1)
+                    self.token_buckets[key_index].take(estimated_tokens)
+                    self.in_flight[key_index] += 1
+                    self.requests_sent[key_index] += 1
+                    return key_index
+                self._cond.wait(timeout=self._wait_time(estimated_tokens, now))
+
+    def release(self, key_index, estimated_tokens=0, used_tokens=None):
+        """Return a key to the pool, correcting its token budget with the real usage if known."""
+        with self._cond:
+            self.in_flight[key_index] -= 1
+            if used_tokens is not None:
+                self.token_buckets[key_index].take(used_tokens - estimated_tokens)
+                self.tokens_used[key_index] += used_tokens
+            else:
+                self.tokens_used[key_index] += estimated_tokens
+            self._cond.notify_all()
+
+    def park(self, key_index, seconds=DEFAULT_PARK_SECONDS):
+        """Stop handing out ``key_index`` until its rate window has reset."""
+        with self._cond:
+            self.parked_until[key_index] = max(self.parked_until[key_index], self.clock() + seconds)
+            self.request_buckets[key_index].drain()
+            self._cond.notify_all()
+
+    def record_success(self, key_index):
+        """Close the key's circuit after a successful request."""
+        with self._cond:
+            self.failures[key_index] = 0
+            self.cooldowns[key_index] = BREAKER_COOLDOWN
+            if self.half_open[key_index]:
+                self.half_open[key_index] = False
+                self._cond.notify_all()
+
+    def record_failure(self, key_index):
+        """Count a key-side failure; return the cooldown if this opened the circuit, else None."""
+        with self._cond:
+            self.failures[key_index] += 1
+            if not self.half_open[key_index] and self.failures[key_index] < BREAKER_THRESHOLD:
+                return None
+            cooldown = self.cooldowns[key_index]
+            self.parked_until[key_index] = max(self.parked_until[key_index], self.clock() + cooldown)
+            self.cooldowns[key_index] = min(BREAKER_MAX_COOLDOWN, cooldown * 2)
+            self.half_open[key_index] = True
+            self.failures[key_index] = 0
+            self._cond.notify_all()
+            return cooldown
+
+    def evict(self, key_index):
+        """Never hand out ``key_index`` again (invalid or persistently failing key)."""
+        with self._cond:
+            self.evicted.add(key_index)
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, estimated_tokens=0):
+        """``with pool.lease(tokens) as lease:`` acquire a key and always release it afterwards."""
+        queued = self.clock()
+        key_index = self.acquire(estimated_tokens)
+        lease = KeyLease(self, key_index, estimated_tokens, self.clock() - queued)
+        try:
+            yield lease
+        finally:
+            self.release(lease.key_index, estimated_tokens, lease.used_tokens)
+
+    def status(self):
+        """Per-key snapshot for progress displays."""
+        now = self.clock()
+        with self._cond:
+            return [{
+                "key": key_index + 1,
+                "in_flight": self.in_flight[key_index],
+                "requests_sent": self.requests_sent[key_index],
+                "tokens_used": self.tokens_used[key_index],
+                "parked_for": max(0.0, self.parked_until[key_index] - now),
+                "circuit": ("open" if self.half_open[key_index] and self.parked_until[key_index] > now
+                            else "half-open" if self.half_open[key_index] else "closed"),
+                "evicted": key_index in self.evicted,
+            } for key_index in range(self.num_keys)]
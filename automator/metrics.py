@@ -0,0 +1,199 @@
+"""Per-run telemetry: where time and quota go.
+
+``RunMetrics`` is shared by the pipeline, the client pool and the run loop
+and records, per Gemini request, the key, stage, outcome, latency, the time
+spent waiting for a key (queue wait) and the prompt/output tokens from
+``usage_metadata``; per batch, its wall time; plus retries by reason and the
+cache counters. ``snapshot()`` aggregates them into a plain dict and
+``write()`` exports it as JSON or, for a ``.prom`` path, in the
+Prometheus text format that node_exporter's textfile collector picks up.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+import numpy as np
+
+METRICS_WRITE_SECONDS = 5.0  # a run rewrites its metrics file at most this often
+RATE_WINDOW_SECONDS = 60.0  # per-key request rates are measured over this window
+PROMETHEUS_PREFIX = "automator"
+OK = "ok"
+
+
+def latency_summary(seconds):
+    """Count, p50 and p99 of a list of durations in seconds."""
+    if not seconds:
+        return {"count": 0, "p50_seconds": None, "p99_seconds": None}
+    p50, p99 = np.percentile(seconds, [50, 99])
+    return {"count": len(seconds), "p50_seconds": float(p50), "p99_seconds": float(p99)}
+
+
+def _summary(seconds):
+    return dict(latency_summary(seconds), total_seconds=float(sum(seconds)))
+
+
+def _stage_name(stage):
+    return stage.split()[0]  # "scoring 2/3" -> "scoring"
+
+
+class RunMetrics:
+    """Thread-safe counters and timings of one classification run."""
+
+    def __init__(self, num_keys, clock=time.monotonic):
+        self.num_keys = num_keys
+        self.clock = clock
+        self.started = clock()
+        self.rows_done = 0
+        self.cache = None  # ResultCache of the run, for hit/miss counters
+        self._cache_stats = None  # its last counters once the cache is closed
+        self.retries = Counter()  # error kind -> requests retried after it
+        self._batch_seconds = []
+        self._request_seconds = []
+        self._wait_seconds = []
+        self._requests = Counter()  # (key, stage, outcome) -> requests
+        self._tokens = Counter()  # (key, stage, "prompt" | "output") -> tokens
+        self._key_seconds = defaultdict(float)  # key -> seconds spent in requests
+        self._recent = [deque() for _ in range(num_keys)]  # request start times in the rate window, per key
+        self._lock = threading.Lock()
+
+    def record_request(self, key_index, stage, seconds, wait_seconds, outcome=OK, usage=None):
+        """One Gemini request: ``outcome`` is "ok" or the error kind it failed with."""
+        stage = _stage_name(stage)
+        now = self.clock()
+        with self._lock:
+            self._requests[key_index, stage, outcome] += 1
+            self._request_seconds.append(seconds)
+            self._wait_seconds.append(wait_seconds)
+            self._key_seconds[key_index] += seconds
+            recent = self._recent[key_index]
+            recent.append(now - seconds)
+            while recent and now - recent[0] > RATE_WINDOW_SECONDS:
+                recent.popleft()
+            if usage is not None:
+                self._tokens[key_index, stage, "prompt"] += getattr(usage, "prompt_token_count", 0) or 0
+                self._tokens[key_index, stage, "output"] += getattr(usage, "candidates_token_count", 0) or 0
+
+    def record_retry(self, kind):
+        with self._lock:
+            self.retries[kind] += 1
+
+    def record_batch(self, seconds):
+        with self._lock:
+            self._batch_seconds.append(seconds)
+
+    def record_rows(self, count):
+        with self._lock:
+            self.rows_done += count
+
+    def detach_cache(self):
+        """Keep the cache's final counters; call before the cache is closed."""
+        if self.cache is not None:
+            self._cache_stats = self.cache.stats()
+            self.cache = None
+
+    def batch_summary(self):
+        with self._lock:
+            return latency_summary(self._batch_seconds)
+
+    def snapshot(self):
+        """Everything recorded so far, aggregated into a JSON-friendly dict."""
+        now = self.clock()
+        elapsed = now - self.started
+        with self._lock:
+            by_outcome, by_stage = Counter(), Counter()
+            key_outcomes = [Counter() for _ in range(self.num_keys)]
+            for (key_index, stage, outcome), count in self._requests.items():
+                by_outcome[outcome] += count
+                by_stage[stage] += count
+                key_outcomes[key_index][outcome] += count
+            tokens = {"prompt": 0, "output": 0, "by_stage": defaultdict(lambda: {"prompt": 0, "output": 0})}
+            key_tokens = [Counter() for _ in range(self.num_keys)]
+            for (key_index, stage, kind), count in self._tokens.items():
+                tokens[kind] += count
+                tokens["by_stage"][stage][kind] += count
+                key_tokens[key_index][kind] += count
+            tokens["by_stage"] = dict(tokens["by_stage"])
+            keys = []
+            for key_index, (outcomes, used) in enumerate(zip(key_outcomes, key_tokens)):
+                requests = sum(outcomes.values())
+                recent = [started for started in self._recent[key_index] if now - started <= RATE_WINDOW_SECONDS]
+                keys.append({
+                    "key": key_index + 1,
+                    "requests": requests,
+                    "errors": requests - outcomes[OK],
+                    "rate_limited": outcomes["rate_limit"],
+                    # Extrapolated to a full minute until the run is a minute old
+                    "requests_per_minute": len(recent) * 60.0 / min(RATE_WINDOW_SECONDS, max(elapsed, 1.0)),
+                    "prompt_tokens": used["prompt"],
+                    "output_tokens": used["output"],
+                    "busy_seconds": self._key_seconds[key_index],
+                })
+            snapshot = {
+                "updated": time.time(),
+                "elapsed_seconds": elapsed,
+                "rows_done": self.rows_done,
+                "rows_per_second": self.rows_done / elapsed if elapsed > 0 else 0.0,
+                "batches": _summary(self._batch_seconds),
+                "requests": dict(_summary(self._request_seconds), by_outcome=dict(by_outcome),
+                                 by_stage=dict(by_stage)),
+                "queue_wait": _summary(self._wait_seconds),
+                "tokens": tokens,
+                "retries": dict(self.retries),
+                "keys": keys,
+            }
+        snapshot["cache"] = self.cache.stats() if self.cache is not None else self._cache_stats
+        return snapshot
+
+    def prometheus(self, snapshot=None):
+        """The snapshot in the Prometheus text exposition format."""
+        snapshot = snapshot or self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = f"{PROMETHEUS_PREFIX}_{name}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}" if label_text else f"{name}{suffix} {value}")
+
+        def summary(name, help_text, values):
+            samples = [("", {"quantile": quantile}, values[key]) for quantile, key in
+                       (("0.5", "p50_seconds"), ("0.99", "p99_seconds")) if values[key] is not None]
+            samples += [("_sum", {}, values["total_seconds"]), ("_count", {}, values["count"])]
+            metric(name, "summary", help_text, samples)
+
+        metric("rows_done_total", "counter", "Rows settled by the run.", [("", {}, snapshot["rows_done"])])
+        metric("elapsed_seconds", "gauge", "Seconds since the run started.", [("", {}, snapshot["elapsed_seconds"])])
+        summary("batch_seconds", "Wall time of one batch, cached or not.", snapshot["batches"])
+        summary("request_seconds", "Latency of one Gemini request.", snapshot["requests"])
+        summary("queue_wait_seconds", "Time a request waited for a key with budget left.", snapshot["queue_wait"])
+        with self._lock:
+            requests = sorted(self._requests.items())
+            tokens = sorted(self._tokens.items())
+        metric("requests_total", "counter", "Gemini requests by key, stage and outcome.",
+               [("", {"key": key_index + 1, "stage": stage, "outcome": outcome}, count)
+                for (key_index, stage, outcome), count in requests])
+        metric("tokens_total", "counter", "Tokens reported by usage_metadata, by key, stage and kind.",
+               [("", {"key": key_index + 1, "stage": stage, "kind": kind}, count)
+                for (key_index, stage, kind), count in tokens])
+        metric("retries_total", "counter", "Requests retried, by the error that caused the retry.",
+               [("", {"reason": kind}, count) for kind, count in sorted(snapshot["retries"].items())])
+        metric("key_requests_per_minute", "gauge", "Requests per minute on each key, over the last minute.",
+               [("", {"key": key["key"]}, key["requests_per_minute"]) for key in snapshot["keys"]])
+        if snapshot["cache"] is not None:
+            metric("cache_hits_total", "counter", "Result cache hits.", [("", {}, snapshot["cache"]["hits"])])
+            metric("cache_misses_total", "counter", "Result cache misses.", [("", {}, snapshot["cache"]["misses"])])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to ``path``: Prometheus text for ``.prom``, JSON otherwise. Replaced atomically."""
+        snapshot = self.snapshot()
+        text = self.prometheus(snapshot) if path.endswith(".prom") else json.dumps(snapshot, indent=2)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
@@ -0,0 +1,104 @@
+"""Token-budget-aware batch packing.
+
+A fixed number of companies per request ignores description length: three
+one-liners waste per-call overhead, while three 4,000-character descriptions
+can overflow the output and come back as truncated JSON. The packer estimates
+prompt and output tokens per company and fills each request up to a token
+budget, learning the real characters-per-token ratio and output size per
+company from the ``usage_metadata`` of earlier responses.
+"""
+
+import threading
+
+import pandas as pd
+
+DEFAULT_TOKEN_BUDGET = 30_000  # prompt + expected output per request
+DEFAULT_MAX_OUTPUT_TOKENS = 8_192  # model output limit; batches stay below it to avoid truncation
+DEFAULT_MAX_COMPANIES = 20
+OUTPUT_TOKENS_PER_COMPANY = 300  # starting guess for the seven analysis fields, refined from responses
+TEMPLATE_TOKENS = 700  # instructions and JSON schema around the company list
+OUTPUT_HEADROOM = 1.25  # safety factor on the expected output size
+LEARNING_RATE = 0.2  # weight of each new observation in the running averages
+
+_CHARS_PER_TOKEN = 4.0
+_EMPTY_DESCRIPTION_CHARS = len("No business description available")
+
+
+class TokenPacker:
+    """Cuts a stream of row chunks into batches that fit the token budget."""
+
+    def __init__(self, target, token_budget=DEFAULT_TOKEN_BUDGET, max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS,
+                 max_companies=DEFAULT_MAX_COMPANIES):
+        self.target = target or ""
+        self.token_budget = token_budget
+        self.max_output_tokens = max_output_tokens
+        self.max_companies = max_companies
+        self.chars_per_token = _CHARS_PER_TOKEN
+        self.output_tokens_per_company = float(OUTPUT_TOKENS_PER_COMPANY)
+        self._lock = threading.Lock()
+
+    def _row_chars(self, chunk):
+        names = chunk["Company Name"].fillna("Unknown").astype(str).str.len()
+        descriptions = chunk["Business Description"].fillna("").astype(str).str.strip().str.len()
+        return (names + descriptions.where(descriptions > 0, _EMPTY_DESCRIPTION_CHARS) + 8).tolist()
+
+    def estimate_request(self, prompt, num_companies, output_tokens_per_company=None):
+        """Expected total tokens (prompt + output) of one request, for the key pool's TPM budget.
+
+        ``output_tokens_per_company`` overrides the learned output size, for
+        requests that do not ask for the full analysis.
+        """
+        with self._lock:
+            per_company = output_tokens_per_company or self.output_tokens_per_company
+            return int(len(prompt) / self.chars_per_token + per_company * num_companies)
+
+    def observe(self, prompt, num_companies, usage_metadata):
+        """Learn from a response's ``usage_metadata`` (prompt and candidate token counts)."""
+        if not usage_metadata or not num_companies:
+            return
+        prompt_tokens = getattr(usage_metadata, "prompt_token_count", 0)
+        output_tokens = getattr(usage_metadata, "candidates_token_count", 0)
+        with self._lock:
+            if prompt_tokens:
+                observed = len(prompt) / prompt_tokens
+                self.chars_per_token += LEARNING_RATE * (observed - self.chars_per_token)
+            if output_tokens:
+                observed = output_tokens / num_companies
+                self.output_tokens_per_company += LEARNING_RATE * (observed - self.output_tokens_per_company)
+
+    def pack(self, chunks):
+        """Yield ``(batch_num, batch_df)`` pairs, each filled up to the token budget.
+
+        Rows left over at the end of one chunk are carried into the next, so a
+        batch is only ever cut short at the end of the input.
+        """
+        batch_num = 0
+        leftover = None
+        for chunk in chunks:
+            if leftover is not None:
+                chunk = pd.concat([leftover, chunk])
+                leftover = None
+            if chunk.empty:
+                continue
+
+            with self._lock:
+                chars_per_token = self.chars_per_token
+                output_per_company = self.output_tokens_per_company * OUTPUT_HEADROOM
+            overhead = TEMPLATE_TOKENS + len(self.target) / chars_per_token
+
+            start, tokens = 0, overhead
+            for position, chars in enumerate(self._row_chars(chunk)):
+                row_tokens = chars / chars_per_token + output_per_company
+                count = position - start
+                full = (count >= self.max_companies
+                        or (count > 0 and tokens + row_tokens > self.token_budget)
+                        or (count > 0 and (count + 1) * output_per_company > self.max_output_tokens))
+                if full:
+                    batch_num += 1
+                    yield batch_num, chunk.iloc[start:position]
+                    start, tokens = position, overhead
+                tokens += row_tokens
+            leftover = chunk.iloc[start:]
+
+        if leftover is not None and not leftover.empty:
+            yield batch_num + 1, leftover
@@ -0,0 +1,143 @@
+"""Tolerant parsing of Gemini's JSON answers.
+
+Responses are not trusted to be one well-formed document: the model may emit
+several code blocks, truncate the last object, or break a single company's
+object. ``parse_companies`` walks the text with an incremental JSON decoder
+and keeps every well-formed company object it can find, so one broken
+sibling no longer throws away the whole batch. ``match_by_name`` then pairs
+the objects with the requested companies by name (exact after normalization,
+then fuzzy) instead of by position, so reordered or dropped companies cannot
+shift results onto the wrong rows. ``CompanyStream`` does the same for a
+streamed answer, handing out each company object as soon as it is complete.
+"""
+
+import difflib
+import json
+import re
+
+FUZZY_CUTOFF = 0.8  # minimum difflib similarity ratio for a fuzzy name match
+# Legal-form words ignored by the fuzzy match ("Acme Corp" vs "ACME Corporation")
+_LEGAL_WORDS = {"co", "company", "corp", "corporation", "inc", "incorporated", "llc", "ltd", "limited", "plc", "pvt",
+                "private", "public", "sa", "ag", "gmbh", "nv", "bv", "the"}
+
+_decoder = json.JSONDecoder()
+
+
+def normalize_name(name):
+    """Lowercase, strip punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", str(name or "").lower()).split())
+
+
+def _fuzzy_key(name):
+    words = normalize_name(name).split()
+    return " ".join(word for word in words if word not in _LEGAL_WORDS) or " ".join(words)
+
+
+def parse_companies(text):
+    """Every well-formed company object in ``text``, in order of appearance.
+
+    Complete ``{"companies": [...]}`` documents are taken whole; when a
+    document does not parse, scanning resumes inside it and each company
+    object (one with a ``company_name``) that decodes on its own is kept.
+    """
+    companies = []
+    position = 0
+    while True:
+        start = text.find("{", position)
+        if start == -1:
+            return companies
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            position = start + 1
+            continue
+
+        if isinstance(value, dict) and "company_name" in value:
+            companies.append(value)
+        elif isinstance(value, dict) and isinstance(value.get("companies"), list):
+            companies.extend(item for item in value["companies"] if isinstance(item, dict))
+        else:
+            # Some nested object (e.g. one score entry); look for company objects after its opening brace
+            end = start + 1
+        position = end
+
+
+def match_by_name(items, names, key="company_name", cutoff=FUZZY_CUTOFF):
+    """Align ``items`` with ``names``: one item (or None) per name.
+
+    Items are matched by exact normalized name first, then by the closest
+    fuzzy match above ``cutoff``. Items without a name fill the still
+    unmatched slot at their own position, if any.
+    """
+    matched = [None] * len(names)
+    unused = list(range(len(items)))
+
+    # Exact matches, in order, so repeated names pair up one to one
+    wanted = [normalize_name(name) for name in names]
+    for slot, name in enumerate(wanted):
+        for i in unused:
+            if normalize_name(items[i].get(key)) == name:
+                matched[slot] = items[i]
+                unused.remove(i)
+                break
+
+    # Fuzzy matches for the remaining names, best pairs first
+    fuzzy_wanted = [_fuzzy_key(name) for name in names]
+    candidates = sorted(
+        ((difflib.SequenceMatcher(None, fuzzy_wanted[slot], _fuzzy_key(items[i].get(key))).ratio(), slot, i)
+         for slot in range(len(names)) if matched[slot] is None
+         for i in unused if items[i].get(key)),
+        reverse=True,
+    )
+    for ratio, slot, i in candidates:
+        if ratio < cutoff:
+            break
+        if matched[slot] is None and i in unused:
+            matched[slot] = items[i]
+            unused.remove(i)
+
+    # Unnamed items keep their position
+    for i in list(unused):
+        if not items[i].get(key) and i < len(names) and matched[i] is None:
+            matched[i] = items[i]
+            unused.remove(i)
+    return matched
+
+
+class CompanyStream:
+    """Incremental parser for a streamed answer: ``feed`` text, get back each company object once it closes."""
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._starts = []  # offsets of the currently open objects
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        """Add the next piece of the answer and return the company objects completed by it."""
+        self._buffer += text
+        completed = []
+        for offset in range(self._position, len(self._buffer)):
+            char = self._buffer[offset]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._starts.append(offset)
+            elif char == "}" and self._starts:
+                start = self._starts.pop()
+                try:
+                    value = json.loads(self._buffer[start:offset + 1])
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(value, dict) and "company_name" in value:
+                    completed.append(value)
+        self._position = len(self._buffer)
+        return completed
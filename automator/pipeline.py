@@ -0,0 +1,413 @@
+"""Two-stage classification of company batches.
+
+Five of the seven output fields depend only on the company, so they are
+produced by an enrichment stage whose results are cached per company and
+reused for every target. A lightweight scoring stage then sends only the
+compact enriched profiles plus the target descriptions, scoring each batch
+against all targets in one request (or as few as keep the answer below the
+output limit). Screening the same universe against new targets therefore
+costs just the scoring calls.
+"""
+
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from automator.key_pool import NoHealthyKeysError
+from automator.metrics import RunMetrics
+from automator.packing import OUTPUT_HEADROOM
+from automator.parsing import CompanyStream, match_by_name, parse_companies
+from automator.prompts import (ENRICHMENT_PROMPT_VERSION, SCORING_PROMPT_VERSION, build_enrichment_prompt,
+                               build_scoring_prompt)
+from automator.retry import INVALID_KEY, RATE_LIMIT, ResponseParseError, RetryPolicy, classify_error
+from automator.targets import BEST_TARGET_COLUMN, score_columns
+from automator.tracing import Tracer
+
+PROMPT_VERSION = f"{ENRICHMENT_PROMPT_VERSION}+{SCORING_PROMPT_VERSION}"
+
+# JSON key -> (output column, value used when the model leaves it out)
+PROFILE_FIELDS = {
+    "business_summary": ("Business Summary", "No summary available"),
+    "industry_classification": ("Industry Classification", "Not classified"),
+    "business_model": ("Business Model", "Not specified"),
+    "key_products_services": ("Key Products/Services", "Not specified"),
+    "market_focus": ("Market Focus", "Not specified"),
+}
+SCORING_OUTPUT_TOKENS_PER_COMPANY = 80  # per target
+
+# Placeholder results that still need another attempt
+INCOMPLETE_SUMMARIES = ("Processing failed", "Analysis not available")
+INCOMPLETE_REASONS = ("Analysis incomplete", "Processing error")
+PERMANENT_FAILURE_REASON = "Permanently failed"
+
+
+def clean_relevance_score(score):
+    """Convert relevance score to float, handling various input types"""
+    if pd.isna(score):
+        return 0.00
+
+    # If it's already a number, return it
+    if isinstance(score, (int, float)):
+        return float(score)
+
+    # If it's a string, try to extract numeric value
+    if isinstance(score, str):
+        # Remove any non-numeric characters except decimal point
+        cleaned = re.sub(r'[^\d.]', '', str(score))
+        try:
+            return float(cleaned) if cleaned else 0.00
+        except ValueError:
+            return 0.00
+
+    return 0.00
+
+
+def score_pairs(targets):
+    """(score column, reason column) pairs of a result row: the best target's, then each target's if several."""
+    pairs = [("Relevance Score", "Relevance Reason")]
+    if len(targets) > 1:
+        pairs += [score_columns(name) for name in targets]
+    return pairs
+
+
+def clean_score(score, reason):
+    """One score as ``clean_results`` leaves it: 0-100, or NaN when the row permanently failed."""
+    if str(reason).startswith(PERMANENT_FAILURE_REASON):
+        return float("nan")
+    return min(max(clean_relevance_score(score), 0.0), 100.0)
+
+
+def clean_scores(scores, reasons):
+    """``clean_score`` over whole columns: a float64 array of 0-100 scores, NaN where the row permanently failed.
+
+    Strings lose everything but digits and dots before parsing, like ``clean_relevance_score``; numbers are kept.
+    """
+    values = pd.Series(scores, dtype=object)
+    is_text = values.map(type).eq(str).to_numpy()
+    cleaned = pd.to_numeric(values.where(~is_text), errors="coerce").to_numpy(dtype=np.float64, copy=True)
+    if is_text.any():
+        text = values[is_text].astype(str).str.replace(r"[^\d.]", "", regex=True)
+        cleaned[is_text] = pd.to_numeric(text, errors="coerce").to_numpy(dtype=np.float64)
+    cleaned = np.clip(np.nan_to_num(cleaned, nan=0.0), 0.0, 100.0)
+    failed = pd.Series(reasons, dtype=object).astype(str).str.startswith(PERMANENT_FAILURE_REASON).to_numpy()
+    cleaned[failed] = np.nan
+    return cleaned
+
+
+def clean_result(result, targets, columns):
+    """One journaled row as ``clean_results`` leaves it, as values in ``columns`` order.
+
+    Missing values become "Not specified" and scores are cleaned like ``clean_score``; an empty score is None.
+    """
+    row = {column: result.get(column) for column in columns}
+    for column, value in row.items():
+        if value is None or value != value:
+            row[column] = "Not specified"
+    for score_column, reason_column in score_pairs(targets):
+        if score_column in row:
+            score = clean_score(row[score_column], row.get(reason_column))
+            row[score_column] = None if score != score else score
+    return list(row.values())
+
+
+def clean_results(final_df, targets):
+    """Numeric 0-100 scores sorted best first; permanently failed scores stay empty instead of counting as 0."""
+    for score_column, reason_column in score_pairs(targets):
+        final_df[score_column] = clean_scores(final_df[score_column], final_df[reason_column])
+    return final_df.sort_values('Relevance Score', ascending=False)
+
+
+def companies_from_batch(batch_df):
+    """Name/description pairs for the prompt, with placeholders for missing values."""
+    companies = []
+    for _, row in batch_df.iterrows():
+        comp_name = row["Company Name"]
+        comp_bd = row["Business Description"]
+
+        if pd.isna(comp_bd) or comp_bd == "" or str(comp_bd).strip() == "":
+            comp_bd = "No business description available"
+
+        companies.append({
+            "name": str(comp_name) if pd.notna(comp_name) else "Unknown",
+            "description": str(comp_bd)
+        })
+    return companies
+
+
+def target_groups(targets, num_companies, max_output_tokens):
+    """Split targets into the fewest even groups whose scoring answer stays below ``max_output_tokens``."""
+    per_target = SCORING_OUTPUT_TOKENS_PER_COMPANY * OUTPUT_HEADROOM * max(1, num_companies)
+    per_request = max(1, int(max_output_tokens // per_target))
+    names = list(targets)
+    num_groups = -(-len(names) // per_request)
+    bounds = [len(names) * g // num_groups for g in range(num_groups + 1)]
+    return [{name: targets[name] for name in names[start:end]} for start, end in zip(bounds, bounds[1:])]
+
+
+def match_scores(company_analysis, targets):
+    """``{target: (score, reason)}`` from one company's answer, matched by target name."""
+    answers = [answer for answer in company_analysis.get("scores") or [] if isinstance(answer, dict)]
+    scores = {}
+    for name, answer in zip(targets, match_by_name(answers, list(targets), key="target")):
+        if answer is not None:
+            scores[name] = (clean_relevance_score(answer.get("relevance_score", 0.00)),
+                            answer.get("relevance_reason", "No reason provided"))
+    return scores
+
+
+def with_target_scores(entry, targets, scores, missing_reason="Analysis incomplete"):
+    """Fill the relevance columns of ``entry`` from ``{target: (score, reason)}``."""
+    scores = {name: scores.get(name, (0.00, missing_reason)) for name in targets}
+    best = max(targets, key=lambda name: scores[name][0])
+    entry["Relevance Score"], entry["Relevance Reason"] = scores[best]
+    if len(targets) > 1:
+        entry[BEST_TARGET_COLUMN] = best if scores[best][0] > 0 else "Not specified"
+        for name, (score, reason) in scores.items():
+            score_column, reason_column = score_columns(name)
+            entry[score_column] = score
+            entry[reason_column] = reason
+    return entry
+
+
+def result_entry(company, profile, targets, scores):
+    entry = {
+        "Company Name": company["name"],
+        "Original Business Description": company["description"],
+    }
+    for key, (column, default) in PROFILE_FIELDS.items():
+        entry[column] = profile.get(key, default)
+    return with_target_scores(entry, targets, scores)
+
+
+def incomplete_entry(company, targets):
+    """Placeholder for a company the model left out of its answer."""
+    return with_target_scores({
+        "Company Name": company["name"],
+        "Original Business Description": company["description"],
+        "Business Summary": "Analysis not available",
+        "Industry Classification": "Not classified",
+        "Business Model": "Not specified",
+        "Key Products/Services": "Not specified",
+        "Market Focus": "Not specified",
+    }, targets, {})
+
+
+def failed_entry(company, targets, error):
+    """Placeholder for a company whose request failed on every attempt."""
+    return with_target_scores({
+        "Company Name": company["name"],
+        "Original Business Description": company["description"],
+        "Business Summary": "Processing failed",
+        "Industry Classification": "Error",
+        "Business Model": "Error",
+        "Key Products/Services": "Error",
+        "Market Focus": "Error",
+    }, targets, {}, missing_reason=f"Processing error: {error}")
+
+
+def is_incomplete(result):
+    """True for a placeholder (company missing from the answer, or request failed) rather than a real result."""
+    reasons = [str(value) for column, value in result.items() if column.startswith("Relevance Reason")]
+    return (result.get("Business Summary") in INCOMPLETE_SUMMARIES
+            or any(reason.startswith(INCOMPLETE_REASONS) for reason in reasons))
+
+
+def is_request_failure(result):
+    """True when the whole request for this company failed, as opposed to the model leaving it out."""
+    return result.get("Business Summary") == "Processing failed"
+
+
+def is_permanent_failure(result):
+    """True for a row given up on by the repair queue; a resumed run sends it again."""
+    return str(result.get("Relevance Reason", "")).startswith(PERMANENT_FAILURE_REASON)
+
+
+def permanent_failure_entry(result, attempts):
+    """Mark a result that is still incomplete after every repair attempt, with empty scores."""
+    entry = dict(result)
+    for column in list(entry):
+        if column.startswith("Relevance Reason") and (column == "Relevance Reason"
+                                                       or str(entry[column]).startswith(INCOMPLETE_REASONS)):
+            entry[column.replace("Relevance Reason", "Relevance Score", 1)] = None
+            entry[column] = f"{PERMANENT_FAILURE_REASON} after {attempts} attempts: {entry[column]}"
+    if BEST_TARGET_COLUMN in entry:
+        entry[BEST_TARGET_COLUMN] = "Not specified"
+    return entry
+
+
+class Pipeline:
+    """Runs enrichment (cached per company) and then scoring against the targets for each batch.
+
+    ``targets`` is an ordered ``{name: description}`` mapping; a plain string
+    is treated as a single target. With ``on_result`` the pipeline runs in
+    streaming mode: scoring answers are streamed and ``on_result(row_id,
+    result)`` is called from the worker thread for each company as soon as its
+    object is complete, before the rest of the batch has been generated.
+    """
+
+    def __init__(self, client_pool, key_pool, token_packer, targets, cache=None, retry_policy=None, log=print,
+                 on_result=None, metrics=None, tracer=None):
+        self.client_pool = client_pool
+        self.key_pool = key_pool
+        self.token_packer = token_packer
+        self.targets = {"Target": targets} if isinstance(targets, str) else dict(targets)
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.log = log or (lambda message: None)
+        self.on_result = on_result
+        self.metrics = metrics or RunMetrics(key_pool.num_keys)
+        self.tracer = tracer or Tracer()
+
+    def _request(self, prompt, names, batch_num, stage, output_tokens_per_company=None, on_company=None):
+        """Send ``prompt`` with retries; return one company object (or None if missing) per name in ``names``.
+
+        With ``on_company`` the answer is streamed and ``on_company(slot,
+        company_object)`` is called for each company as soon as it is parsed.
+        """
+        with self.tracer.span(stage, "stage", batch=batch_num, companies=len(names)):
+            return self._send(prompt, names, batch_num, stage, output_tokens_per_company, on_company)
+
+    def _send(self, prompt, names, batch_num, stage, output_tokens_per_company, on_company):
+        num_companies = len(names)
+        estimated_tokens = self.token_packer.estimate_request(prompt, num_companies, output_tokens_per_company)
+        key_switches = attempts = 0
+
+        while True:
+            on_text = self._stream_handler(names, on_company) if on_company is not None else None
+            try:
+                # 🔑 Take whichever key has request/token budget left
+                with self.key_pool.lease(estimated_tokens) as lease:
+                    self.log(f"🤖 Sending batch {batch_num} ({stage}) to Gemini on key #{lease.key_index + 1}...")
+                    response = self.client_pool.generate(prompt, lease, on_text, stage)
+                if output_tokens_per_company is None:
+                    self.token_packer.observe(prompt, num_companies, response.usage_metadata)
+                full_response = response.text.strip()
+
+                self.log(f"🤖 Gemini Response for batch {batch_num} ({stage}):")
+                self.log("=" * 80)
+                self.log(full_response[:500] + "..." if len(full_response) > 500 else full_response)
+                self.log("=" * 80)
+
+                # Keep every well-formed company object and pair it with its input by name
+                with self.tracer.span("parse", "parse", batch=batch_num):
+                    companies_analysis = parse_companies(full_response)
+                    if not companies_analysis:
+                        raise ResponseParseError("No company objects found in response")
+                    matched = match_by_name(companies_analysis, names)
+                found = sum(analysis is not None for analysis in matched)
+                if found != num_companies:
+                    self.log(f"⚠️ Warning: Expected {num_companies} companies, got {found}")
+                return matched
+
+            except NoHealthyKeysError:
+                raise
+            except Exception as e:
+                # Each kind of failure has its own budget and wait; quota errors switch keys without sleeping
+                kind = classify_error(e)
+                if kind in (RATE_LIMIT, INVALID_KEY):
+                    key_switches += 1
+                    failures = key_switches
+                else:
+                    attempts += 1
+                    failures = attempts
+                delay = self.retry_policy.delay(kind, failures, e)
+                if delay is None:
+                    self.log(f"❌ Failed to process batch {batch_num} ({stage}) after {kind} error: {e}")
+                    raise RuntimeError(e)
+                self.metrics.record_retry(kind)
+                self.log(f"⚠️ Error processing batch {batch_num} ({stage}, {kind}), retrying in {delay:.1f}s: {e}")
+                if delay:
+                    with self.tracer.span("retry sleep", "retry", batch=batch_num, reason=kind, seconds=delay):
+                        time.sleep(delay)
+
+    @staticmethod
+    def _stream_handler(names, on_company):
+        """``on_text`` callback that parses the streamed answer and reports each company by its slot."""
+        stream = CompanyStream()
+        delivered = set()
+
+        def on_text(text):
+            for company_analysis in stream.feed(text):
+                open_slots = [slot for slot in range(len(names)) if slot not in delivered]
+                matched = match_by_name([company_analysis], [names[slot] for slot in open_slots])
+                for slot, analysis in zip(open_slots, matched):
+                    if analysis is not None:
+                        delivered.add(slot)
+                        on_company(slot, analysis)
+
+        return on_text
+
+    def _profile_key(self, company):
+        return self.cache.make_key(self.client_pool.model_name, ENRICHMENT_PROMPT_VERSION, "",
+                                   company["name"], company["description"])
+
+    def enrich(self, companies, batch_num):
+        """Target-independent profiles (None where the model left a company out), cached per company."""
+        profiles = [None] * len(companies)
+        if self.cache:
+            profiles = self.cache.get_many([self._profile_key(comp) for comp in companies])
+        missing = [i for i, profile in enumerate(profiles) if profile is None]
+        if not missing:
+            return profiles
+
+        analysis = self._request(build_enrichment_prompt([companies[i] for i in missing]),
+                                 [companies[i]["name"] for i in missing], batch_num, "enrichment")
+        for i, company_analysis in zip(missing, analysis):
+            if company_analysis is not None:
+                profiles[i] = {key: company_analysis.get(key, default) for key, (_, default) in PROFILE_FIELDS.items()}
+        if self.cache:
+            self.cache.put_many([(self._profile_key(companies[i]), profiles[i]) for i in missing
+                                 if profiles[i] is not None])
+        return profiles
+
+    def score(self, companies, profiles, batch_num, on_scored=None):
+        """``{target: (score, reason)}`` per profile; targets the model left out are missing from the dict.
+
+        ``on_scored(position, scores)`` streams each company's scores as soon as its last request answers it.
+        """
+        prompt_profiles = [dict(profile, name=comp["name"]) for comp, profile in zip(companies, profiles)]
+        groups = target_groups(self.targets, len(profiles), self.token_packer.max_output_tokens)
+        scores = [{} for _ in profiles]
+        for group_num, group in enumerate(groups, start=1):
+            stage = "scoring" if len(groups) == 1 else f"scoring {group_num}/{len(groups)}"
+            on_company = None
+            if on_scored is not None and group_num == len(groups):
+                def on_company(position, company_analysis, group=group):
+                    on_scored(position, dict(scores[position], **match_scores(company_analysis, group)))
+            analysis = self._request(build_scoring_prompt(prompt_profiles, group), [comp["name"] for comp in companies],
+                                     batch_num, stage, SCORING_OUTPUT_TOKENS_PER_COMPANY * len(group), on_company)
+            for company_scores, company_analysis in zip(scores, analysis):
+                if company_analysis is not None:
+                    company_scores.update(match_scores(company_analysis, group))
+        return scores
+
+    def process_batch(self, batch_df, batch_num):
+        """Classify one batch and return one result dict per row, in input order."""
+        self.log(f"\n🔄 Processing batch {batch_num} ({len(batch_df)} companies)")
+        companies = companies_from_batch(batch_df)
+
+        def on_scored(position, scored):
+            # Streaming mode: hand each finished company to the sink without waiting for the batch
+            i = enriched[position]
+            result = result_entry(companies[i], profiles[i], self.targets, scored)
+            if not is_incomplete(result):
+                self.on_result(int(batch_df.index[i]), result)  # numpy ints are not JSON-serializable
+
+        try:
+            profiles = self.enrich(companies, batch_num)
+            enriched = [i for i, profile in enumerate(profiles) if profile is not None]
+            scores = self.score([companies[i] for i in enriched], [profiles[i] for i in enriched], batch_num,
+                                on_scored if self.on_result is not None else None) if enriched else []
+        except NoHealthyKeysError:
+            raise
+        except Exception as e:
+            return [failed_entry(comp, self.targets, e) for comp in companies]
+
+        results = [incomplete_entry(comp, self.targets) for comp in companies]
+        for i, scored in zip(enriched, scores):
+            results[i] = result_entry(companies[i], profiles[i], self.targets, scored)
+
+        self.log(f"✅ Successfully processed batch {batch_num}")
+        return results
@@ -0,0 +1,165 @@
+"""Optional local pre-filter that skips obviously irrelevant companies.
+
+Before a chunk is sent to Gemini, each business description is compared with
+the target descriptions by TF-IDF cosine similarity, computed for the whole
+chunk in one NumPy matrix product. Rows whose best similarity is below the
+floor get a cheap "pre-filtered" result (score 0) instead of an LLM analysis.
+
+IDF weights come from the document frequencies of every row seen so far, so
+the filter works on the streamed input without a separate fitting pass. Use
+``tune_prefilter`` on a labeled sample (for example an earlier output file)
+to see how much recall each floor costs against the calls it saves.
+"""
+
+import math
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from automator.pipeline import with_target_scores
+
+DEFAULT_FLOOR = 0.05
+DEFAULT_TUNE_FLOORS = (0.0, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2)
+RELEVANT_SCORE = 50.0  # labeled rows scoring at least this count as relevant when tuning
+PREFILTERED_SUMMARY = "Pre-filtered (not analyzed)"
+
+_STOPWORDS = set("""
+a about also an and any are as at be been by can company companies for from has have in inc including into is it
+its limited ltd of offers on or other our provides such that the their this through to was which with well
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word terms with stopwords removed and a trailing plural 's' stripped."""
+    if text is None or text != text:
+        return []
+    terms = []
+    for word in re.findall(r"[a-z][a-z0-9]+", str(text).lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def prefiltered_entry(name, description, targets, similarities, floor):
+    """Result row for a company the local tier kept away from Gemini."""
+    entry = {
+        "Company Name": str(name) if name == name and name is not None else "Unknown",
+        "Original Business Description": str(description),
+        "Business Summary": PREFILTERED_SUMMARY,
+        "Industry Classification": "Not classified",
+        "Business Model": "Not specified",
+        "Key Products/Services": "Not specified",
+        "Market Focus": "Not specified",
+    }
+    scores = {target: (0.00, f"Pre-filtered: local similarity {similarity:.3f} below floor {floor}")
+              for target, similarity in zip(targets, similarities)}
+    return with_target_scores(entry, targets, scores)
+
+
+class PreFilter:
+    """TF-IDF cosine similarity of each description against the targets, with a send/skip floor."""
+
+    def __init__(self, targets, floor=DEFAULT_FLOOR):
+        self.targets = {"Target": targets} if isinstance(targets, str) else dict(targets)
+        self.floor = floor
+        self._target_counts = [Counter(tokenize(description)) for description in self.targets.values()]
+        self._vocabulary = {term: i for i, term in
+                            enumerate(sorted(set().union(*(counts.keys() for counts in self._target_counts))))}
+        self._document_frequency = Counter()
+        self._documents = 0
+
+        self.rows_seen = 0
+        self.rows_filtered = 0
+
+    def _idf(self, term):
+        return math.log((1 + self._documents) / (1 + self._document_frequency[term])) + 1
+
+    def _weights(self, counts):
+        """Sublinear TF-IDF weights of one document: (vector over the target vocabulary, full norm)."""
+        vector = np.zeros(len(self._vocabulary))
+        norm = 0.0
+        for term, count in counts.items():
+            weight = (1 + math.log(count)) * self._idf(term)
+            norm += weight * weight
+            column = self._vocabulary.get(term)
+            if column is not None:
+                vector[column] = weight
+        return vector, math.sqrt(norm)
+
+    def similarities(self, chunk):
+        """(rows x targets) cosine similarity matrix for the descriptions in ``chunk``."""
+        row_counts = [Counter(tokenize(description)) for description in chunk["Business Description"]]
+        for counts in row_counts:
+            self._document_frequency.update(counts.keys())
+        self._documents += len(row_counts)
+
+        if not row_counts or not self._vocabulary:
+            return np.zeros((len(row_counts), len(self.targets)))
+
+        rows, row_norms = zip(*(self._weights(counts) for counts in row_counts))
+        targets, target_norms = zip(*(self._weights(counts) for counts in self._target_counts))
+        dot = np.vstack(rows) @ np.vstack(targets).T
+        norms = np.outer(row_norms, target_norms)
+        return np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+
+    def split(self, chunk):
+        """Return ``(rows to send, [(row_id, pre-filtered result)])`` for one chunk."""
+        if chunk.empty:
+            return chunk, []
+        similarities = self.similarities(chunk)
+        # Rows without any description carry no signal either way, so they are always sent
+        has_text = chunk["Business Description"].map(lambda description: bool(tokenize(description))).to_numpy()
+        keep = (similarities.max(axis=1) >= self.floor) | ~has_text
+
+        filtered = [
+            (row_id, prefiltered_entry(name, description, self.targets, row_similarities, self.floor))
+            for row_id, name, description, row_similarities in zip(
+                chunk.index[~keep], chunk["Company Name"][~keep], chunk["Business Description"][~keep],
+                similarities[~keep])
+        ]
+        self.rows_seen += len(chunk)
+        self.rows_filtered += len(filtered)
+        return chunk[keep], filtered
+
+    def stats(self):
+        return {
+            "rows": self.rows_seen,
+            "filtered": self.rows_filtered,
+            "sent": self.rows_seen - self.rows_filtered,
+            "calls_saved": self.rows_filtered / self.rows_seen if self.rows_seen else 0.0,
+        }
+
+
+def tune_prefilter(labeled, targets, floors=DEFAULT_TUNE_FLOORS, relevant_score=RELEVANT_SCORE):
+    """Recall and calls saved per floor on a labeled sample.
+
+    ``labeled`` needs "Business Description" (or "Original Business
+    Description") plus either a boolean "Relevant" column or a "Relevance
+    Score" column (e.g. an earlier output file), in which case rows scoring
+    at least ``relevant_score`` count as relevant.
+    """
+    if "Business Description" not in labeled.columns:
+        labeled = labeled.rename(columns={"Original Business Description": "Business Description"})
+    if "Relevant" in labeled.columns:
+        relevant = labeled["Relevant"].astype(bool).to_numpy()
+    else:
+        relevant = pd.to_numeric(labeled["Relevance Score"], errors="coerce").fillna(0).to_numpy() >= relevant_score
+    best = PreFilter(targets).similarities(labeled).max(axis=1)
+    has_text = labeled["Business Description"].map(lambda description: bool(tokenize(description))).to_numpy()
+
+    rows = []
+    for floor in floors:
+        sent = (best >= floor) | ~has_text
+        rows.append({
+            "floor": floor,
+            "sent": int(sent.sum()),
+            "calls_saved": 1 - sent.mean() if len(sent) else 0.0,
+            "recall": (sent & relevant).sum() / relevant.sum() if relevant.any() else 1.0,
+            "relevant_missed": int((~sent & relevant).sum()),
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,103 @@
+"""Prompt templates for the two pipeline stages.
+
+Enrichment describes each company on its own (summary, industry, business
+model, products, market) and does not depend on the target, so its results
+are cached per company. Scoring only sends the compact enriched profiles plus
+the target descriptions and asks for a relevance score and reason against
+every target in the same request.
+
+Bump the matching *_PROMPT_VERSION whenever a template changes so cached
+results from the old wording are not reused.
+"""
+
+ENRICHMENT_PROMPT_VERSION = "enrich-v1"
+SCORING_PROMPT_VERSION = "score-v2"
+
+
+def build_enrichment_prompt(companies):
+    """Prompt asking for the five target-independent profile fields of each company."""
+    company_lines = "\n".join(f"{i + 1}. {comp['name']}: {comp['description']}" for i, comp in enumerate(companies))
+    return f"""
+You are a business analyst tasked with profiling companies from their business descriptions.
+
+**COMPANIES TO ANALYZE:**
+{company_lines}
+
+For each company, analyze and return the following information:
+
+1. **Business Summary**: A clear, concise 1-2 sentence summary of what the company actually does.
+2. **Industry Classification**: Primary industry/sector.
+3. **Business Model**: How the company makes money.
+4. **Key Products/Services**: Main products or services offered.
+5. **Market Focus**: Geographic or market segment focus.
+
+**Required Response Format:**
+```json
+{{
+  "companies": [
+    {{
+      "company_name": "Company Name",
+      "business_summary": "Clear summary of what they do",
+      "industry_classification": "Primary industry",
+      "business_model": "How they make money",
+      "key_products_services": "Main products/services",
+      "market_focus": "Geographic/market focus"
+    }}
+  ]
+}}
+```
+
+Ensure the JSON is properly formatted and includes all companies listed above, in the same order.
+"""
+
+
+def build_scoring_prompt(profiles, targets):
+    """Prompt asking for relevance score and reason of each enriched profile against every target."""
+    target_lines = "\n\n".join(f"- {name}: {description}" for name, description in targets.items())
+    company_lines = "\n".join(
+        f"{i + 1}. {profile['name']}: {profile['business_summary']} "
+        f"[Industry: {profile['industry_classification']}; Model: {profile['business_model']}; "
+        f"Products: {profile['key_products_services']}; Market: {profile['market_focus']}]"
+        for i, profile in enumerate(profiles)
+    )
+    return f"""
+You are a business analyst comparing companies to target companies for potential business opportunities, partnerships, or market relevance.
+
+**TARGET COMPANY REFERENCES:**
+{target_lines}
+
+**COMPANY PROFILES:**
+{company_lines}
+
+For each company, and for each target company listed above, return:
+
+1. **Relevance Score**: A numerical score from 1.00–100.00 representing the company's relevance/similarity to that target company. Consider factors like:
+   - Similar products or services
+   - Overlapping market segments
+   - Complementary business activities
+   - Potential for partnerships or competition
+   - Industry alignment
+   Make sure the score is precise to two decimal points and MUST be a number (not text).
+2. **Relevance Reason**: A detailed 1-2 sentence explanation for the relevance score, specifically comparing the company to that target company.
+
+**Required Response Format:**
+```json
+{{
+  "companies": [
+    {{
+      "company_name": "Company Name",
+      "scores": [
+        {{
+          "target": "Target company name exactly as listed above",
+          "relevance_score": 75.50,
+          "relevance_reason": "Detailed reason comparing to this target company"
+        }}
+      ]
+    }}
+  ]
+}}
+```
+
+IMPORTANT: The relevance_score MUST be a numeric value (like 75.50), not text or string.
+Ensure the JSON is properly formatted, includes all companies listed above in the same order, and gives each company one score per target company, in the order the targets are listed.
+"""
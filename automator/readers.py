@@ -0,0 +1,130 @@
+"""Streaming, memory-bounded readers for company lists.
+
+Instead of loading the whole workbook with ``pd.read_excel`` before anything
+happens, rows are parsed in chunks and handed straight to the batcher, so the
+first API calls go out while the rest of the file is still being read.
+Supported inputs: .xlsx (openpyxl read-only mode), .csv (chunked pandas
+reader), .parquet (pyarrow record batches) and, as a non-streaming fallback,
+legacy .xls.
+"""
+
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+REQUIRED_COLUMNS = ["Company Name", "Business Description"]
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class MissingColumnsError(ValueError):
+    """Raised when the input lacks one of the required columns."""
+
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f"Missing required columns: {missing}")
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+class RowReader:
+    """Reads the header up front (validating the required columns) and then streams row chunks.
+
+    Every chunk is a DataFrame whose index is the 0-based row number in the
+    input, so row ids stay stable across chunks and between runs.
+    ``estimated_rows`` is the row count when it is cheap to get (None for CSV);
+    for .xlsx it is the sheet's extent, an upper bound when blank rows that
+    ``chunks()`` skips are formatted at the end (``rows_upper_bound``).
+    """
+
+    def __init__(self, source, file_name=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.source = source
+        self.file_name = file_name or getattr(source, "name", None) or str(source)
+        self.chunk_size = chunk_size
+        self.format = os.path.splitext(self.file_name)[1].lower().lstrip(".")
+        if self.format not in ("xlsx", "xls", "csv", "parquet"):
+            raise ValueError(f"Unsupported input format: {self.file_name}")
+
+        self.columns, self.estimated_rows = self._read_header()
+        self.rows_upper_bound = self.format == "xlsx"
+        missing = [col for col in REQUIRED_COLUMNS if col not in self.columns]
+        if missing:
+            raise MissingColumnsError(missing)
+
+    def _read_header(self):
+        """Return (column names, row count if cheaply known)."""
+        if self.format == "xlsx":
+            workbook = load_workbook(_rewind(self.source), read_only=True, data_only=True)
+            try:
+                sheet = workbook.active
+                header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+                rows = sheet.max_row - 1 if sheet.max_row else None
+            finally:
+                workbook.close()
+            return [col for col in header if col is not None], rows
+        if self.format == "csv":
+            return pd.read_csv(_rewind(self.source), nrows=0).columns.tolist(), None
+        if self.format == "parquet":
+            parquet_file = _parquet_file(self.source)
+            return parquet_file.schema_arrow.names, parquet_file.metadata.num_rows
+        frame = pd.read_excel(_rewind(self.source))
+        return frame.columns.tolist(), len(frame)
+
+    def chunks(self):
+        """Yield DataFrames of at most ``chunk_size`` rows, indexed by input row number."""
+        if self.format == "xlsx":
+            yield from self._xlsx_chunks()
+        elif self.format == "csv":
+            start = 0
+            for chunk in pd.read_csv(_rewind(self.source), chunksize=self.chunk_size):
+                chunk.index = pd.RangeIndex(start, start + len(chunk))
+                start += len(chunk)
+                yield chunk
+        elif self.format == "parquet":
+            start = 0
+            for record_batch in _parquet_file(self.source).iter_batches(batch_size=self.chunk_size):
+                chunk = record_batch.to_pandas()
+                chunk.index = pd.RangeIndex(start, start + len(chunk))
+                start += len(chunk)
+                yield chunk
+        else:
+            frame = pd.read_excel(_rewind(self.source))
+            for start in range(0, len(frame), self.chunk_size):
+                yield frame.iloc[start:start + self.chunk_size]
+
+    def _xlsx_chunks(self):
+        workbook = load_workbook(_rewind(self.source), read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            width = len(header)
+            start, buffer = 0, []
+            for row in rows:
+                if all(value is None for value in row):
+                    continue  # formatted-but-empty rows at the end of a sheet
+                buffer.append(tuple(row[:width]) + (None,) * (width - len(row)))
+                if len(buffer) == self.chunk_size:
+                    yield _frame(buffer, header, start)
+                    start += len(buffer)
+                    buffer = []
+            if buffer:
+                yield _frame(buffer, header, start)
+        finally:
+            workbook.close()
+
+
+def _frame(rows, header, start):
+    frame = pd.DataFrame(rows, columns=header, index=pd.RangeIndex(start, start + len(rows)))
+    return frame.loc[:, [col for col in header if col is not None]]
+
+
+def _parquet_file(source):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading Parquet input requires pyarrow (pip install pyarrow)") from e
+    return pq.ParquetFile(_rewind(source))
@@ -0,0 +1,115 @@
+"""Repair queue for companies that come back missing or failed.
+
+Instead of accepting "Analysis incomplete" / "Processing failed" rows, only
+those companies are re-sent, merged into the next packed batches. A batch
+whose request fails as a whole is bisected and each half sent on its own, so
+a single poison row ends up isolated instead of sinking its neighbours.
+Rows still incomplete after ``max_attempts`` are marked as permanently
+failed, with empty scores, rather than being counted as a score of 0.
+"""
+
+from collections import Counter, deque
+
+import pandas as pd
+
+from automator.dispatcher import dispatch_batches
+from automator.pipeline import is_incomplete, is_request_failure, permanent_failure_entry
+
+MAX_REPAIR_ATTEMPTS = 3
+
+
+class RepairQueue:
+    """Settles finished batches and feeds unfinished rows back into dispatch."""
+
+    def __init__(self, max_attempts=MAX_REPAIR_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._retry = []  # row frames merged into the next packed batches
+        self._isolated = deque()  # bisected halves and poison candidates, sent as batches of their own
+        self._attempts = Counter()  # row id -> incomplete results so far
+        self._batch_num = 0
+
+        self.retried = 0
+        self.repaired = 0
+        self.bisections = 0
+        self.permanent_failures = 0
+
+    def pending(self):
+        return bool(self._retry or self._isolated)
+
+    def _merged(self, chunks):
+        for chunk in chunks:
+            frames, self._retry = self._retry + [chunk], []
+            yield pd.concat(frames) if len(frames) > 1 else chunk
+        if self._retry:
+            frames, self._retry = self._retry, []
+            yield pd.concat(frames)
+
+    def _next(self, batch_df):
+        self._batch_num += 1
+        return self._batch_num, batch_df
+
+    def batches(self, token_packer, chunks=()):
+        """Yield ``(batch_num, batch_df)``: packed chunks with retried rows merged in, plus isolated batches."""
+        for _, batch_df in token_packer.pack(self._merged(chunks)):
+            while self._isolated:
+                yield self._next(self._isolated.popleft())
+            yield self._next(batch_df)
+        while self._isolated:
+            yield self._next(self._isolated.popleft())
+
+    def settle(self, batch_df, results):
+        """Return the final ``(row_id, result)`` pairs of a finished batch and queue the rest for another try."""
+        if len(batch_df) > 1 and all(is_request_failure(result) for result in results):
+            # Whole request failed: split it so a poison row cannot keep failing its neighbours
+            self.bisections += 1
+            middle = len(batch_df) // 2
+            self._isolated.extend([batch_df.iloc[:middle], batch_df.iloc[middle:]])
+            return []
+
+        settled, retry = [], []
+        for position, (row_id, result) in enumerate(zip(batch_df.index, results)):
+            if not is_incomplete(result):
+                if self._attempts.pop(row_id, 0):
+                    self.repaired += 1
+                settled.append((row_id, result))
+                continue
+
+            self._attempts[row_id] += 1
+            if self._attempts[row_id] >= self.max_attempts:
+                self.permanent_failures += 1
+                settled.append((row_id, permanent_failure_entry(result, self._attempts.pop(row_id))))
+            else:
+                retry.append(position)
+
+        if retry:
+            self.retried += len(retry)
+            if len(batch_df) == 1:
+                self._isolated.append(batch_df)  # a lone failing row keeps being sent alone
+            else:
+                self._retry.append(batch_df.iloc[retry])
+        return settled
+
+    def dispatch(self, token_packer, chunks, process_fn, max_in_flight, on_wait=None):
+        """Pack, dispatch and repair until every row is settled.
+
+        Yields ``(row_ids, results)`` for the settled rows of each finished
+        batch. Rows queued while the input is still streaming ride along with
+        later batches; whatever is left at the end is sent in further rounds.
+        """
+        while True:
+            for _, batch_df, batch_results in dispatch_batches(self.batches(token_packer, chunks), process_fn,
+                                                               max_in_flight, on_wait):
+                settled = self.settle(batch_df, batch_results)
+                if settled:
+                    yield [row_id for row_id, _ in settled], [result for _, result in settled]
+            if not self.pending():
+                return
+            chunks = ()
+
+    def stats(self):
+        return {
+            "retried": self.retried,
+            "repaired": self.repaired,
+            "bisections": self.bisections,
+            "permanent_failures": self.permanent_failures,
+        }
@@ -0,0 +1,166 @@
+"""Persistent, content-addressed cache of company classifications.
+
+Results are stored in a small SQLite file keyed on a hash of the model name,
+prompt version, target description and the company's name/description, so a
+company that was already classified against the same target is never sent to
+Gemini again. Entries expire by age and the file is trimmed to a maximum size
+(least recently used first) when it is opened, every ``EVICT_EVERY_PUTS``
+stored results and when it is closed. A batch is looked up with one query and
+its results stored in one transaction, rather than one commit per company.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from automator.pipeline import is_incomplete
+
+DEFAULT_CACHE_FILE = "classification_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 500_000
+DEFAULT_MAX_AGE_DAYS = 30
+EVICT_EVERY_PUTS = 10_000
+_SQL_VARIABLES = 500  # keys per IN (...) clause, below SQLite's limit on bound parameters
+
+
+def _text(value):
+    """String form of a cell, treating None/NaN as empty."""
+    if value is None or value != value:
+        return ""
+    return str(value).strip()
+
+
+class ResultCache:
+    """SQLite-backed result cache with age/size eviction and hit/miss counters."""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model_name, prompt_version, target, company_name, description):
+        """Content hash identifying one company classified against one target."""
+        parts = [model_name, prompt_version, _text(target), _text(company_name), _text(description)]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        """Cached result (or None) for each of ``keys``; the hits' ``last_used`` is updated in one transaction."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_VARIABLES):
+                part = keys[start:start + _SQL_VARIABLES]
+                placeholders = ",".join("?" * len(part))
+                found.update(self._conn.execute(
+                    f"SELECT key, result FROM results WHERE key IN ({placeholders})", part).fetchall())
+            hit_keys = list(found)
+            for start in range(0, len(hit_keys), _SQL_VARIABLES):
+                part = hit_keys[start:start + _SQL_VARIABLES]
+                self._conn.execute(f"UPDATE results SET last_used = ? WHERE key IN ({','.join('?' * len(part))})",
+                                   [time.time()] + part)
+            if hit_keys:
+                self._conn.commit()
+            results = [json.loads(found[key]) if key in found else None for key in keys]
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return results
+
+    def put(self, key, result):
+        self.put_many([(key, result)])
+
+    def put_many(self, items):
+        """Store ``(key, result)`` pairs in one transaction."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (key, result, created, last_used) VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(result), now, now) for key, result in items],
+            )
+            self._conn.commit()
+            self._puts_since_evict += len(items)
+            evict = self._puts_since_evict >= EVICT_EVERY_PUTS
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop entries older than max_age, then the least recently used ones beyond max_entries."""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM results WHERE created < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+            count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            if count > self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+            self._puts_since_evict = 0
+            return removed
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def wrap(self, process_fn, model_name, prompt_version, target, log=print):
+        """Put the cache in front of ``process_fn(batch_df, batch_num)``.
+
+        Only companies without a cached result are sent on; a batch that is fully
+        cached makes no API call at all. Fresh results are stored unless they are
+        failure placeholders.
+        """
+        log = log or (lambda message: None)
+
+        def run(batch_df, batch_num):
+            keys = [self.make_key(model_name, prompt_version, target, name, description)
+                    for name, description in zip(batch_df["Company Name"], batch_df["Business Description"])]
+            results = self.get_many(keys)
+            misses = [i for i, result in enumerate(results) if result is None]
+
+            if not misses:
+                log(f"💾 Batch {batch_num} served entirely from cache")
+                return results
+
+            fresh_results = process_fn(batch_df.iloc[misses], batch_num)
+            for i, result in zip(misses, fresh_results):
+                results[i] = result
+            self.put_many([(keys[i], result) for i, result in zip(misses, fresh_results) if not is_incomplete(result)])
+            return results
+
+        return run
+
+    def close(self):
+        """Trim the file to its limits, then close it."""
+        self.evict()
+        with self._lock:
+            self._conn.close()
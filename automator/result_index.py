@@ -0,0 +1,83 @@
+"""Precomputed lookups over a finished result set.
+
+The Results and Analytics tabs used to rescan the whole frame on every
+interaction: boolean masks for each filter change, band counts for the metric
+cards and ``value_counts`` over free-text columns for every chart. A
+``ResultIndex`` is built once when results are loaded and answers those
+questions from sorted arrays instead:
+
+- a score order (best first, unscored rows last) plus the sorted scores, so a
+  minimum-score filter is a binary search giving a prefix of that order;
+- categorical codes of the industry column and, per category, the ranks of
+  its rows in the score order, so an industry filter only touches the rows of
+  the selected industries;
+- histograms and band counts aggregated up front.
+"""
+
+import numpy as np
+import pandas as pd
+
+from automator.targets import BEST_TARGET_COLUMN
+
+HIGH_RELEVANCE = 70.0
+MEDIUM_RELEVANCE = 50.0
+TOP_COMPANIES = 10
+TOP_COLUMNS = ["Company Name", "Relevance Score", "Industry Classification", "Business Summary"]
+
+
+def _column(df, name):
+    """``df[name]``, or an all-empty column: a job that finished without rows hands over a frame without columns."""
+    return df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+class ResultIndex:
+    """Score order, category codes and histograms of a result frame, built once per result set."""
+
+    def __init__(self, df, score_column="Relevance Score", category_column="Industry Classification",
+                 count_columns=("Business Model", BEST_TARGET_COLUMN)):
+        self.df = df
+        scores = pd.to_numeric(_column(df, score_column), errors="coerce").to_numpy(dtype=float)
+        unscored = np.isnan(scores)
+        # Row positions best first; unscored (permanently failed) rows last, ties in input order
+        self.order = np.argsort(np.where(unscored, np.inf, -scores), kind="stable")
+        self._ascending = np.sort(scores[~unscored])
+
+        categories = pd.Categorical(_column(df, category_column))
+        self.categories = categories.categories.tolist()
+        self._category_codes = {category: code for code, category in enumerate(self.categories)}
+        # Group the ranks (positions in self.order) by category; a stable sort keeps each group ascending
+        ranked_codes = categories.codes[self.order]
+        by_code = np.argsort(ranked_codes, kind="stable")
+        bounds = np.searchsorted(ranked_codes[by_code], np.arange(len(self.categories) + 1))
+        self._category_ranks = [by_code[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+        # Pre-aggregated metrics and histograms
+        self.total = len(df)
+        self.high = self.count_at_least(HIGH_RELEVANCE)
+        self.medium = self.count_at_least(MEDIUM_RELEVANCE) - self.high
+        self.average = float(self._ascending.mean()) if len(self._ascending) else float("nan")
+        values, counts = np.unique(self._ascending, return_counts=True)
+        self.score_counts = pd.Series(counts, index=values, name="count")
+        self.category_counts = pd.Series([len(ranks) for ranks in self._category_ranks], index=self.categories,
+                                         name="count").sort_values(ascending=False, kind="stable")
+        self.counts = {column: df[column].value_counts() for column in count_columns if column in df.columns}
+        self.top = df.iloc[self.order[:TOP_COMPANIES]][[column for column in TOP_COLUMNS if column in df.columns]]
+
+    def count_at_least(self, threshold):
+        """Number of scored rows with a score of at least ``threshold`` (binary search)."""
+        return len(self._ascending) - int(np.searchsorted(self._ascending, threshold, side="left"))
+
+    def positions(self, min_score=0.0, categories=()):
+        """Row positions passing the filters, best first; unscored rows only pass at a minimum of 0."""
+        limit = len(self.order) if min_score <= 0 else self.count_at_least(min_score)
+        if not categories:
+            return self.order[:limit]
+        parts = [ranks[:np.searchsorted(ranks, limit)]
+                 for ranks in (self._category_ranks[self._category_codes[category]]
+                               for category in categories if category in self._category_codes)]
+        ranks = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+        return self.order[ranks]
+
+    def filter(self, min_score=0.0, categories=()):
+        """The rows of the result frame passing the filters, best first."""
+        return self.df.iloc[self.positions(min_score, categories)]
@@ -0,0 +1,187 @@
+"""Columnar, typed store of finished rows.
+
+Results arrive as one dict per row that repeats every column name and carries
+its own copy of long texts. Collecting them in a list and building a
+DataFrame at the end costs many GB at a million rows, followed by a long
+pause for ``fillna`` and a row-wise score clean-up. A ``ResultStore`` takes
+each batch as it finishes and keeps it in columns instead:
+
+- scores as float32 arrays, cleaned (0-100, empty when permanently failed)
+  once per batch with vectorized operations;
+- industry, business model, market focus, best target and the original
+  description as int32 codes into one list of distinct values, so a text
+  shared by many rows (a duplicate cluster's description, an industry) is
+  held once;
+- the remaining free-text columns as plain object arrays.
+
+``frame()`` assembles the DataFrame the UI shows, best first, with
+categorical columns and scores back as float64 rounded to 2 decimals, so
+exports show 83.99 rather than float32's 83.98999786376953. Memory grows
+with the distinct content rather than with the number of rows times the
+number of columns.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from automator.journal import read_journal
+from automator.pipeline import clean_scores, score_pairs
+from automator.targets import BEST_TARGET_COLUMN
+
+SCORE_DTYPE = np.float32
+SCORE_DECIMALS = 2
+CATEGORY_COLUMNS = ("Industry Classification", "Business Model", "Market Focus", BEST_TARGET_COLUMN,
+                    "Original Business Description")
+CHUNK_ROWS = 4096
+
+
+class _Column:
+    """Values kept in chunks; per-batch chunks are merged once they add up to ``CHUNK_ROWS`` rows."""
+
+    def __init__(self, padding):
+        self._chunks = []
+        self._pending = []
+        self._pending_rows = 0
+        self.add(padding)  # rows appended before the column first appeared
+
+    def add(self, values):
+        self._pending.append(values)
+        self._pending_rows += len(values)
+        if self._pending_rows >= CHUNK_ROWS:
+            self._chunks.append(np.concatenate(self._pending))
+            self._pending, self._pending_rows = [], 0
+
+    def _values(self):
+        return np.concatenate(self._chunks + self._pending)
+
+    def take(self, positions):
+        return self._values()[positions]
+
+
+class _ObjectColumn(_Column):
+    def __init__(self, length):
+        super().__init__(np.full(length, None, dtype=object))
+
+    def extend(self, values):
+        self.add(pd.Series(values, dtype=object).to_numpy())
+
+
+class _CategoryColumn(_Column):
+    """int32 codes into the distinct values seen so far; -1 for a missing value."""
+
+    def __init__(self, length):
+        self._codes = {}
+        super().__init__(np.full(length, -1, dtype=np.int32))
+
+    def extend(self, values):
+        codes = self._codes
+        self.add(np.fromiter(
+            (-1 if value is None or value != value else codes.setdefault(str(value), len(codes)) for value in values),
+            dtype=np.int32, count=len(values)))
+
+    def take(self, positions):
+        categorical = pd.Categorical.from_codes(self._values()[positions], categories=list(self._codes))
+        return categorical.remove_unused_categories()
+
+
+class _ScoreColumn(_Column):
+    """Cleaned float32 scores; the batch's reasons tell which rows permanently failed."""
+
+    def __init__(self, length, reason_column):
+        self.reason_column = reason_column
+        super().__init__(np.zeros(length, dtype=SCORE_DTYPE))  # a missing score cleans to 0, like clean_results
+
+    def extend(self, values, reasons):
+        self.add(clean_scores(values, reasons).astype(SCORE_DTYPE))
+
+    def take(self, positions):
+        # float64 again, rounded: a float32 83.99 would export as 83.98999786376953
+        return super().take(positions).astype(np.float64).round(SCORE_DECIMALS)
+
+
+class ResultStore:
+    """Finished rows of one result set, appended per batch and kept column by column."""
+
+    def __init__(self, targets):
+        self.targets = targets
+        self._reasons = dict(score_pairs(targets))  # score column -> its reason column
+        self._row_ids = _Column(np.empty(0, dtype=np.int64))
+        self._columns = {}  # in the order columns first appear, like a DataFrame of the dicts
+        self._length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Rows appended, counting a row appended again (a retried permanent failure) twice."""
+        return self._length
+
+    def _column(self, name):
+        if name in self._reasons:
+            return _ScoreColumn(self._length, self._reasons[name])
+        if name in CATEGORY_COLUMNS:
+            return _CategoryColumn(self._length)
+        return _ObjectColumn(self._length)
+
+    def append(self, row_ids, results):
+        """Add one finished batch, ``results[i]`` being the result dict of input row ``row_ids[i]``."""
+        results = list(results)
+        if not results:
+            return
+        with self._lock:
+            for result in results:
+                for name in result:
+                    if name not in self._columns:
+                        self._columns[name] = self._column(name)
+            for name, column in self._columns.items():
+                values = [result.get(name) for result in results]
+                if isinstance(column, _ScoreColumn):
+                    column.extend(values, [result.get(column.reason_column) for result in results])
+                else:
+                    column.extend(values)
+            self._row_ids.add(np.asarray(row_ids, dtype=np.int64))
+            self._length += len(results)
+
+    def extend_from_journal(self, path, batch_rows=10_000):
+        """Append every row of a journal or shard file, ``batch_rows`` at a time."""
+        row_ids, results = [], []
+        for row_id, result in read_journal(path):
+            row_ids.append(row_id)
+            results.append(result)
+            if len(results) >= batch_rows:
+                self.append(row_ids, results)
+                row_ids, results = [], []
+        self.append(row_ids, results)
+
+    def _latest(self):
+        """Positions of the last appended result of every row id, in row id order."""
+        row_ids = self._row_ids._values()
+        _, last_from_end = np.unique(row_ids[::-1], return_index=True)
+        positions = len(row_ids) - 1 - last_from_end
+        return row_ids[positions], positions
+
+    def row_ids(self):
+        """Distinct row ids appended so far, ascending."""
+        with self._lock:
+            return self._latest()[0]
+
+    def settled_rows(self):
+        """Row ids whose latest result is not a permanent failure (a resumed run skips them)."""
+        with self._lock:
+            row_ids, positions = self._latest()
+            if "Relevance Score" not in self._columns:
+                return set(row_ids.tolist())
+            scores = self._columns["Relevance Score"].take(positions)
+        return set(row_ids[~np.isnan(scores)].tolist())
+
+    def frame(self):
+        """The rows as a DataFrame indexed by row id, best first; permanently failed rows last with empty scores."""
+        with self._lock:
+            row_ids, positions = self._latest()
+            if "Relevance Score" in self._columns:
+                scores = self._columns["Relevance Score"].take(positions)
+                # Ties keep input order
+                order = np.argsort(np.where(np.isnan(scores), np.inf, -scores), kind="stable")
+                row_ids, positions = row_ids[order], positions[order]
+            data = {name: column.take(positions) for name, column in self._columns.items()}
+        return pd.DataFrame(data, index=pd.Index(row_ids, name="row"))
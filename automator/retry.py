@@ -0,0 +1,129 @@
+"""Error classification and retry timing for Gemini requests.
+
+Different failures need different handling instead of one fixed sleep:
+
+- rate limit (429 / quota): park the key for its retry-after hint and move
+  to another key right away, without sleeping;
+- invalid key: the key is evicted, retry at once on another key;
+- transient (5xx, timeouts, dropped connections): exponential backoff with
+  full jitter, never shorter than a server retry-after hint;
+- parse (no usable JSON in the answer): retry at once, a fresh sample
+  usually parses;
+- safety block: do not retry the same prompt; the repair queue bisects the
+  batch until the blocked company is isolated.
+"""
+
+import random
+import re
+
+from automator.key_pool import is_rate_limit_error
+
+RATE_LIMIT = "rate_limit"
+INVALID_KEY = "invalid_key"
+TRANSIENT = "transient"
+PARSE = "parse"
+SAFETY = "safety"
+OTHER = "other"
+
+DEFAULT_MAX_ATTEMPTS = 3  # parse/transient/other failures per request
+DEFAULT_MAX_KEY_SWITCHES = 10  # rate-limit/invalid-key failures per request
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+
+_TRANSIENT_CODES = (500, 502, 503, 504)
+_TRANSIENT_WORDS = ("timeout", "timed out", "deadline", "unavailable", "internal error", "connection reset",
+                    "connection aborted", "temporarily")
+_BLOCKED_FINISH_REASONS = ("SAFETY", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII")
+
+
+class SafetyBlockedError(RuntimeError):
+    """Raised when Gemini blocks the prompt or the answer for safety reasons."""
+
+
+class ResponseParseError(ValueError):
+    """Raised when a response contains no usable company objects."""
+
+
+def is_invalid_key_error(error):
+    """True for errors that mean the key itself is unusable (invalid, revoked, no permission)."""
+    if getattr(error, "code", None) in (401, 403):
+        return True
+    message = str(error).lower()
+    return "api key not valid" in message or "api_key_invalid" in message or "permission denied" in message
+
+
+def blocked_reason(response):
+    """Why ``response`` was blocked, or None if it was not."""
+    feedback = getattr(response, "prompt_feedback", None)
+    if feedback is not None and getattr(feedback, "block_reason", None):
+        return f"prompt blocked: {getattr(feedback.block_reason, 'name', feedback.block_reason)}"
+    for candidate in getattr(response, "candidates", None) or ():
+        finish_reason = getattr(candidate, "finish_reason", None)
+        name = getattr(finish_reason, "name", str(finish_reason))
+        if name in _BLOCKED_FINISH_REASONS:
+            return f"answer blocked: {name}"
+    return None
+
+
+def classify_error(error):
+    """One of RATE_LIMIT, INVALID_KEY, TRANSIENT, PARSE, SAFETY or OTHER."""
+    if isinstance(error, SafetyBlockedError):
+        return SAFETY
+    if isinstance(error, ResponseParseError):
+        return PARSE
+    if is_rate_limit_error(error):
+        return RATE_LIMIT
+    if is_invalid_key_error(error):
+        return INVALID_KEY
+    if isinstance(error, (TimeoutError, ConnectionError)) or getattr(error, "code", None) in _TRANSIENT_CODES:
+        return TRANSIENT
+    message = str(error).lower()
+    if any(word in message for word in _TRANSIENT_WORDS) or re.search(r"\b5(00|02|03|04)\b", message):
+        return TRANSIENT
+    return OTHER
+
+
+def retry_after_seconds(error):
+    """Server-provided retry hint in seconds (Retry-After header or RetryInfo delay), if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    message = str(error)
+    match = (re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", message)
+             or re.search(r"retry in ([\d.]+)\s*s", message, re.IGNORECASE))
+    return float(match.group(1)) if match else None
+
+
+class RetryPolicy:
+    """Decides whether and how long to wait before the next attempt of a request."""
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, max_key_switches=DEFAULT_MAX_KEY_SWITCHES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, rng=random.random):
+        self.max_attempts = max_attempts
+        self.max_key_switches = max_key_switches
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng
+
+    def delay(self, kind, failures, error=None):
+        """Seconds to wait before the next attempt, or None to give up.
+
+        ``failures`` counts the failures so far that draw on the same budget:
+        key switches for RATE_LIMIT/INVALID_KEY, attempts for everything else.
+        """
+        if kind == SAFETY:
+            return None
+        if kind in (RATE_LIMIT, INVALID_KEY):
+            return 0.0 if failures < self.max_key_switches else None
+        if failures >= self.max_attempts:
+            return None
+        if kind == PARSE:
+            return 0.0
+        backoff = self.rng() * min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+        hint = retry_after_seconds(error) if error is not None else None
+        return max(backoff, min(hint, self.max_delay)) if hint else backoff
@@ -0,0 +1,141 @@
+"""Splitting one company list across processes or machines, and merging the results.
+
+``--shard i/N`` runs only the rows whose stable content hash falls into shard
+``i`` of ``N``. Every node reads the same input and keeps its own API keys,
+cache and journal, so throughput grows with the number of nodes. The hash
+covers the company name and description, so identical rows always land in the
+same shard and are still sent once.
+
+A finished shard writes a shard file: the journal format with a header that
+records the run fingerprint, the shard and how many input rows it saw.
+``check_shards`` verifies that the shard files belong to the same run and
+together cover every input row exactly once before the results are combined.
+"""
+
+import hashlib
+import itertools
+import json
+
+from automator.journal import ResultJournal, read_journal
+
+SHARD_WRITE_ROWS = 10_000  # rows appended to a shard file at a time
+
+
+class ShardMergeError(ValueError):
+    """Raised when shard files do not add up to exactly one result per input row."""
+
+
+def parse_shard(spec):
+    """``"2/4"`` -> ``(2, 4)``; shards are numbered from 1."""
+    try:
+        index, count = (int(part) for part in str(spec).split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N (e.g. 2/4), got {spec!r}") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard {index}/{count} is out of range: use 1/{count} to {count}/{count}")
+    return index, count
+
+
+def shard_name(shard):
+    index, count = shard
+    return f"shard-{index}-of-{count}"
+
+
+def _text(value):
+    """String form of a cell, treating None/NaN as empty."""
+    if value is None or value != value:
+        return ""
+    return str(value).strip()
+
+
+def shard_of(company_name, description, count):
+    """The shard (1..count) a row belongs to, from a hash of its content that is stable across runs and machines."""
+    digest = hashlib.sha256(f"{_text(company_name)}\x1f{_text(description)}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def shard_mask(chunk, shard):
+    """Boolean list selecting the rows of ``chunk`` that belong to ``shard``."""
+    index, count = shard
+    return [shard_of(name, description, count) == index
+            for name, description in zip(chunk["Company Name"], chunk["Business Description"])]
+
+
+def write_shard(path, fingerprint, shard, input_rows, entries, rows):
+    """Write one shard's ``rows`` finished rows, ``(row_id, result)`` in row order, with a header for merging."""
+    header = dict(fingerprint, shard=list(shard), input_rows=input_rows, rows=rows)
+    shard_file = ResultJournal(path, header)
+    entries = iter(entries)
+    while True:
+        part = list(itertools.islice(entries, SHARD_WRITE_ROWS))
+        if not part:
+            break
+        shard_file.append([row_id for row_id, _ in part], [result for _, result in part])
+    shard_file.close()
+
+
+def read_shard_header(path):
+    with open(path, encoding="utf-8") as f:
+        try:
+            return json.loads(f.readline()).get("header") or {}
+        except json.JSONDecodeError:
+            return {}
+
+
+def check_shards(paths, fingerprint=None):
+    """Check that shard files cover every input row exactly once; returns the number of input rows.
+
+    With ``fingerprint`` (from ``run_fingerprint``) the shards must also belong to that input and target.
+    Only row ids are kept while checking, so the results can be streamed from the files afterwards.
+    """
+    headers = [(path, read_shard_header(path)) for path in paths]
+    for path, header in headers:
+        if "shard" not in header:
+            raise ShardMergeError(f"{path} is not a shard file")
+        for field, value in (fingerprint or {}).items():
+            if header.get(field) != value:
+                raise ShardMergeError(f"{path} was written for {field}={header.get(field)!r}, not {value!r}; "
+                                      f"merge with the same --input and --targets the shards ran with")
+
+    first_path, first = headers[0]
+    count = first["shard"][1]
+    for path, header in headers:
+        for field in ("input", "target_sha256", "input_rows"):
+            if header.get(field) != first.get(field):
+                raise ShardMergeError(f"{path} has {field}={header.get(field)!r}, but {first_path} has "
+                                      f"{first.get(field)!r}; all shards must come from the same run")
+        if header["shard"][1] != count:
+            raise ShardMergeError(f"{path} is shard {header['shard'][0]}/{header['shard'][1]}, expected N={count}")
+
+    indices = sorted(header["shard"][0] for _, header in headers)
+    missing = sorted(set(range(1, count + 1)) - set(indices))
+    duplicated = sorted({index for index in indices if indices.count(index) > 1})
+    if missing or duplicated:
+        raise ShardMergeError(f"Expected shards 1..{count} once each; missing {missing}, duplicated {duplicated}")
+
+    input_rows = first["input_rows"]
+    seen = bytearray(input_rows)  # one flag per input row
+    for path, header in headers:
+        rows = 0
+        for row_id, _ in read_journal(path):
+            if not 0 <= row_id < input_rows:
+                raise ShardMergeError(f"{path} holds row {row_id}, but the input has {input_rows} rows")
+            if seen[row_id]:
+                raise ShardMergeError(f"Row {row_id} appears in more than one shard file (again in {path})")
+            seen[row_id] = 1
+            rows += 1
+        if rows != header.get("rows"):
+            raise ShardMergeError(f"{path} holds {rows} rows, but its header says {header.get('rows')}")
+
+    found = sum(seen)
+    if found != input_rows:
+        absent = [row_id for row_id, flag in enumerate(seen) if not flag]
+        raise ShardMergeError(f"Shards hold {found} of {input_rows} input rows; missing rows "
+                              f"{absent[:10]}{' ...' if len(absent) > 10 else ''}")
+    return input_rows
+
+
+def merge_shards(paths, fingerprint=None):
+    """``{row_id: result}`` of all shard files, after ``check_shards``."""
+    check_shards(paths, fingerprint)
+    return {row_id: result for path in paths for row_id, result in read_journal(path)}
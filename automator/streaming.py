@@ -0,0 +1,38 @@
+"""Hand-off of rows that finish while their batch is still streaming.
+
+In streaming mode the pipeline reports each company the moment its scoring
+object has been generated, from the worker thread that runs the batch. The
+sink writes those rows straight away (to the journal, or to the list behind
+the Streamlit table) and remembers them, so when the batch later settles
+only the rows that were not streamed are written.
+"""
+
+import threading
+
+
+class StreamingSink:
+    """Writes streamed and settled rows exactly once each."""
+
+    def __init__(self, write, tag=None):
+        self.write = write  # called with a list of (row_id, result)
+        self.tag = tag  # optional (row_id, result) -> result applied to streamed rows, e.g. Deduplicator.tag
+        self.streamed = 0
+        self._written = set()
+        self._lock = threading.Lock()
+
+    def emit(self, row_id, result):
+        """Write one finished row now; safe to call from worker threads."""
+        with self._lock:
+            if row_id in self._written:
+                return
+            self._written.add(row_id)
+            self.streamed += 1
+            self.write([(row_id, self.tag(row_id, result) if self.tag else result)])
+
+    def settle(self, entries):
+        """Write the settled ``(row_id, result)`` entries that were not streamed already."""
+        with self._lock:
+            fresh = [(row_id, result) for row_id, result in entries if row_id not in self._written]
+            self._written.update(row_id for row_id, _ in fresh)
+            if fresh:
+                self.write(fresh)
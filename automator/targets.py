@@ -0,0 +1,62 @@
+"""Target companies that every input company is scored against.
+
+Targets are an ordered ``{name: description}`` mapping. A run with a single
+target keeps the plain "Relevance Score"/"Relevance Reason" columns; with
+several, each target gets its own score/reason column pair and "Best Target"
+names the highest-scoring one, whose score and reason also fill the plain
+columns so sorting and relevance bands keep working.
+
+A targets file is either JSON (``{"Name": "description", ...}``) or plain text
+where each target starts with a ``# Name`` line followed by its description.
+"""
+
+import json
+
+BEST_TARGET_COLUMN = "Best Target"
+
+
+class TargetsFileError(ValueError):
+    """Raised when a targets file is empty or malformed."""
+
+
+def load_targets(path):
+    """Read an ordered ``{name: description}`` mapping from a JSON or ``# Name`` text file."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    if str(path).lower().endswith(".json"):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise TargetsFileError(f"Invalid JSON in {path}: {e}")
+        if not isinstance(data, dict):
+            raise TargetsFileError(f"{path} must contain a JSON object of name -> description")
+        targets = {str(name).strip(): str(description).strip() for name, description in data.items()}
+    else:
+        targets, name, lines = {}, None, []
+        for line in text.splitlines() + ["# "]:
+            if line.startswith("# "):
+                if name is not None:
+                    targets[name] = "\n".join(lines).strip()
+                name, lines = line[2:].strip(), []
+            elif name is not None:
+                lines.append(line)
+            elif line.strip():
+                raise TargetsFileError(f"{path}: text before the first '# Name' line")
+
+    targets = {name: description for name, description in targets.items() if name and description}
+    if not targets:
+        raise TargetsFileError(f"No targets found in {path}")
+    return targets
+
+
+def score_columns(name):
+    """(score column, reason column) of one target in a multi-target run."""
+    return f"Relevance Score ({name})", f"Relevance Reason ({name})"
+
+
+def targets_text(targets):
+    """Canonical text of all targets, for run fingerprints and cache keys."""
+    if len(targets) == 1:
+        return next(iter(targets.values()))
+    return "\n\n".join(f"# {name}\n{description}" for name, description in targets.items())
@@ -0,0 +1,86 @@
+"""Optional timeline tracing in the Chrome trace / Perfetto JSON format.
+
+A ``Tracer`` writes one event per line as things happen: each batch, each
+stage of it (enrichment, scoring), the wait for a key with budget left, every
+Gemini request with its first streamed byte, parsing, retry sleeps, rows
+handed to the writer and, in the CLI, journal appends and the output file write.
+Every thread gets its own track, so idle gaps, key starvation and
+serialization points show up in one picture. Open the file in
+https://ui.perfetto.dev or chrome://tracing; a file cut short by a crash
+still loads, because both viewers accept an unterminated event array.
+
+A tracer without a path is disabled and costs next to nothing, so the engine
+always has one.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Tracer:
+    """Writes trace events to ``path`` as they happen; ``Tracer()`` records nothing."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.enabled = path is not None
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._file = None
+        self._first = True
+        if self.enabled:
+            self._file = open(path, "w", encoding="utf-8")
+            self._file.write("[\n")
+
+    def _write(self, event):
+        self._file.write(("" if self._first else ",\n") + json.dumps(event, default=str))
+        self._first = False
+
+    def _emit(self, event):
+        thread = threading.current_thread()
+        with self._lock:
+            if self._file is None:
+                return
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                self._write({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": thread.ident,
+                             "args": {"name": thread.name}})
+            event.update(pid=self._pid, tid=thread.ident)
+            self._write(event)
+
+    def _micros(self, seconds):
+        return round((seconds - self._origin) * 1e6, 1)
+
+    def complete(self, name, start, end=None, cat="run", **args):
+        """Record a span from ``start`` to ``end`` (``time.perf_counter()`` values) on the current thread."""
+        if self.enabled:
+            end = time.perf_counter() if end is None else end
+            self._emit({"name": name, "cat": cat, "ph": "X", "ts": self._micros(start),
+                        "dur": round((end - start) * 1e6, 1), "args": args})
+
+    @contextmanager
+    def span(self, name, cat="run", **args):
+        """``with tracer.span(name) as args:`` record the block as a span; ``args`` can be annotated inside it."""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.complete(name, start, cat=cat, **args)
+
+    def instant(self, name, cat="run", **args):
+        """Record a point in time on the current thread."""
+        if self.enabled:
+            self._emit({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self._micros(time.perf_counter()),
+                        "args": args})
+
+    def close(self):
+        """Terminate the event array and close the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.write("\n]\n")
+                self._file.close()
+                self._file = None
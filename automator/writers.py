@@ -0,0 +1,249 @@
+"""Final output files written straight from the result journal.
+
+The CLI used to load every journaled row into a DataFrame, clean it, and
+write it to All_Companies and then again, as three filtered copies, to the
+relevance band sheets through openpyxl. ``JournaledResults`` instead makes
+one pass over the journal (or shard files) that keeps only each row's
+cleaned score and where its line starts, sorts those, and reads the rows
+back best first one at a time. Because the bands are score ranges, they are
+contiguous stretches of that order, so every row is read and written once
+and goes to All_Companies and its band sheet in the same step.
+
+``write_results`` picks the format from the file extension:
+
+- ``.xlsx``: xlsxwriter in constant-memory mode when it is installed,
+  otherwise openpyxl's write-only mode; both stream rows to disk;
+- ``.csv``: one file with all rows, best first;
+- ``.parquet``: the same table in row groups, with numeric score columns
+  (needs pyarrow).
+"""
+
+import csv
+import itertools
+import json
+import os
+from array import array
+
+import numpy as np
+
+from automator.pipeline import clean_result, clean_score, score_pairs
+from automator.result_index import HIGH_RELEVANCE, MEDIUM_RELEVANCE
+from automator.targets import BEST_TARGET_COLUMN
+from automator.tracing import Tracer
+
+OUTPUT_FORMATS = ("xlsx", "csv", "parquet")
+ALL_SHEET = "All_Companies"
+FAILED_SHEET = "Failed_Companies"
+# Sheet, lowest score, score it stays below; in the order the bands appear best first
+BAND_SHEETS = (
+    ("High_Relevance_70+", HIGH_RELEVANCE, float("inf")),
+    ("Medium_Relevance_50-69", MEDIUM_RELEVANCE, HIGH_RELEVANCE),
+    ("Low_Relevance_Below_50", float("-inf"), MEDIUM_RELEVANCE),
+)
+PARQUET_ROW_GROUP = 50_000
+
+
+def output_format(path):
+    """``"xlsx"``, ``"csv"`` or ``"parquet"`` from the extension of ``path``."""
+    extension = os.path.splitext(str(path))[1].lower().lstrip(".")
+    if extension not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output file {path!r}: use .xlsx, .csv or .parquet")
+    return extension
+
+
+class JournaledResults:
+    """The finished rows of journal or shard files, cleaned and read back best first without holding them in memory.
+
+    A row journaled more than once (a resumed run re-sends permanently failed rows) keeps its last line.
+    """
+
+    def __init__(self, paths, targets):
+        self.paths = list(paths)
+        self.targets = targets
+        columns = {}  # insertion-ordered set: the column order a DataFrame of all rows would have
+        best_codes = {}
+        row_ids, scores, files, offsets, best = array("q"), array("d"), array("q"), array("q"), array("q")
+        for file_index, path in enumerate(self.paths):
+            with open(path, "rb") as f:
+                offset = len(f.readline())  # header
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        offset += len(line)
+                        continue  # torn last line of an interrupted run
+                    result = record["result"]
+                    columns.update(dict.fromkeys(result))
+                    row_ids.append(record["row"])
+                    scores.append(clean_score(result.get("Relevance Score"), result.get("Relevance Reason")))
+                    files.append(file_index)
+                    offsets.append(offset)
+                    best.append(best_codes.setdefault(result.get(BEST_TARGET_COLUMN) or "Not specified",
+                                                      len(best_codes)))
+                    offset += len(line)
+        self.columns = list(columns)
+
+        # The last line of every row id, in row id order
+        row_ids = np.frombuffer(row_ids, dtype=np.int64)
+        _, last_from_end = np.unique(row_ids[::-1], return_index=True)
+        keep = len(row_ids) - 1 - last_from_end
+        self.row_ids = row_ids[keep]
+        self.scores = np.frombuffer(scores, dtype=np.float64)[keep]
+        self._files = np.frombuffer(files, dtype=np.int64)[keep]
+        self._offsets = np.frombuffer(offsets, dtype=np.int64)[keep]
+        best = np.frombuffer(best, dtype=np.int64)[keep]
+        counts = np.bincount(best, minlength=len(best_codes))
+        self.best_targets = {target: int(counts[code]) for target, code in best_codes.items() if counts[code]}
+
+        # Best first; unscored (permanently failed) rows last, ties in input order
+        unscored = np.isnan(self.scores)
+        self.order = np.argsort(np.where(unscored, np.inf, -self.scores), kind="stable")
+        self.band_rows = {sheet: int(((self.scores >= low) & (self.scores < high)).sum())
+                          for sheet, low, high in BAND_SHEETS}
+        self.failed_rows = int(unscored.sum())
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def _lines(self, positions):
+        handles = [open(path, "rb") for path in self.paths]
+        try:
+            for position in positions:
+                f = handles[self._files[position]]
+                f.seek(self._offsets[position])
+                yield json.loads(f.readline())["result"]
+        finally:
+            for f in handles:
+                f.close()
+
+    def entries(self):
+        """Yield ``(row_id, result)`` as journaled, in row id order."""
+        yield from zip(self.row_ids.tolist(), self._lines(range(len(self))))
+
+    def rows(self):
+        """Yield each row's cleaned values in ``columns`` order, best first."""
+        for result in self._lines(self.order):
+            yield clean_result(result, self.targets, self.columns)
+
+    def sheets(self):
+        """``(sheet, rows)`` of the non-empty band and failed sheets, in the order ``rows()`` reaches them."""
+        sheets = [(sheet, self.band_rows[sheet]) for sheet, _, _ in BAND_SHEETS]
+        return [(sheet, rows) for sheet, rows in sheets + [(FAILED_SHEET, self.failed_rows)] if rows]
+
+    def score_columns(self):
+        return [column for column, _ in score_pairs(self.targets) if column in self.columns]
+
+
+class _XlsxWriterBook:
+    """xlsxwriter in constant-memory mode: each row is flushed to disk once the next row starts."""
+
+    def __init__(self, path):
+        import xlsxwriter
+
+        self._book = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_formulas": False,
+                                                "strings_to_urls": False})
+        self._header_format = self._book.add_format({"bold": True, "border": 1, "align": "center"})
+
+    def add_sheet(self, name, header):
+        sheet = self._book.add_worksheet(name)
+        sheet.write_row(0, 0, header, self._header_format)
+        rows = itertools.count(1)
+        return lambda values: sheet.write_row(next(rows), 0, values)
+
+    def close(self):
+        self._book.close()
+
+
+class _OpenpyxlBook:
+    """openpyxl's write-only mode, used when xlsxwriter is not installed."""
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        self.path = path
+        self._book = Workbook(write_only=True)
+
+    def add_sheet(self, name, header):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        sheet = self._book.create_sheet(name)
+        cells = []
+        for title in header:
+            cell = WriteOnlyCell(sheet, value=title)
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        sheet.append(cells)
+        return sheet.append
+
+    def close(self):
+        self._book.save(self.path)
+
+
+def _excel_book(path):
+    try:
+        return _XlsxWriterBook(path)
+    except ImportError:
+        return _OpenpyxlBook(path)
+
+
+def _write_xlsx(results, path):
+    book = _excel_book(path)
+    write_all = book.add_sheet(ALL_SHEET, results.columns)
+    sheets = results.sheets()
+    # Sheets are created in workbook order up front; each row then goes to All_Companies and its band sheet
+    writers = {sheet: book.add_sheet(sheet, results.columns) for sheet, _ in sheets}
+    band_of_row = itertools.chain.from_iterable(itertools.repeat(sheet, rows) for sheet, rows in sheets)
+    for values, sheet in zip(results.rows(), band_of_row):
+        write_all(values)
+        writers[sheet](values)
+    book.close()
+
+
+def _write_csv(results, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(results.columns)
+        writer.writerows(results.rows())
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Writing Parquet output requires pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+
+def _write_parquet(results, path):
+    pa, pq = _pyarrow()
+    numeric = set(results.score_columns())
+    schema = pa.schema([(column, pa.float64() if column in numeric else pa.string()) for column in results.columns])
+    with pq.ParquetWriter(path, schema) as writer:
+        rows = results.rows()
+        while True:
+            group = list(itertools.islice(rows, PARQUET_ROW_GROUP))
+            if not group:
+                break
+            arrays = [[row[i] for row in group] if column in numeric
+                      else [None if row[i] is None else str(row[i]) for row in group]
+                      for i, column in enumerate(results.columns)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+def check_output(path):
+    """Fail before a run, rather than after it, when ``path`` cannot be written: bad extension or missing pyarrow."""
+    if output_format(path) == "parquet":
+        _pyarrow()
+
+
+_WRITERS = {"xlsx": _write_xlsx, "csv": _write_csv, "parquet": _write_parquet}
+
+
+def write_results(results, path, tracer=None):
+    """Write ``JournaledResults`` to ``path``: an .xlsx workbook with the band sheets, a .csv or a .parquet file."""
+    file_format = output_format(path)
+    tracer = tracer or Tracer()
+    with tracer.span(f"write {file_format}", "write", file=path, rows=len(results)):
+        _WRITERS[file_format](results, path)
@@ -0,0 +1 @@
+"""Offline benchmarks of the classification engine against a simulated Gemini backend."""
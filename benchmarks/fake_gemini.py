@@ -0,0 +1,187 @@
+"""Simulated Gemini backend for offline benchmarks.
+
+``FakeGemini`` is a model factory for ``ClientPool(model_factory=...)``: it
+answers the real enrichment and scoring prompts with well-formed JSON after a
+simulated latency, and injects the failures the engine has to survive:
+
+- per-key 429s, both from a per-key requests-per-minute quota and at random,
+  with a retry-after hint in the message;
+- truncated answers (cut off mid-object) and malformed company objects;
+- companies returned in a different order, and companies left out.
+
+Faults are drawn from a random generator seeded by the prompt, its attempt
+number and ``seed``, so a run injects the same faults into the same requests
+no matter how threads interleave, and results stay comparable across commits.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from types import SimpleNamespace
+
+_COMPANY_LINE = re.compile(r"^\d+\. (.+?): ", re.MULTILINE)
+_TARGET_LINE = re.compile(r"^- ([^:\n]+):", re.MULTILINE)
+
+
+class FakeRateLimitError(Exception):
+    """429 raised by the simulated backend; the message carries a retry-after hint like the real API."""
+
+    code = 429
+
+
+class FakeGemini:
+    """Model factory simulating Gemini latency, quotas and answer faults."""
+
+    def __init__(self, latency_median=0.05, latency_sigma=0.5, latency_per_company=0.0, quota_rpm=None,
+                 rate_limit_rate=0.0, truncated_rate=0.0, malformed_rate=0.0, reorder_rate=0.0, drop_rate=0.0,
+                 stream_chunk_chars=200, seed=0):
+        self.latency_median = latency_median  # seconds; log-normal around this median
+        self.latency_sigma = latency_sigma
+        self.latency_per_company = latency_per_company
+        self.quota_rpm = quota_rpm  # per-key requests per minute before 429s, None for no quota
+        self.rate_limit_rate = rate_limit_rate  # chance of a random 429 per request
+        self.truncated_rate = truncated_rate  # chance per request of an answer cut off mid-object
+        self.malformed_rate = malformed_rate  # chance per request of one broken company object
+        self.reorder_rate = reorder_rate  # chance per request of shuffled companies
+        self.drop_rate = drop_rate  # chance per company of being left out
+        self.stream_chunk_chars = stream_chunk_chars
+        self.seed = seed
+
+        self.counts = Counter()  # requests and injected faults by kind
+        self._attempts = Counter()  # prompt digest -> times seen, so retries draw fresh faults
+        self._windows = defaultdict(deque)  # api key -> request times in the last minute
+        self._lock = threading.Lock()
+
+    def __call__(self, api_key, model_name):
+        return FakeModel(self, api_key)
+
+    def _rng(self, prompt):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._attempts[digest] += 1
+            attempt = self._attempts[digest]
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def _count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def _check_quota(self, api_key, rng):
+        if rng.random() < self.rate_limit_rate:
+            self._count("rate_limited")
+            raise FakeRateLimitError("429 Resource has been exhausted (e.g. check quota). Please retry in 0.5s.")
+        if self.quota_rpm is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows[api_key]
+            while window and now - window[0] >= 60:
+                window.popleft()
+            if len(window) >= self.quota_rpm:
+                wait = 60 - (now - window[0])
+                self.counts["rate_limited"] += 1
+                raise FakeRateLimitError(f"429 Resource has been exhausted (e.g. check quota). Please retry in {wait:.2f}s.")
+            window.append(now)
+
+    def latency(self, rng, num_companies):
+        return self.latency_median * math.exp(self.latency_sigma * rng.gauss(0, 1)) + self.latency_per_company * num_companies
+
+    def answer(self, prompt, rng):
+        """JSON answer text for an enrichment or scoring prompt, with faults injected."""
+        if "**COMPANY PROFILES:**" in prompt:
+            head, profiles = prompt.split("**COMPANY PROFILES:**", 1)
+            targets = _TARGET_LINE.findall(head.split("**TARGET COMPANY REFERENCES:**", 1)[-1])
+            names = _COMPANY_LINE.findall(profiles.split("For each company", 1)[0])
+            companies = [{"company_name": name, "scores": [
+                {"target": target, "relevance_score": round(_score(name, target), 2),
+                 "relevance_reason": f"Simulated comparison of {name} with {target}"} for target in targets]}
+                for name in names]
+        else:
+            section = prompt.split("**COMPANIES TO ANALYZE:**", 1)[-1].split("For each company", 1)[0]
+            names = _COMPANY_LINE.findall(section)
+            companies = [{
+                "company_name": name,
+                "business_summary": f"{name} is a simulated company",
+                "industry_classification": f"Industry {_bucket(name, 40)}",
+                "business_model": f"Model {_bucket(name, 6)}",
+                "key_products_services": "Simulated products",
+                "market_focus": "Simulated market",
+            } for name in names]
+
+        if rng.random() < self.reorder_rate:
+            rng.shuffle(companies)
+            self._count("reordered")
+        kept = [company for company in companies if rng.random() >= self.drop_rate]
+        if len(kept) < len(companies):
+            self._count("dropped")
+            companies = kept
+        parts = [json.dumps(company) for company in companies]
+        if parts and rng.random() < self.malformed_rate:
+            broken = rng.randrange(len(parts))
+            parts[broken] = parts[broken].replace('", "', '" "', 1)  # missing comma inside one object
+            self._count("malformed")
+        text = '```json\n{"companies": [' + ", ".join(parts) + "]}\n```"
+        if rng.random() < self.truncated_rate:
+            text = text[:rng.randrange(len(text) // 2, len(text))]
+            self._count("truncated")
+        return text, len(names)
+
+
+class FakeModel:
+    """Stands in for ``genai.GenerativeModel`` bound to one key."""
+
+    def __init__(self, backend, api_key):
+        self.backend = backend
+        self.api_key = api_key
+
+    def generate_content(self, prompt, stream=False):
+        backend = self.backend
+        backend._count("requests")
+        rng = backend._rng(prompt)
+        backend._check_quota(self.api_key, rng)
+        text, num_companies = backend.answer(prompt, rng)
+        latency = backend.latency(rng, num_companies)
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4,
+                                total_token_count=(len(prompt) + len(text)) // 4)
+        if not stream:
+            time.sleep(latency)
+            return FakeResponse(text, usage)
+        return FakeStreamingResponse(text, usage, latency, backend.stream_chunk_chars)
+
+
+class FakeResponse:
+    prompt_feedback = None
+    candidates = ()
+
+    def __init__(self, text, usage_metadata):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeStreamingResponse(FakeResponse):
+    """Yields the answer in chunks: a third of the latency before the first token, the rest spread over the text."""
+
+    def __init__(self, text, usage_metadata, latency, chunk_chars):
+        super().__init__(text, usage_metadata)
+        self._latency = latency
+        self._chunk_chars = chunk_chars
+
+    def __iter__(self):
+        pieces = [self.text[i:i + self._chunk_chars] for i in range(0, len(self.text), self._chunk_chars)] or [""]
+        time.sleep(self._latency / 3)
+        for piece in pieces:
+            time.sleep(self._latency * 2 / 3 / len(pieces))
+            yield SimpleNamespace(text=piece)
+
+
+def _bucket(name, buckets):
+    return int(hashlib.md5(name.encode("utf-8")).hexdigest(), 16) % buckets
+
+
+def _score(name, target):
+    return 1 + int(hashlib.md5(f"{name}|{target}".encode("utf-8")).hexdigest(), 16) % 9900 / 100
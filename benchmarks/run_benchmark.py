@@ -0,0 +1,220 @@
+"""Offline throughput benchmark of the classification engine.
+
+Generates a synthetic company list, runs the real engine (reader, dedup,
+token packing, key rotation, dispatch, parsing, repair) against the
+simulated backend in ``benchmarks.fake_gemini`` and reports companies/sec,
+p50/p99 batch latency, retries and peak RSS. No API quota is used.
+
+    python -m benchmarks.run_benchmark --rows 10000
+    python -m benchmarks.run_benchmark --rows 100000 --keys 8 --latency 0.2 --stream
+
+Each result is appended as one JSON line to ``--output`` together with the
+git commit and every scenario parameter; the previous result of the same
+scenario is printed next to it, so runs are comparable across commits.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from automator import ClassificationRun, Tracer
+from benchmarks.fake_gemini import FakeGemini
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), "results.jsonl")
+TARGET = ("Manufacturer of shock absorbers, struts, suspension parts and dampers for two-wheelers, passenger cars, "
+          "commercial vehicles and railways.")
+
+_WORDS = ("shock absorber suspension damper strut automotive component railway coach brake pad drive shaft spring "
+          "bank lending insurance software cloud platform retail grocery logistics freight shipping steel pipe "
+          "chemical polymer fertilizer pharmaceutical generic drug hospital textile yarn apparel cement power "
+          "solar wind turbine battery electric vehicle telecom network media broadcasting hotel restaurant").split()
+
+
+def write_companies(path, rows, seed=0, duplicate_rate=0.05):
+    """Write a synthetic company list (.csv, .xlsx or .parquet) of ``rows`` rows, streaming to keep memory flat."""
+    rng = random.Random(seed)
+    descriptions = []
+
+    def row(i):
+        if descriptions and rng.random() < duplicate_rate:
+            description = rng.choice(descriptions)  # subsidiaries and share classes repeat a description
+        else:
+            description = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 80))).capitalize() + "."
+            if len(descriptions) < 1000:
+                descriptions.append(description)
+        return f"Company {i:07d} Limited", description
+
+    header = ["Company Name", "Business Description"]
+    if path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(row(i) for i in range(rows))
+    elif path.endswith(".xlsx"):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+        for i in range(rows):
+            sheet.append(row(i))
+        workbook.save(path)
+    elif path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(path, pa.schema([(column, pa.string()) for column in header])) as writer:
+            for start in range(0, rows, 100_000):
+                names, texts = zip(*(row(i) for i in range(start, min(rows, start + 100_000))))
+                writer.write_table(pa.table({header[0]: list(names), header[1]: list(texts)}))
+    else:
+        raise ValueError(f"Unsupported benchmark format: {path}")
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    backend = FakeGemini(latency_median=args.latency, latency_sigma=args.latency_sigma,
+                         latency_per_company=args.latency_per_company, quota_rpm=args.quota_rpm,
+                         rate_limit_rate=args.rate_limit_rate, truncated_rate=args.truncated_rate,
+                         malformed_rate=args.malformed_rate, reorder_rate=args.reorder_rate,
+                         drop_rate=args.drop_rate, seed=args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        input_path = os.path.join(workdir, f"companies.{args.format}")
+        write_companies(input_path, args.rows, seed=args.seed)
+
+        tracer = Tracer(args.trace_file)
+        run = ClassificationRun(input_path, {"Benchmark Target": TARGET}, {
+            "api_keys": [f"bench-key-{i + 1}" for i in range(args.keys)],
+            "model_factory": backend,
+            "concurrency_per_key": args.concurrency_per_key,
+            "requests_per_minute": args.rpm,
+            "tokens_per_minute": args.tpm,
+            "use_cache": args.cache,
+            "cache_file": os.path.join(workdir, "cache.sqlite"),
+            "duplicate_threshold": args.duplicate_threshold,
+            "stream_results": args.stream,
+            "log": print if args.verbose else None,
+            "tracer": tracer,
+        })
+        rows_done = 0
+        started = time.perf_counter()
+        for entries in run.batches():
+            rows_done += len(entries)
+        elapsed = time.perf_counter() - started
+        tracer.close()
+
+    stats = run.stats()
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "scenario": scenario(args),
+        "rows": rows_done,
+        "seconds": round(elapsed, 3),
+        "companies_per_second": round(rows_done / elapsed, 2) if elapsed else None,
+        "batch_p50_seconds": stats["batches"]["p50_seconds"],
+        "batch_p99_seconds": stats["batches"]["p99_seconds"],
+        "batches": stats["batches"]["count"],
+        "requests": backend.counts["requests"],
+        "request_retries": stats["retries"],
+        "repairs": stats["repairs"],
+        "injected_faults": {kind: count for kind, count in backend.counts.items() if kind != "requests"},
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def scenario(args):
+    """Every parameter that affects the numbers; results are only compared within the same scenario."""
+    return {key: value for key, value in sorted(vars(args).items()) if key not in ("output", "verbose", "trace_file")}
+
+
+def previous_result(path, result):
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("scenario") == result["scenario"]:
+                previous = record
+    return previous
+
+
+def print_report(result, previous):
+    def change(key):
+        if not previous or not previous.get(key) or result[key] is None:
+            return ""
+        return f" ({(result[key] / previous[key] - 1):+.1%} vs {previous['commit']})"
+
+    print(f"📏 Benchmark at {result['commit'] or 'unknown commit'}: {result['rows']} companies in {result['seconds']}s")
+    print(f"   • Throughput: {result['companies_per_second']} companies/sec{change('companies_per_second')}")
+    if result["batch_p50_seconds"] is not None:
+        print(f"   • Batch latency: p50 {result['batch_p50_seconds']:.3f}s{change('batch_p50_seconds')}, "
+              f"p99 {result['batch_p99_seconds']:.3f}s{change('batch_p99_seconds')} over {result['batches']} batches")
+    print(f"   • Requests: {result['requests']}, retried: {sum(result['request_retries'].values())} "
+          f"{result['request_retries'] or ''}")
+    repairs = result["repairs"]
+    print(f"   • Repairs: {repairs['retried']} re-sent, {repairs['repaired']} recovered, {repairs['bisections']} "
+          f"bisections, {repairs['permanent_failures']} permanently failed")
+    print(f"   • Injected faults: {result['injected_faults'] or 'none'}")
+    print(f"   • Peak RSS: {result['peak_rss_mb']} MB{change('peak_rss_mb')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the classification engine against a simulated Gemini")
+    parser.add_argument("--rows", type=int, default=1000, help="synthetic companies to classify (default: 1000)")
+    parser.add_argument("--format", choices=("csv", "xlsx", "parquet"), default="csv", help="input file format")
+    parser.add_argument("--keys", type=int, default=4, help="simulated API keys")
+    parser.add_argument("--concurrency-per-key", type=int, default=2)
+    parser.add_argument("--rpm", type=int, default=600, help="engine's per-key request budget")
+    parser.add_argument("--tpm", type=int, default=4_000_000, help="engine's per-key token budget")
+    parser.add_argument("--latency", type=float, default=0.05, help="median request latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    parser.add_argument("--latency-per-company", type=float, default=0.0, help="extra seconds per company")
+    parser.add_argument("--quota-rpm", type=int, help="backend's per-key quota; requests beyond it get 429s")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.01, help="chance of a random 429 per request")
+    parser.add_argument("--truncated-rate", type=float, default=0.01, help="chance of a truncated answer")
+    parser.add_argument("--malformed-rate", type=float, default=0.02, help="chance of one broken company object")
+    parser.add_argument("--reorder-rate", type=float, default=0.2, help="chance of reordered companies")
+    parser.add_argument("--drop-rate", type=float, default=0.005, help="chance per company of being left out")
+    parser.add_argument("--duplicate-threshold", type=float, default=0.9)
+    parser.add_argument("--stream", action="store_true", help="stream answers like --stream in the CLI")
+    parser.add_argument("--cache", action="store_true", help="use a (fresh) result cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON lines file results are appended to")
+    parser.add_argument("--verbose", action="store_true", help="show the engine's log")
+    parser.add_argument("--trace-file", help="also write a Chrome trace / Perfetto timeline of the run to this file")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args)
+    print_report(result, previous_result(args.output, result))
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
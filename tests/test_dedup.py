@@ -0,0 +1,29 @@
+"""Duplicates are answered from their representative's result."""
+
+import pandas as pd
+
+from automator.dedup import CLUSTER_COLUMN, Deduplicator
+
+
+def _result(name, description):
+    return {"Company Name": name, "Original Business Description": description, "Business Summary": "Struts",
+            "Relevance Score": 80.0, "Relevance Reason": "close match"}
+
+
+def test_members_copy_the_analysis_but_keep_their_own_name():
+    deduplicator = Deduplicator()
+    first = pd.DataFrame({"Company Name": ["Acme", "Acme Holdings"],
+                          "Business Description": ["Maker of struts.", "maker of STRUTS"]})
+    assert deduplicator.split(first).index.tolist() == [0]
+    answered = dict(deduplicator.fan_out([0], [_result("Acme", "Maker of struts.")]))
+
+    # A duplicate read after its representative was answered
+    later = pd.DataFrame({"Company Name": ["Acme Ltd"], "Business Description": ["Maker of struts"]}, index=[2])
+    assert deduplicator.split(later).empty
+    answered.update(deduplicator.flush())
+
+    assert sorted(answered) == [0, 1, 2]
+    assert answered[2] == {"Company Name": "Acme Ltd", "Original Business Description": "Maker of struts",
+                           "Business Summary": "Struts", "Relevance Score": 80.0, "Relevance Reason": "close match",
+                           CLUSTER_COLUMN: 0}
+    assert answered[1]["Company Name"] == "Acme Holdings" and answered[0][CLUSTER_COLUMN] == 0
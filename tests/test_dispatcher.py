@@ -0,0 +1,19 @@
+"""A slow batch does not hold back the batches dispatched after it."""
+
+import time
+
+from automator.dispatcher import dispatch_batches
+
+
+def test_free_slots_are_refilled_on_any_completion():
+    def process_fn(batch_df, batch_num):
+        time.sleep(0.5 if batch_num == 1 else 0.01)
+        return [batch_num]
+
+    started = time.monotonic()
+    finished = [batch_num for batch_num, _, _ in dispatch_batches(((num, None) for num in range(1, 9)), process_fn,
+                                                                  max_in_flight=2)]
+    assert finished[-1] == 1
+    assert sorted(finished) == list(range(1, 9))
+    assert time.monotonic() - started < 0.7  # batches 2-8 ran beside batch 1, not after it
+
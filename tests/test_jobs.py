@@ -0,0 +1,62 @@
+"""Jobs are listed per session, stale ones can be pruned, and row counts fill in in the background."""
+
+import json
+import os
+
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from automator import ClassificationJob, RowReader, list_jobs, prune_jobs
+
+CSV = b"Company Name,Business Description\nAcme,Maker of shock absorbers\n"
+
+
+def test_list_jobs_only_returns_the_given_ids(tmp_path):
+    mine = ClassificationJob.create("mine.csv", CSV, {"Target": "Shock absorbers"}, jobs_dir=str(tmp_path))
+    ClassificationJob.create("theirs.csv", CSV, {"Target": "Shock absorbers"}, jobs_dir=str(tmp_path))
+    assert [job.id for job in list_jobs(str(tmp_path), job_ids=[mine.id, "../elsewhere"])] == [mine.id]
+    assert len(list_jobs(str(tmp_path))) == 2
+
+
+def test_prune_jobs_deletes_stale_jobs(tmp_path):
+    stale = ClassificationJob.create("stale.csv", CSV, {"Target": "Shock absorbers"}, jobs_dir=str(tmp_path))
+    fresh = ClassificationJob.create("fresh.csv", CSV, {"Target": "Shock absorbers"}, jobs_dir=str(tmp_path))
+    job_file = os.path.join(stale.job_dir, "job.json")
+    with open(job_file, encoding="utf-8") as f:
+        state = json.load(f)
+    with open(job_file, "w", encoding="utf-8") as f:
+        json.dump(dict(state, updated=0), f)
+
+    assert prune_jobs(3600, str(tmp_path)) == [stale.id]
+    assert os.listdir(tmp_path) == [fresh.id]
+
+
+def test_row_count_of_an_empty_csv_is_zero(tmp_path):
+    job = ClassificationJob.create("empty.csv", b"Company Name,Business Description\n", {"Target": "Shock absorbers"},
+                                   jobs_dir=str(tmp_path))
+    job._count_rows()
+    assert job.progress()["total_rows"] == 0
+
+
+def test_row_count_of_a_deleted_job_is_dropped(tmp_path):
+    job = ClassificationJob.create("companies.csv", CSV, {"Target": "Shock absorbers"}, jobs_dir=str(tmp_path))
+    job.delete()
+    job._count_rows()
+    assert not os.path.exists(job.job_dir)
+
+
+def test_row_count_replaces_the_xlsx_upper_bound(tmp_path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Company Name", "Business Description"])
+    sheet.append(["Acme", "Maker of shock absorbers"])
+    sheet.cell(row=10, column=1).font = Font(bold=True)  # formatted but empty rows below the data
+    workbook.save(tmp_path / "companies.xlsx")
+
+    job = ClassificationJob.create("companies.xlsx", (tmp_path / "companies.xlsx").read_bytes(),
+                                   {"Target": "Shock absorbers"}, jobs_dir=str(tmp_path / "jobs"))
+    reader = RowReader(os.path.join(job.job_dir, job.state["input_file"]))
+    assert reader.estimated_rows == 9 and reader.rows_upper_bound
+    job._count_rows()
+    assert job.progress()["total_rows"] == 1
+    assert job.state["total_rows_exact"]
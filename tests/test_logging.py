@@ -0,0 +1,36 @@
+"""Engine messages go to ``config["log"]``; with ``log=None`` a run prints nothing."""
+
+import pandas as pd
+
+from automator import classify
+from benchmarks.fake_gemini import FakeGemini
+
+
+def _config(tmp_path, log):
+    return {
+        "api_keys": ["test-key-1", "test-key-2"],
+        # Random 429s make ClientPool park keys; the second run is served from the cache
+        "model_factory": FakeGemini(latency_median=0.0, latency_sigma=0.0, rate_limit_rate=0.3, seed=1),
+        "cache_file": str(tmp_path / "cache.sqlite"),
+        "max_batch_size": 5,
+        "requests_per_minute": 6000,
+        "log": log,
+    }
+
+
+def test_log_none_prints_nothing(tmp_path, capsys):
+    rows = pd.DataFrame({"Company Name": [f"Company {i}" for i in range(20)],
+                         "Business Description": [f"Maker of dampers, line {i}" for i in range(20)]})
+    messages = []
+    for log in (messages.append, None):
+        assert len(list(classify(rows, "Dampers for railway coaches", _config(tmp_path, log)))) == 20
+    assert any(message.startswith("⏸️") for message in messages)
+    assert capsys.readouterr().out == ""
+
+
+def test_cache_hits_are_logged(tmp_path):
+    rows = pd.DataFrame({"Company Name": ["Acme"], "Business Description": ["Maker of dampers"]})
+    messages = []
+    for _ in range(2):
+        list(classify(rows, "Dampers for railway coaches", _config(tmp_path, messages.append)))
+    assert any(message.startswith("💾 Batch") for message in messages)
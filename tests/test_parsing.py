@@ -0,0 +1,52 @@
+"""Tolerant parsing of model answers and name matching."""
+
+import json
+
+from automator.parsing import match_by_name, parse_companies
+
+
+def _company(name):
+    return {"company_name": name, "business_summary": f"{name} makes things"}
+
+
+def test_truncated_answer_keeps_complete_companies():
+    text = json.dumps({"companies": [_company("Acme"), _company("Globex"), _company("Initech")]})
+    truncated = text[:text.index("Initech") + 10]
+    assert [company["company_name"] for company in parse_companies(truncated)] == ["Acme", "Globex"]
+
+
+def test_malformed_company_does_not_sink_its_siblings():
+    broken = '{"company_name": "Globex" "business_summary": "missing comma"}'
+    text = '```json\n{"companies": [' + json.dumps(_company("Acme")) + ", " + broken + ", " \
+        + json.dumps(_company("Initech")) + "]}\n```"
+    assert [company["company_name"] for company in parse_companies(text)] == ["Acme", "Initech"]
+
+
+def test_several_code_blocks_are_combined():
+    text = "\n".join(f"```json\n{json.dumps({'companies': [_company(name)]})}\n```" for name in ("Acme", "Globex"))
+    assert [company["company_name"] for company in parse_companies(text)] == ["Acme", "Globex"]
+
+
+def test_no_json_gives_no_companies():
+    assert parse_companies("Sorry, I cannot help with that.") == []
+
+
+def test_match_by_name_pairs_reordered_and_dropped_companies():
+    items = [_company("Initech"), _company("ACME Corporation")]
+    matched = match_by_name(items, ["Acme Corp", "Globex", "Initech"])
+    assert matched == [items[1], None, items[0]]
+
+
+def test_match_by_name_keeps_repeated_names_one_to_one():
+    items = [_company("Acme"), _company("Acme")]
+    matched = match_by_name(items, ["Acme", "Acme", "Acme"])
+    assert matched[0] is items[0] and matched[1] is items[1] and matched[2] is None
+
+
+def test_unnamed_items_keep_their_position():
+    items = [{"business_summary": "first"}, _company("Globex")]
+    assert match_by_name(items, ["Acme", "Globex"]) == items
+
+
+def test_unrelated_names_are_not_fuzzy_matched():
+    assert match_by_name([_company("Umbrella Pharmaceuticals")], ["Acme"]) == [None]
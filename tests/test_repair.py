@@ -0,0 +1,69 @@
+"""Failed batches are bisected down to the poison row, which ends up permanently failed."""
+
+from collections import Counter
+
+import pandas as pd
+
+from automator.packing import TokenPacker
+from automator.pipeline import (PERMANENT_FAILURE_REASON, companies_from_batch, failed_entry, incomplete_entry,
+                                is_incomplete, result_entry)
+from automator.repair import RepairQueue
+
+TARGETS = {"Target": "Shock absorbers for two-wheelers"}
+
+
+def _rows(count):
+    return pd.DataFrame({
+        "Company Name": [f"Company {i}" for i in range(count)],
+        "Business Description": [f"Maker of part {i}" for i in range(count)],
+    })
+
+
+def _settle_all(queue, rows, process_fn):
+    settled = {}
+    for row_ids, results in queue.dispatch(TokenPacker(TARGETS["Target"]), [rows], process_fn, max_in_flight=2):
+        for row_id, result in zip(row_ids, results):
+            assert row_id not in settled
+            settled[row_id] = result
+    return settled
+
+
+def test_poison_row_is_isolated_and_marked_permanently_failed():
+    poison = 5
+
+    def process_fn(batch_df, batch_num):
+        companies = companies_from_batch(batch_df)
+        if poison in batch_df.index:
+            return [failed_entry(company, TARGETS, "400 invalid argument") for company in companies]
+        return [result_entry(company, {}, TARGETS, {"Target": (60.0, "close match")}) for company in companies]
+
+    queue = RepairQueue()
+    settled = _settle_all(queue, _rows(8), process_fn)
+
+    assert sorted(settled) == list(range(8))
+    assert settled[poison]["Relevance Score"] is None
+    assert settled[poison]["Relevance Reason"].startswith(PERMANENT_FAILURE_REASON)
+    assert all(not is_incomplete(result) for row_id, result in settled.items() if row_id != poison)
+    assert queue.bisections == 3  # 8 -> 4 -> 2 -> 1
+    assert queue.permanent_failures == 1
+
+
+def test_left_out_company_is_sent_again():
+    sent = Counter()
+
+    def process_fn(batch_df, batch_num):
+        results = []
+        for row_id, company in zip(batch_df.index, companies_from_batch(batch_df)):
+            sent[row_id] += 1
+            if row_id == 2 and sent[row_id] == 1:
+                results.append(incomplete_entry(company, TARGETS))
+            else:
+                results.append(result_entry(company, {}, TARGETS, {"Target": (60.0, "close match")}))
+        return results
+
+    queue = RepairQueue()
+    settled = _settle_all(queue, _rows(4), process_fn)
+
+    assert sent[2] == 2 and sent[0] == 1
+    assert settled[2]["Relevance Score"] == 60.0
+    assert queue.stats()["repaired"] == 1 and queue.stats()["permanent_failures"] == 0
@@ -0,0 +1,27 @@
+"""Batched cache lookups and writes, and eviction beyond max_entries."""
+
+import sqlite3
+import time
+
+from automator.result_cache import ResultCache
+
+
+def test_get_many_keeps_key_order_and_counts_hits(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many([("a", {"score": 1}), ("c", {"score": 3})])
+    assert cache.get_many(["c", "b", "a", "c"]) == [{"score": 3}, None, {"score": 1}, {"score": 3}]
+    assert (cache.hits, cache.misses) == (3, 1)
+    cache.close()
+
+
+def test_close_trims_to_max_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResultCache(path, max_entries=2)
+    cache.put_many([(str(i), {"score": i}) for i in range(5)])
+    time.sleep(0.01)
+    cache.get_many(["0"])  # recently used, so it is kept
+    cache.close()
+
+    with sqlite3.connect(path) as conn:
+        kept = sorted(key for key, in conn.execute("SELECT key FROM results"))
+    assert len(kept) == 2 and "0" in kept
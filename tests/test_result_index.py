@@ -0,0 +1,25 @@
+"""ResultIndex answers filters and metrics, also for a result set without rows."""
+
+import pandas as pd
+
+from automator.result_index import ResultIndex
+
+
+def test_filters_and_counts():
+    df = pd.DataFrame({
+        "Company Name": ["Acme", "Globex", "Initech", "Umbrella"],
+        "Relevance Score": [55.0, 90.0, None, 72.5],
+        "Industry Classification": ["Auto", "Auto", "Pharma", "Pharma"],
+    })
+    index = ResultIndex(df)
+    assert (index.total, index.high, index.medium) == (4, 2, 1)
+    assert index.filter(min_score=60)["Company Name"].tolist() == ["Globex", "Umbrella"]
+    assert index.filter(categories=["Pharma"])["Company Name"].tolist() == ["Umbrella", "Initech"]
+
+
+def test_empty_result_set():
+    index = ResultIndex(pd.DataFrame())
+    assert (index.total, index.high, index.medium) == (0, 0, 0)
+    assert index.categories == []
+    assert index.filter(min_score=50).empty
+    assert index.top.empty
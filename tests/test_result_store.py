@@ -0,0 +1,14 @@
+"""ResultStore keeps float32 scores but hands back float64 rounded to 2 decimals."""
+
+import numpy as np
+
+from automator.result_store import ResultStore
+
+
+def test_frame_scores_are_rounded_float64():
+    store = ResultStore({"Target": "Shock absorbers"})
+    store.append([0, 1], [{"Relevance Score": 83.99, "Relevance Reason": "close match"},
+                          {"Relevance Score": "71.3", "Relevance Reason": "partial match"}])
+    frame = store.frame()
+    assert frame["Relevance Score"].dtype == np.float64
+    assert frame["Relevance Score"].tolist() == [83.99, 71.3]
@@ -0,0 +1,57 @@
+"""Shard files are merged only when they cover every input row exactly once, for the same run."""
+
+import pytest
+
+from automator.journal import ResultJournal, run_fingerprint
+from automator.sharding import ShardMergeError, check_shards, merge_shards, parse_shard, shard_of
+
+FINGERPRINT = run_fingerprint("companies.csv", "Shock absorbers for two-wheelers")
+INPUT_ROWS = 6
+
+
+def _shard_file(tmp_path, shard, row_ids, fingerprint=FINGERPRINT, input_rows=INPUT_ROWS):
+    path = str(tmp_path / f"shard-{shard[0]}-of-{shard[1]}.jsonl")
+    shard_file = ResultJournal(path, dict(fingerprint, shard=list(shard), input_rows=input_rows, rows=len(row_ids)))
+    shard_file.append(row_ids, [{"Company Name": f"Company {row_id}"} for row_id in row_ids])
+    shard_file.close()
+    return path
+
+
+def test_complete_shards_merge(tmp_path):
+    paths = [_shard_file(tmp_path, (1, 2), [0, 2, 4]), _shard_file(tmp_path, (2, 2), [1, 3, 5])]
+    assert check_shards(paths, FINGERPRINT) == INPUT_ROWS
+    assert sorted(merge_shards(paths, FINGERPRINT)) == list(range(INPUT_ROWS))
+
+
+def test_missing_shard_is_rejected(tmp_path):
+    with pytest.raises(ShardMergeError, match="missing \\[2\\]"):
+        check_shards([_shard_file(tmp_path, (1, 2), [0, 2, 4])])
+
+
+def test_missing_rows_are_rejected(tmp_path):
+    paths = [_shard_file(tmp_path, (1, 2), [0, 2]), _shard_file(tmp_path, (2, 2), [1, 3, 5])]
+    with pytest.raises(ShardMergeError, match="missing rows \\[4\\]"):
+        check_shards(paths)
+
+
+def test_overlapping_shards_are_rejected(tmp_path):
+    paths = [_shard_file(tmp_path, (1, 2), [0, 1, 2, 4]), _shard_file(tmp_path, (2, 2), [1, 3, 5])]
+    with pytest.raises(ShardMergeError, match="Row 1 appears in more than one shard"):
+        check_shards(paths)
+
+
+def test_shard_from_another_run_is_rejected(tmp_path):
+    other = run_fingerprint("companies.csv", "Brake pads")
+    paths = [_shard_file(tmp_path, (1, 2), [0, 2, 4]), _shard_file(tmp_path, (2, 2), [1, 3, 5], fingerprint=other)]
+    with pytest.raises(ShardMergeError, match="all shards must come from the same run"):
+        check_shards(paths)
+    with pytest.raises(ShardMergeError, match="merge with the same --input and --targets"):
+        check_shards(paths[:1] + paths[:1], other)
+
+
+def test_shard_assignment_is_stable_and_in_range():
+    assert shard_of("Acme", "Maker of struts", 4) == shard_of(" Acme ", "Maker of struts", 4)
+    assert {shard_of(f"Company {i}", "", 3) for i in range(50)} == {1, 2, 3}
+    assert parse_shard("2/4") == (2, 4)
+    with pytest.raises(ValueError):
+        parse_shard("5/4")
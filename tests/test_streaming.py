@@ -0,0 +1,83 @@
+"""Streamed rows reach the journal: row ids and cluster tags must stay JSON-serializable."""
+
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+
+from automator import ClassificationRun, read_journal
+from automator.dedup import Deduplicator
+from automator.journal import ResultJournal
+from automator.key_pool import KeyPool
+from automator.packing import TokenPacker
+from automator.pipeline import Pipeline
+from automator.streaming import StreamingSink
+from benchmarks.fake_gemini import FakeGemini
+
+TARGET = "Shock absorbers for two-wheelers"
+NAMES = ["Acme", "Globex", "Initech"]
+
+
+class _StreamingClientPool:
+    """Answers both stages for ``NAMES`` and streams the answer in small pieces."""
+
+    model_name = "test-model"
+
+    def generate(self, prompt, lease, on_text=None, *args):
+        if "**COMPANY PROFILES:**" in prompt:
+            companies = [{"company_name": name, "scores": [
+                {"target": "Target", "relevance_score": 70, "relevance_reason": "close match"}]} for name in NAMES]
+        else:
+            companies = [{"company_name": name, "business_summary": f"{name} makes shock absorbers"} for name in NAMES]
+        text = json.dumps({"companies": companies})
+        if on_text is not None:
+            for start in range(0, len(text), 40):
+                on_text(text[start:start + 40])
+        return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(
+            prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4,
+            total_token_count=(len(prompt) + len(text)) // 4))
+
+
+def test_streamed_rows_are_journaled(tmp_path):
+    journal = ResultJournal(str(tmp_path / "journal.jsonl"), {"input": "test"})
+    sink = StreamingSink(lambda entries: journal.append([row_id for row_id, _ in entries],
+                                                         [result for _, result in entries]),
+                         tag=Deduplicator.tag)
+    pipeline = Pipeline(_StreamingClientPool(), KeyPool(1), TokenPacker(TARGET), TARGET, log=None,
+                        on_result=sink.emit)
+    # Gaps in the index, as deduplication or the cache leave them, make pandas hand out numpy ints
+    batch_df = pd.DataFrame({"Company Name": NAMES, "Business Description": ["Maker of struts"] * 3},
+                            index=[3, 7, 8])
+    pipeline.process_batch(batch_df, 1)
+
+    journaled = dict(journal.entries())
+    journal.close()
+    assert sink.streamed == 3
+    assert sorted(journaled) == [3, 7, 8]
+    assert all(type(result["Duplicate Cluster"]) is int for result in journaled.values())
+
+
+def test_streamed_run_is_journaled(tmp_path):
+    rows = pd.DataFrame({
+        "Company Name": [f"Company {i}" for i in range(30)],
+        # Every third row repeats a description, so deduplication leaves batches with gaps in their row ids
+        "Business Description": [f"Maker of shock absorbers and struts, line {i - i % 3 // 2}" for i in range(30)],
+    })
+    rows.to_csv(tmp_path / "companies.csv", index=False)
+    run = ClassificationRun(str(tmp_path / "companies.csv"), TARGET, {
+        "api_keys": ["test-key-1", "test-key-2"],
+        "model_factory": FakeGemini(latency_median=0.0, latency_sigma=0.0),
+        "stream_results": True,
+        "cache_file": str(tmp_path / "cache.sqlite"),
+        "max_batch_size": 10,
+        "log": None,
+    })
+    journal = ResultJournal(str(tmp_path / "journal.jsonl"), {"input": "test"})
+    for entries in run.batches():
+        journal.append([row_id for row_id, _ in entries], [result for _, result in entries])
+    journal.close()
+
+    journaled = dict(read_journal(str(tmp_path / "journal.jsonl")))
+    assert sorted(journaled) == list(range(30))
+    assert run.stats()["streamed"] > 0
+    assert all(type(result["Duplicate Cluster"]) is int for result in journaled.values())